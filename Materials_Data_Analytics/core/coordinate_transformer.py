@@ -1,63 +1,231 @@
+from __future__ import annotations
 import numpy as np
 import pandas as pd
 
 
+class AffineTransform:
+    """
+    Class to hold a 4x4 affine transformation, or a stack of them with one for each frame of a trajectory. Transforms
+    can be composed, inverted and serialised, and are applied to coordinates with one matrix multiplication
+    """
+    def __init__(self, matrix: np.ndarray = None):
+        """
+        :param matrix: (4, 4) affine matrix, or (frames, 4, 4) for one matrix per frame. Defaults to the identity
+        """
+        matrix = np.eye(4) if matrix is None else np.asarray(matrix, dtype=np.float64)
+
+        if matrix.ndim not in [2, 3] or matrix.shape[-2:] != (4, 4):
+            raise ValueError("The matrix needs to be 4x4, or a stack of 4x4 matrices")
+
+        self._matrix = matrix
+
+    @classmethod
+    def from_parts(cls, linear: np.ndarray = None, translation: np.ndarray = None):
+        """
+        alternate constructor to make the transform x -> A x + t
+        :param linear: (3, 3) matrix, or (frames, 3, 3)
+        :param translation: (3,) vector, or (frames, 3)
+        :return: AffineTransform
+        """
+        linear = np.eye(3) if linear is None else np.asarray(linear, dtype=np.float64)
+        translation = np.zeros(3) if translation is None else np.asarray(translation, dtype=np.float64)
+        shape = np.broadcast_shapes(linear.shape[:-2], translation.shape[:-1])
+        matrix = np.zeros(shape + (4, 4))
+        matrix[..., :3, :3] = linear
+        matrix[..., :3, 3] = translation
+        matrix[..., 3, 3] = 1
+        return cls(matrix)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        alternate constructor to make a transform from the output of to_dict
+        :param data: dictionary with the matrix
+        :return: AffineTransform
+        """
+        return cls(np.array(data['matrix'], dtype=np.float64))
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix
+
+    @property
+    def linear(self) -> np.ndarray:
+        return self._matrix[..., :3, :3]
+
+    @property
+    def translation(self) -> np.ndarray:
+        return self._matrix[..., :3, 3]
+
+    @property
+    def is_identity(self) -> bool:
+        return bool(np.array_equal(self._matrix, np.broadcast_to(np.eye(4), self._matrix.shape)))
+
+    def then(self, other: AffineTransform) -> AffineTransform:
+        """
+        Function to compose this transform with one applied after it
+        :param other: the transform to apply after this one
+        :return: the combined transform
+        """
+        return AffineTransform(np.matmul(other.matrix, self._matrix))
+
+    def inverse(self) -> AffineTransform:
+        return AffineTransform(np.linalg.inv(self._matrix))
+
+    def apply(self, coordinates: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Function to transform coordinates
+        :param coordinates: (N, 3) or (frames, N, 3) array
+        :param out: array to write the result to, which can be the coordinates
+        :return: the transformed coordinates
+        """
+        transformed = np.matmul(coordinates, np.swapaxes(self.linear, -1, -2))
+        transformed += self.translation[..., None, :] if self._matrix.ndim == 3 else self.translation
+
+        if out is None:
+            return transformed
+
+        out[...] = transformed
+        return out
+
+    def to_dict(self) -> dict:
+        return {'matrix': self._matrix.tolist()}
+
+
 class CoordinateTransformer:
 
-    def __init__(self, data: pd.DataFrame, x: str = 'x', y: str = 'y', z: str = 'z'):
+    def __init__(self, data: pd.DataFrame | np.ndarray, x: str = 'x', y: str = 'y', z: str = 'z',
+                 in_place: bool = False):
         """
-        class to take coordinate data and perform transformations
-        :param data: pandas dataframe with the coordinates
+        class to take coordinate data and perform transformations. The coordinates are held as one (N, 3) array, or a
+        (frames, N, 3) array for a trajectory. Transformations are recorded as one 4x4 affine matrix, or one per
+        frame, and only applied to the coordinates when the data is accessed, so any chain of transformations costs a
+        single matrix multiplication.
+        Each transformation starts from the current coordinates, so two rotations of 41 degrees are the same as one of
+        82 degrees. Earlier versions always rotated the coordinates that were passed in, and changed the given
+        dataframe straight away. Now a copy is transformed unless in_place is True
+        :param data: pandas dataframe with the coordinates, or an array of shape (N, 3) or (frames, N, 3)
         :param x: column name with the x coordinates
         :param y: column name with the y coordinates
         :param z: column name with the z coordinates
+        :param in_place: transform the given dataframe or float64 array rather than a copy of it. It is updated when the
+        data is accessed or flush is called
         :return: self
         """
+        self._x_name = x
+        self._y_name = y
+        self._z_name = z
+        self._in_place = in_place
+        self._pending = AffineTransform()
+        self._total = AffineTransform()
 
-        if x not in data.columns:
-            raise ValueError("Your x column isn't in your coordinates")
-        elif y not in data.columns:
-            raise ValueError("Your y column isn't in your coordinates")
-        elif z not in data.columns:
-            raise ValueError("Your z column isn't in your coordinates")
-        else:
-            pass
-
-        if data[x].dtype not in ['int64', 'int32', 'float64', 'float32']:
-            raise ValueError("Check your x coordinate dtypes!")
-        elif data[y].dtype not in ['int64', 'int32', 'float64', 'float32']:
-            raise ValueError("Check your x coordinate dtypes!")
-        elif data[z].dtype not in ['int64', 'int32', 'float64', 'float32']:
-            raise ValueError("Check your x coordinate dtypes!")
-        else:
-            pass
+        if type(data) == pd.DataFrame:
+
+            if x not in data.columns:
+                raise ValueError("Your x column isn't in your coordinates")
+            elif y not in data.columns:
+                raise ValueError("Your y column isn't in your coordinates")
+            elif z not in data.columns:
+                raise ValueError("Your z column isn't in your coordinates")
+            else:
+                pass
+
+            if data[x].dtype not in ['int64', 'int32', 'float64', 'float32']:
+                raise ValueError("Check your x coordinate dtypes!")
+            elif data[y].dtype not in ['int64', 'int32', 'float64', 'float32']:
+                raise ValueError("Check your y coordinate dtypes!")
+            elif data[z].dtype not in ['int64', 'int32', 'float64', 'float32']:
+                raise ValueError("Check your z coordinate dtypes!")
+            else:
+                pass
+
+            self._data = data if in_place else data.copy()
+            self._coordinates = np.ascontiguousarray(data[[x, y, z]].to_numpy(dtype=np.float64))
+
+        elif type(data) == np.ndarray:
+
+            if data.ndim not in [2, 3] or data.shape[-1] != 3:
+                raise ValueError("Your coordinates need to have shape (N, 3) or (frames, N, 3)")
+
+            self._data = None
+            if in_place and data.dtype == np.float64:
+                self._coordinates = data
+            elif in_place:
+                raise ValueError("To transform an array in place it needs to be a float64 array")
+            else:
+                self._coordinates = np.ascontiguousarray(data, dtype=np.float64)
 
-        if len(data[x]) == len(data[y]) == len(data[z]):
-            pass
         else:
-            raise ValueError("Check your column lengths")
+            raise ValueError("data needs to be a pd.DataFrame or a np.ndarray")
 
-        self._x_name = x
-        self._y_name = y
-        self._z_name = z
-        self._n = range(0, len(data[x]))
-        self._data = data
-        self._coordinates = [np.array([
-            [self._data[x].iloc[i]],
-            [self._data[y].iloc[i]],
-            [self._data[z].iloc[i]]]) for i in self._n]
+    @property
+    def data(self) -> pd.DataFrame | np.ndarray:
+        self.flush()
+        return self._data if self._data is not None else self._coordinates
 
     @property
-    def data(self):
-        return self._data
+    def coordinates(self) -> np.ndarray:
+        self.flush()
+        return self._coordinates
 
-    def rotate(self, theta_x: float = 0, theta_y: float = 0, theta_z: float = 0):
+    @property
+    def n_frames(self) -> int:
+        return self._coordinates.shape[0] if self._coordinates.ndim == 3 else 1
+
+    def flush(self):
+        """
+        Function to apply the recorded transformations to the coordinates, and write them back to the dataframe
+        :return: self
+        """
+        if self._pending.is_identity:
+            return self
+
+        if self._in_place:
+            self._pending.apply(self._coordinates, out=self._coordinates)
+        else:
+            self._coordinates = self._pending.apply(self._coordinates)
+
+        self._pending = AffineTransform()
+
+        if self._data is not None:
+            self._data[self._x_name] = self._coordinates[:, 0]
+            self._data[self._y_name] = self._coordinates[:, 1]
+            self._data[self._z_name] = self._coordinates[:, 2]
+
+        return self
+
+    def _apply(self, linear: np.ndarray = None, translation: np.ndarray = None):
+        """
+        Function to record x -> A x + t to apply after the other transformations
+        :param linear: (3, 3) matrix, or (frames, 3, 3) for a different matrix in each frame
+        :param translation: (3,) vector, or (frames, 3) for a different vector in each frame
+        :return: self
+        """
+        return self.transform(AffineTransform.from_parts(linear, translation))
+
+    def get_transform(self) -> AffineTransform:
+        """
+        Function to get the transformation from the original coordinates to the current coordinates, which can be
+        saved with to_dict and applied to other coordinates
+        :return: AffineTransform
+        """
+        return self._total
+
+    def invert(self):
+        """
+        function to undo all the transformations, bringing the coordinates back to where they started
+        :return:
         """
-        function to rotate coordinates
+        return self.transform(self._total.inverse())
+
+    @staticmethod
+    def get_rotation_matrix(theta_x: float = 0, theta_y: float = 0, theta_z: float = 0) -> np.ndarray:
+        """
+        function to get the matrix for a rotation around the x, then the y, then the z axis
         :param theta_x: rotation around the x-axis, in degrees
         :param theta_y: rotation around the y-axis, in degrees
         :param theta_z: rotation around the z-axis, in degrees
-        :return:
+        :return: (3, 3) rotation matrix
         """
         # convert degrees to radians
         theta_x = theta_x * 0.0174533
@@ -83,14 +251,111 @@ class CoordinateTransformer:
             [0, 0, 1]
         ])
 
-        r = np.matmul(rz, np.matmul(ry, rx))
+        return np.matmul(rz, np.matmul(ry, rx))
 
-        # matrix multiply to get the new coordinates
-        new_coords = [np.matmul(r, self._coordinates[i]) for i in self._n]
+    def rotate(self, theta_x: float = 0, theta_y: float = 0, theta_z: float = 0):
+        """
+        function to rotate coordinates about the origin, after any transformations already done
+        :param theta_x: rotation around the x-axis, in degrees
+        :param theta_y: rotation around the y-axis, in degrees
+        :param theta_z: rotation around the z-axis, in degrees
+        :return:
+        """
+        return self._apply(linear=self.get_rotation_matrix(theta_x, theta_y, theta_z))
 
-        # write out to self
-        self._data[self._x_name] = [c.flat[0] for c in new_coords]
-        self._data[self._y_name] = [c.flat[1] for c in new_coords]
-        self._data[self._z_name] = [c.flat[2] for c in new_coords]
+    def translate(self, dx: float = 0, dy: float = 0, dz: float = 0):
+        """
+        function to move the coordinates
+        :param dx: shift in x
+        :param dy: shift in y
+        :param dz: shift in z
+        :return:
+        """
+        return self._apply(translation=np.array([dx, dy, dz], dtype=np.float64))
+
+    def transform(self, matrix: np.ndarray | AffineTransform):
+        """
+        function to apply a general linear or affine transformation to the coordinates
+        :param matrix: (3, 3) linear or (4, 4) affine matrix, a stack of them with one for each frame, or an
+        AffineTransform
+        :return:
+        """
+        if type(matrix) != AffineTransform:
+            matrix = np.asarray(matrix, dtype=np.float64)
+            if matrix.shape[-2:] == (3, 3):
+                matrix = AffineTransform.from_parts(linear=matrix)
+            elif matrix.shape[-2:] == (4, 4):
+                matrix = AffineTransform(matrix)
+            else:
+                raise ValueError("The matrix needs to be 3x3 or 4x4")
+
+        if matrix.matrix.ndim == 3 and matrix.matrix.shape[0] != self.n_frames:
+            raise ValueError("Give one matrix for each frame")
+
+        self._pending = self._pending.then(matrix)
+        self._total = self._total.then(matrix)
 
         return self
+
+    def _get_centres(self, weights: np.ndarray = None) -> np.ndarray:
+        """
+        function to get the centre of the coordinates in each frame, without applying the recorded transformations
+        :param weights: weight of each coordinate, such as the masses, for a weighted centre
+        :return: (3,) centre, or (frames, 3) for a trajectory
+        """
+        if weights is None:
+            return self._coordinates.mean(axis=-2)
+
+        weights = np.asarray(weights, dtype=np.float64)
+        return np.matmul(weights, self._coordinates) / weights.sum()
+
+    def _get_transformed_centres(self, weights: np.ndarray = None) -> np.ndarray:
+        """
+        function to get the centre of the transformed coordinates in each frame. As the transformations are affine,
+        this is the transformed centre of the coordinates, so they don't need to be applied
+        :param weights: weight of each coordinate
+        :return: (3,) centre, or (frames, 3) for a trajectory
+        """
+        centres = self._get_centres(weights)
+        return np.matmul(self._pending.linear, centres[..., None])[..., 0] + self._pending.translation
+
+    def centre(self, weights: np.ndarray = None):
+        """
+        function to move the coordinates so their centre is at the origin, in each frame
+        :param weights: weight of each coordinate, such as the masses, to centre the centre of mass
+        :return:
+        """
+        return self._apply(translation=-self._get_transformed_centres(weights))
+
+    def align(self, reference: np.ndarray | pd.DataFrame, weights: np.ndarray = None):
+        """
+        function to rotate and move the coordinates onto reference coordinates with the smallest root mean square
+        deviation, using the Kabsch algorithm. Each frame of a trajectory is aligned on its own
+        :param reference: (N, 3) array or dataframe with the reference coordinates, in the same order
+        :param weights: weight of each coordinate in the fit
+        :return:
+        """
+        if type(reference) == pd.DataFrame:
+            reference = reference[[self._x_name, self._y_name, self._z_name]].to_numpy(dtype=np.float64)
+
+        reference = np.asarray(reference, dtype=np.float64)
+
+        if reference.shape != self._coordinates.shape[-2:]:
+            raise ValueError("The reference needs to have the same number of coordinates")
+
+        weights = np.ones(reference.shape[0]) if weights is None else np.asarray(weights, dtype=np.float64)
+        raw_centres = self._get_centres(weights)
+        centres = self._get_transformed_centres(weights)
+        reference_centre = np.matmul(weights, reference) / weights.sum()
+
+        # the covariance of the transformed coordinates is the linear part times the covariance of the raw ones
+        covariance = np.matmul(self._pending.linear,
+                               np.matmul(np.swapaxes(self._coordinates - raw_centres[..., None, :], -1, -2),
+                                         (reference - reference_centre) * weights[:, None]))
+        u, _, vt = np.linalg.svd(covariance)
+        sign = np.sign(np.linalg.det(np.matmul(u, vt)))
+        u[..., :, 2] = u[..., :, 2] * sign[..., None]
+        rotation = np.swapaxes(np.matmul(u, vt), -1, -2)
+        translation = reference_centre - np.matmul(centres[..., None, :], np.swapaxes(rotation, -1, -2))[..., 0, :]
+
+        return self._apply(linear=rotation, translation=translation)
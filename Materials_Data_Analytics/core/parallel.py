@@ -0,0 +1,88 @@
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def get_n_workers(n_jobs: int = None) -> int:
+    """
+    Function to get the number of processes to use from an n_jobs argument
+    :param n_jobs: None or 1 for one process, a positive integer, or -1 to use all cores
+    :return: the number of processes
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs == -1:
+        return os.cpu_count()
+    if type(n_jobs) != int or n_jobs < 1:
+        raise ValueError("n_jobs needs to be a positive integer or -1")
+
+    return n_jobs
+
+
+def iter_jobs(function, arg_list: list[tuple], n_jobs: int = None):
+    """
+    Generator to call a function on a list of arguments, in a process pool if n_jobs is more than one. The results are
+    given in the same order as the arguments as soon as they are ready, and the calls still waiting to start are
+    cancelled if the generator is closed early or the caller raises
+    :param function: module level function to call
+    :param arg_list: list of tuples with the arguments for each call
+    :param n_jobs: number of processes to use. If None or 1 the calls are done one after the other, and -1 uses all cores
+    :return: generator of the results
+    """
+    n_workers = get_n_workers(n_jobs)
+
+    if n_workers == 1 or len(arg_list) <= 1:
+        for a in arg_list:
+            yield function(*a)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(n_workers, len(arg_list)))
+    try:
+        yield from executor.map(function, *zip(*arg_list))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def map_jobs(function, arg_list: list[tuple], n_jobs: int = None) -> list:
+    """
+    Function to call a function on a list of arguments, in a process pool if n_jobs is more than one
+    :param function: module level function to call
+    :param arg_list: list of tuples with the arguments for each call
+    :param n_jobs: number of processes to use. If None or 1 the calls are done one after the other, and -1 uses all cores
+    :return: list with the result of each call, in the same order as the arguments
+    """
+    return list(iter_jobs(function, arg_list, n_jobs))
+
+
+def iter_jobs_as_completed(function, arg_list: list[tuple], n_jobs: int = None, kwargs: dict = None):
+    """
+    Generator to call a function on a list of arguments, in a process pool if n_jobs is more than one, giving the
+    results in the order they finish. The errors of each call are caught, including a worker process dying, so that one
+    bad call doesn't stop the rest
+    :param function: module level function to call
+    :param arg_list: list of tuples with the arguments for each call
+    :param n_jobs: number of processes to use. If None or 1 the calls are done one after the other, and -1 uses all cores
+    :param kwargs: keyword arguments given to every call
+    :return: generator of tuples of the index of the arguments, the result, and the error raised or None
+    """
+    kwargs = {} if kwargs is None else kwargs
+    n_workers = get_n_workers(n_jobs)
+
+    def get_result(call):
+        try:
+            return call(), None
+        except Exception as error:
+            return None, error
+
+    if n_workers == 1 or len(arg_list) <= 1:
+        for i, a in enumerate(arg_list):
+            yield (i, *get_result(lambda: function(*a, **kwargs)))
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(n_workers, len(arg_list)))
+    try:
+        futures = {executor.submit(function, *a, **kwargs): i for i, a in enumerate(arg_list)}
+        for future in as_completed(futures):
+            yield (futures[future], *get_result(future.result))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,490 @@
+from __future__ import annotations
+import os
+import heapq
+import numpy as np
+import pandas as pd
+import networkx as nx
+import MDAnalysis as mda
+from MDAnalysis.lib.distances import capped_distance
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from Materials_Data_Analytics.core.trajectory_analysis import FrameAnalysis, ColumnWriter
+from Materials_Data_Analytics.core.parallel import iter_jobs_as_completed, get_n_workers
+
+# record in the binary chunk files and the .npy contact output. Each frame is written as its contacts followed by a
+# record with ref = -1, so a frame is only complete once that end record is in the file, and frames without any
+# contacts are still kept
+CONTACT_RECORD = np.dtype([('frame', np.int64), ('time', np.float64), ('ref', np.int32), ('sel', np.int32),
+                           ('n', np.int32)])
+
+
+class FragmentContactAnalysis(FrameAnalysis):
+    """
+    Number of contacts between the fragments (e.g. polymer chains) of a universe in each frame. Rather than getting the
+    distances between every pair of fragments, one neighbour search is done over all the selected atoms in a frame, and
+    the atom pairs found are mapped to fragment pairs with arrays of the fragment of each atom.
+    Contacts are counted between the reference atoms of fragment ref and the selection atoms of fragment sel, for each
+    pair with ref < sel
+    """
+    def __init__(self, name: str, reference: str, selection: str, n_fragments: int, radius: float = 4,
+                 pbc: bool = False):
+        """
+        :param name: name of the analysis
+        :param reference: MDAnalysis selection for the reference atoms in each fragment
+        :param selection: MDAnalysis selection for the selection atoms in each fragment
+        :param n_fragments: number of fragments to look at, taken in order from the start of the universe
+        :param radius: cut-off in angstrom
+        :param pbc: use the periodic box for the distances
+        """
+        super().__init__(name)
+        self.reference = reference
+        self.selection = selection
+        self.n_fragments = n_fragments
+        self.radius = radius
+        self.pbc = pbc
+
+    def setup(self, universe: mda.Universe):
+        """
+        Function to get the reference and selection atoms, and the fragment index of each of them
+        :param universe: the MDAnalysis universe
+        :return: reference atoms, their fragments, selection atoms, their fragments
+        """
+        fragment_indices = universe.atoms.fragindices
+        state = []
+
+        for selection in [self.reference, self.selection]:
+            group = universe.select_atoms(selection)
+            group = group[fragment_indices[group.ix] < self.n_fragments]
+            state.extend([group, fragment_indices[group.ix]])
+
+        return tuple(state)
+
+    def get_contacts(self, universe: mda.Universe, state) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Function to get the fragment pairs in contact in the current frame
+        :param universe: the MDAnalysis universe, with the trajectory at the current frame
+        :param state: what setup returned
+        :return: the ref fragments, sel fragments and the number of contacts for each pair with contacts
+        """
+        reference, reference_fragments, selection, selection_fragments = state
+        box = universe.trajectory.ts.dimensions if self.pbc else None
+        pairs = capped_distance(reference.positions, selection.positions, self.radius, box=box,
+                                return_distances=False)
+
+        ref = reference_fragments[pairs[:, 0]]
+        sel = selection_fragments[pairs[:, 1]]
+        keep = ref < sel
+        pair_index, n = np.unique(ref[keep] * self.n_fragments + sel[keep], return_counts=True)
+
+        return pair_index // self.n_fragments, pair_index % self.n_fragments, n
+
+    def get_pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Function to get all the fragment pairs with ref < sel
+        :return: the ref fragments and the sel fragments
+        """
+        return np.triu_indices(self.n_fragments, k=1)
+
+    def get_counts(self, universe: mda.Universe, state) -> np.ndarray:
+        """
+        Function to get the number of contacts for every fragment pair in the current frame
+        :param universe: the MDAnalysis universe, with the trajectory at the current frame
+        :param state: what setup returned
+        :return: number of contacts, in the order of get_pairs
+        """
+        ref, sel, n = self.get_contacts(universe, state)
+        matrix = np.zeros((self.n_fragments, self.n_fragments), dtype=int)
+        matrix[ref, sel] = n
+        return matrix[self.get_pairs()]
+
+    def compute(self, universe: mda.Universe, state) -> dict[str, int]:
+        ref, sel = self.get_pairs()
+        return dict(zip([f"{r}_{s}" for r, s in zip(ref, sel)], self.get_counts(universe, state)))
+
+
+def get_fragment_contacts(universe: mda.Universe, analysis: FragmentContactAnalysis, frames=None,
+                          sparse: bool = False, callback=None) -> pd.DataFrame:
+    """
+    Function to get the contacts between fragments over the frames of a trajectory
+    :param universe: the MDAnalysis universe
+    :param analysis: the fragment contact analysis
+    :param frames: frame indices or a slice, by default all the frames
+    :param sparse: only keep the pairs with contacts
+    :param callback: function called with each timestep, e.g. for progress
+    :return: data frame with the time, ref, sel and n for each pair and frame
+    """
+    frames = slice(None) if frames is None else frames
+    state = analysis.setup(universe)
+    all_ref, all_sel = analysis.get_pairs()
+    time, ref, sel, n = [], [], [], []
+
+    for ts in universe.trajectory[frames]:
+        if callback is not None:
+            callback(ts)
+        if sparse:
+            frame_ref, frame_sel, frame_n = analysis.get_contacts(universe, state)
+        else:
+            frame_ref, frame_sel, frame_n = all_ref, all_sel, analysis.get_counts(universe, state)
+        time.append(np.full(len(frame_n), ts.time))
+        ref.append(frame_ref)
+        sel.append(frame_sel)
+        n.append(frame_n)
+
+    if len(time) == 0:
+        return pd.DataFrame({'time': [], 'ref': [], 'sel': [], 'n': []})
+
+    return pd.DataFrame({
+        'time': np.concatenate(time),
+        'ref': np.concatenate(ref),
+        'sel': np.concatenate(sel),
+        'n': np.concatenate(n)
+    })
+
+
+def _write_contact_chunk(topology_file: str, trajectory_file: str, analysis: FragmentContactAnalysis,
+                         frames: np.ndarray, file: str, sparse: bool = False, callback=None) -> int:
+    """
+    Function to get the contacts for some frames and append them to a binary chunk file one frame at a time, so that
+    nothing is kept in memory and everything written before a crash can be used
+    :param topology_file: topology file for the universe
+    :param trajectory_file: trajectory file for the universe
+    :param analysis: the fragment contact analysis
+    :param frames: the frame indices to go over
+    :param file: the chunk file to append to
+    :param sparse: only keep the pairs with contacts
+    :param callback: function called with each timestep, e.g. for progress
+    :return: the number of frames written
+    """
+    universe = mda.Universe(topology_file, trajectory_file)
+    state = analysis.setup(universe)
+    all_ref, all_sel = analysis.get_pairs()
+    n_frames = 0
+
+    with open(file, 'ab') as f:
+        for ts in universe.trajectory[frames]:
+            if callback is not None:
+                callback(ts)
+            if sparse:
+                ref, sel, n = analysis.get_contacts(universe, state)
+            else:
+                ref, sel, n = all_ref, all_sel, analysis.get_counts(universe, state)
+
+            records = np.zeros(len(n) + 1, dtype=CONTACT_RECORD)
+            records['frame'] = ts.frame
+            records['time'] = ts.time
+            records['ref'][:-1], records['sel'][:-1], records['n'][:-1] = ref, sel, n
+            records['ref'][-1] = records['sel'][-1] = -1
+            f.write(records.tobytes())
+            f.flush()
+            n_frames += 1
+
+    return n_frames
+
+
+def _read_chunk(file: str) -> np.ndarray:
+    n_records = os.path.getsize(file) // CONTACT_RECORD.itemsize
+    if n_records == 0:
+        return np.zeros(0, dtype=CONTACT_RECORD)
+    return np.memmap(file, dtype=CONTACT_RECORD, mode='r', shape=(n_records,))
+
+
+def _get_chunk_files(directory: str) -> list[str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.bin'))
+
+
+def get_done_frames(directory: str) -> np.ndarray:
+    """
+    Function to get the frames that are complete in a directory of chunk files. Anything after the last complete frame
+    of each file, left over from a crash, is cut off so that the file can be appended to again
+    :param directory: the directory with the chunk files
+    :return: the complete frames
+    """
+    done = [np.zeros(0, dtype=np.int64)]
+
+    for file in _get_chunk_files(directory):
+        records = _read_chunk(file)
+        ends = np.flatnonzero(records['ref'] < 0)
+        done.append(np.array(records['frame'][ends]))
+        keep = (ends[-1] + 1 if len(ends) > 0 else 0) * CONTACT_RECORD.itemsize
+        del records
+        if os.path.getsize(file) != keep:
+            os.truncate(file, keep)
+
+    return np.sort(np.concatenate(done))
+
+
+def _iter_chunk_frames(file: str):
+    """
+    Generator of the contacts of each complete frame in a chunk file, in the order they were written
+    :param file: the chunk file
+    :return: generator of tuples with the frame and its records, including the end record
+    """
+    records = _read_chunk(file)
+    ends = np.flatnonzero(records['ref'] < 0)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+
+    for start, end in zip(starts, ends):
+        yield int(records['frame'][end]), records[start:end + 1]
+
+
+def merge_contact_chunks(directory: str, output_file: str, block_size: int = 1000000):
+    """
+    Function to merge the chunk files in a directory into one output file, in order of frame. The frames of all the
+    files are merged as they are read, so only about block_size contacts are held in memory
+    :param directory: the directory with the chunk files
+    :param output_file: a .npy file for the sparse (frame, ref, sel, n) records that ContactNetwork reads, a .parquet
+    file, or a tab separated file with any other extension
+    :param block_size: number of contacts to write at once
+    """
+    frames = heapq.merge(*[_iter_chunk_frames(f) for f in _get_chunk_files(directory)], key=lambda x: x[0])
+
+    if output_file.endswith('.npy'):
+        n_records = 0
+        for file in _get_chunk_files(directory):
+            ends = np.flatnonzero(_read_chunk(file)['ref'] < 0)
+            n_records += ends[-1] + 1 if len(ends) > 0 else 0
+        output = np.lib.format.open_memmap(output_file, mode='w+', dtype=CONTACT_RECORD, shape=(n_records,))
+        position = 0
+        for _, records in frames:
+            output[position:position + len(records)] = records
+            position += len(records)
+        output.flush()
+        del output
+        return
+
+    writer = ColumnWriter(output_file)
+    block = [np.zeros(0, dtype=CONTACT_RECORD)]
+    n_block = 0
+    n_written = 0
+
+    try:
+        for _, records in frames:
+            block.append(np.array(records))
+            n_block += len(records)
+            if n_block >= block_size:
+                writer.write(_get_contact_frame(np.concatenate(block)))
+                block, n_block, n_written = [], 0, n_written + 1
+
+        if n_block > 0 or n_written == 0:
+            writer.write(_get_contact_frame(np.concatenate(block)))
+    finally:
+        writer.close()
+
+
+def _get_contact_frame(records: np.ndarray) -> pd.DataFrame:
+    records = records[records['ref'] >= 0]
+    return pd.DataFrame({'time': records['time'], 'ref': records['ref'], 'sel': records['sel'], 'n': records['n']})
+
+
+def run_fragment_contacts(topology_file: str, trajectory_file: str, analysis: FragmentContactAnalysis,
+                          output_file: str, frames=None, sparse: bool = False, n_jobs: int = None,
+                          resume: bool = False, chunk_directory: str = None, keep_chunks: bool = False,
+                          callback=None, shard_callback=None):
+    """
+    Function to get the contacts between fragments over a trajectory and write them to a file. The frames are split
+    into one contiguous shard per process, and each shard is appended to its own binary chunk file frame by frame. Once
+    all the shards are done, the chunk files are merged into the output file
+    :param topology_file: topology file for the universe
+    :param trajectory_file: trajectory file for the universe
+    :param analysis: the fragment contact analysis
+    :param output_file: a .npy file of sparse contact records, a .parquet file, or a tab separated file
+    :param frames: frame indices or a slice, by default all the frames
+    :param sparse: only keep the pairs with contacts
+    :param n_jobs: number of processes to use. If None or 1 the frames are done in this process, and -1 uses all cores
+    :param resume: keep the chunk files of an earlier run and skip the frames that are already done
+    :param chunk_directory: directory for the chunk files, by default the output file with .chunks on the end
+    :param keep_chunks: keep the chunk files after they are merged
+    :param callback: function called with each timestep, only used if the frames are done in this process
+    :param shard_callback: function called in this process with the number of frames done and the number of frames to
+    do each time a shard finishes, e.g. for progress when the frames are split over processes
+    """
+    chunk_directory = output_file + '.chunks' if chunk_directory is None else chunk_directory
+    frames = slice(None) if frames is None else frames
+    n_frames = len(mda.Universe(topology_file, trajectory_file).trajectory)
+    frames = np.arange(0, n_frames)[frames]
+
+    if resume:
+        frames = frames[~np.isin(frames, get_done_frames(chunk_directory))]
+    else:
+        for file in _get_chunk_files(chunk_directory):
+            os.remove(file)
+
+    os.makedirs(chunk_directory, exist_ok=True)
+    shards = [s for s in np.array_split(frames, get_n_workers(n_jobs)) if len(s) > 0]
+    callback = callback if n_jobs is None or n_jobs == 1 else None
+    arg_list = [(topology_file, trajectory_file, analysis, s, os.path.join(chunk_directory, f"chunk_{s[0]:09d}.bin"),
+                 sparse, callback) for s in shards]
+
+    # the shards are reported as they finish, and the first error stops the rest
+    jobs = iter_jobs_as_completed(_write_contact_chunk, arg_list, n_jobs)
+    n_done = 0
+    try:
+        for _, n_shard, error in jobs:
+            if error is not None:
+                raise error
+            n_done += n_shard
+            if shard_callback is not None:
+                shard_callback(n_done, len(frames))
+    finally:
+        jobs.close()
+
+    merge_contact_chunks(chunk_directory, output_file)
+
+    if not keep_chunks:
+        for file in _get_chunk_files(chunk_directory):
+            os.remove(file)
+        if len(os.listdir(chunk_directory)) == 0:
+            os.rmdir(chunk_directory)
+
+
+class ContactNetwork:
+    """
+    Class for the time series of contact networks between fragments, stored as sparse (frame, ref, sel, n) records.
+    The graphs for each frame are only built when they are asked for, and the cluster statistics are worked out frame
+    by frame from the records, so the graphs for the whole trajectory are never all in memory
+    """
+    def __init__(self, contacts: str | np.ndarray | pd.DataFrame, n_fragments: int = None):
+        """
+        :param contacts: a .npy file from run_fragment_contacts, an array of CONTACT_RECORD, or a data frame with
+        columns time, ref, sel and n, where each time is a frame
+        :param n_fragments: number of fragments in the network, by default one more than the highest fragment index
+        """
+        if type(contacts) == str:
+            records = np.load(contacts, mmap_mode='r')
+        elif type(contacts) == pd.DataFrame:
+            records = self._get_records(contacts)
+        elif type(contacts) in [np.ndarray, np.memmap] and contacts.dtype == CONTACT_RECORD:
+            records = contacts
+        else:
+            raise ValueError("contacts needs to be a .npy file, an array of contact records or a data frame")
+
+        self._records = records
+        self._ends = np.flatnonzero(records['ref'] < 0)
+        self._starts = np.concatenate([[0], self._ends[:-1] + 1]).astype(int)
+        self.frames = np.array(records['frame'][self._ends])
+        self.times = np.array(records['time'][self._ends])
+
+        if n_fragments is None:
+            n_fragments = int(max(records['ref'].max(initial=-1), records['sel'].max(initial=-1))) + 1
+        self.n_fragments = n_fragments
+
+    @staticmethod
+    def _get_records(data: pd.DataFrame) -> np.ndarray:
+        """
+        Function to turn a data frame of contacts into records, with an end record for each time
+        :param data: data frame with columns time, ref, sel and n
+        :return: array of CONTACT_RECORD ordered by frame
+        """
+        times = np.unique(data['time'].to_numpy())
+        records = np.zeros(len(data) + len(times), dtype=CONTACT_RECORD)
+        frame = np.concatenate([np.searchsorted(times, data['time'].to_numpy()), np.arange(0, len(times))])
+        records['frame'] = frame
+        records['time'] = times[frame]
+        records['ref'] = np.concatenate([data['ref'].to_numpy(), np.full(len(times), -1)])
+        records['sel'] = np.concatenate([data['sel'].to_numpy(), np.full(len(times), -1)])
+        records['n'] = np.concatenate([data['n'].to_numpy(), np.zeros(len(times))])
+
+        return records[np.lexsort((records['ref'] < 0, records['frame']))]
+
+    def _get_frame_edges(self, index: int, min_contacts: int = 1) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        records = np.array(self._records[self._starts[index]:self._ends[index]])
+        records = records[records['n'] >= min_contacts]
+        return records['ref'], records['sel'], records['n']
+
+    def get_graph(self, frame: int, min_contacts: int = 1) -> nx.Graph:
+        """
+        Function to get the contact network of one frame
+        :param frame: the frame
+        :param min_contacts: smallest number of contacts for a pair of fragments to be joined
+        :return: graph with a node for each fragment and an edge with a weight of the number of contacts
+        """
+        index = np.flatnonzero(self.frames == frame)
+        if len(index) == 0:
+            raise ValueError(f"Frame {frame} is not in the contacts")
+
+        ref, sel, n = self._get_frame_edges(index[0], min_contacts)
+        graph = nx.Graph(frame=frame, time=self.times[index[0]])
+        graph.add_nodes_from(range(0, self.n_fragments))
+        graph.add_weighted_edges_from(zip(ref.tolist(), sel.tolist(), n.tolist()))
+
+        return graph
+
+    def iter_graphs(self, min_contacts: int = 1):
+        """
+        Generator of the contact network of each frame, built one at a time
+        :param min_contacts: smallest number of contacts for a pair of fragments to be joined
+        :return: generator of graphs
+        """
+        for frame in self.frames:
+            yield self.get_graph(frame, min_contacts)
+
+    def get_average_graph(self, min_contacts: int = 1, min_occupancy: float = 0, block_size: int = 1000000) -> nx.Graph:
+        """
+        Function to get the time averaged contact network. The records are read a block at a time
+        :param min_contacts: smallest number of contacts for a pair to count as joined in a frame
+        :param min_occupancy: smallest fraction of frames a pair needs to be joined in to get an edge
+        :param block_size: number of records to read at once
+        :return: graph with edges weighted by the mean number of contacts, and the occupancy of each edge
+        """
+        n_pairs = self.n_fragments * self.n_fragments
+        total = np.zeros(n_pairs)
+        joined = np.zeros(n_pairs)
+
+        for start in range(0, len(self._records), block_size):
+            records = np.array(self._records[start:start + block_size])
+            records = records[(records['ref'] >= 0) & (records['n'] >= min_contacts)]
+            pair_index = records['ref'].astype(np.int64) * self.n_fragments + records['sel']
+            total += np.bincount(pair_index, weights=records['n'], minlength=n_pairs)
+            joined += np.bincount(pair_index, minlength=n_pairs)
+
+        n_frames = max(len(self.frames), 1)
+        occupancy = joined / n_frames
+        pairs = np.flatnonzero((joined > 0) & (occupancy >= min_occupancy))
+        graph = nx.Graph()
+        graph.add_nodes_from(range(0, self.n_fragments))
+        for p in pairs:
+            graph.add_edge(int(p // self.n_fragments), int(p % self.n_fragments), weight=total[p] / n_frames,
+                           occupancy=occupancy[p])
+
+        return graph
+
+    def get_cluster_statistics(self, min_contacts: int = 1, percolation_fraction: float = 0.5) -> pd.DataFrame:
+        """
+        Function to get the clusters of connected fragments in each frame
+        :param min_contacts: smallest number of contacts for a pair of fragments to be joined
+        :param percolation_fraction: fraction of the fragments the largest cluster needs for the network to count as
+        percolating
+        :return: data frame with the frame, time, number of clusters, largest cluster size, mean cluster size and whether
+        the network percolates, with a row per frame
+        """
+        n_clusters, largest, mean = [], [], []
+
+        for index in range(0, len(self.frames)):
+            ref, sel, _ = self._get_frame_edges(index, min_contacts)
+            adjacency = coo_matrix((np.ones(len(ref)), (ref, sel)), shape=(self.n_fragments, self.n_fragments))
+            n, labels = connected_components(adjacency, directed=False)
+            sizes = np.bincount(labels)
+            n_clusters.append(n)
+            largest.append(sizes.max(initial=0))
+            mean.append(sizes.mean() if n > 0 else 0)
+
+        return pd.DataFrame({
+            'frame': self.frames,
+            'time': self.times,
+            'n_clusters': n_clusters,
+            'largest_cluster': largest,
+            'mean_cluster_size': mean,
+            'percolating': np.array(largest) >= percolation_fraction * self.n_fragments
+        })
+
+    def get_percolation_probability(self, min_contacts: int = 1, percolation_fraction: float = 0.5) -> float:
+        """
+        Function to get the fraction of frames where the contact network percolates
+        :param min_contacts: smallest number of contacts for a pair of fragments to be joined
+        :param percolation_fraction: fraction of the fragments the largest cluster needs for the network to count as
+        percolating
+        :return: the fraction of frames
+        """
+        return float(self.get_cluster_statistics(min_contacts, percolation_fraction)['percolating'].mean())
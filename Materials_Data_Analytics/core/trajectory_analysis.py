@@ -0,0 +1,179 @@
+from __future__ import annotations
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+import MDAnalysis as mda
+from MDAnalysis.lib.distances import capped_distance, distance_array, calc_bonds
+
+
+class FrameAnalysis(ABC):
+    """
+    Base class for an analysis that gives some values for each frame of a trajectory. Analyses are registered on a
+    Universe and all run in the same pass over the trajectory. To make a new analysis, override setup to select the atoms
+    needed once, and compute to get the values for the current frame.
+    """
+    def __init__(self, name: str):
+        """
+        :param name: name of the analysis, used for the output columns
+        """
+        self.name = name
+
+    def setup(self, universe: mda.Universe):
+        """
+        Function called once before the pass over the trajectory, to select the atoms the analysis needs
+        :param universe: the MDAnalysis universe
+        :return: anything the analysis needs in compute
+        """
+        return None
+
+    @abstractmethod
+    def compute(self, universe: mda.Universe, state) -> float | dict[str, float]:
+        """
+        Function to get the values for the current frame of the universe
+        :param universe: the MDAnalysis universe, with the trajectory at the current frame
+        :param state: what setup returned
+        :return: a value, or a dict of values which become the columns name_key
+        """
+
+    def get_columns(self, values: float | dict[str, float]) -> dict[str, float]:
+        if type(values) == dict:
+            return {f"{self.name}_{k}": v for k, v in values.items()}
+        return {self.name: values}
+
+
+class DistanceAnalysis(FrameAnalysis):
+    """
+    Distance between two atom selections in each frame, either between their centres of mass or the closest atoms
+    """
+    def __init__(self, name: str, selection_1: str, selection_2: str, method: str = 'centre_of_mass'):
+        """
+        :param name: name of the analysis
+        :param selection_1: MDAnalysis selection for the first group
+        :param selection_2: MDAnalysis selection for the second group
+        :param method: 'centre_of_mass' or 'minimum'
+        """
+        super().__init__(name)
+
+        if method not in ['centre_of_mass', 'minimum']:
+            raise ValueError("method needs to be 'centre_of_mass' or 'minimum'")
+
+        self.selection_1 = selection_1
+        self.selection_2 = selection_2
+        self.method = method
+
+    def setup(self, universe: mda.Universe):
+        return universe.select_atoms(self.selection_1), universe.select_atoms(self.selection_2)
+
+    def compute(self, universe: mda.Universe, state) -> float:
+        group_1, group_2 = state
+        box = universe.trajectory.ts.dimensions
+
+        if self.method == 'centre_of_mass':
+            return float(calc_bonds(group_1.center_of_mass(), group_2.center_of_mass(), box=box))
+
+        return float(distance_array(group_1.positions, group_2.positions, box=box).min())
+
+
+class ContactAnalysis(FrameAnalysis):
+    """
+    Number of atom pairs between two selections that are closer than a cut-off in each frame
+    """
+    def __init__(self, name: str, reference: str, selection: str, radius: float = 4):
+        """
+        :param name: name of the analysis
+        :param reference: MDAnalysis selection for the reference group
+        :param selection: MDAnalysis selection for the other group
+        :param radius: cut-off in angstrom
+        """
+        super().__init__(name)
+        self.reference = reference
+        self.selection = selection
+        self.radius = radius
+
+    def setup(self, universe: mda.Universe):
+        return universe.select_atoms(self.reference), universe.select_atoms(self.selection)
+
+    def compute(self, universe: mda.Universe, state) -> int:
+        reference, selection = state
+        pairs = capped_distance(reference.positions, selection.positions, self.radius,
+                                box=universe.trajectory.ts.dimensions, return_distances=False)
+        return len(pairs)
+
+
+class CVAnalysis(FrameAnalysis):
+    """
+    Collective variable recomputed from the coordinates of each frame with a user function. To run in parallel, the
+    function needs to be defined at the top level of a module so it can be sent to the worker processes.
+    """
+    def __init__(self, name: str, function, selection: str = 'all'):
+        """
+        :param name: name of the analysis
+        :param function: function taking an atom group and returning a value or a dict of values
+        :param selection: MDAnalysis selection for the atom group given to the function
+        """
+        super().__init__(name)
+        self.function = function
+        self.selection = selection
+
+    def setup(self, universe: mda.Universe):
+        return universe.select_atoms(self.selection)
+
+    def compute(self, universe: mda.Universe, state) -> float | dict[str, float]:
+        return self.function(state)
+
+
+def run_frame_block(universe: mda.Universe, analyses: list[FrameAnalysis], frames: np.ndarray) -> pd.DataFrame:
+    """
+    Function to run a list of analyses over some frames of a universe, in one pass
+    :param universe: the MDAnalysis universe
+    :param analyses: the analyses to run
+    :param frames: the frame indices to go over
+    :return: data frame with the frame, the time and the columns of each analysis, with a row per frame
+    """
+    states = [a.setup(universe) for a in analyses]
+    columns = {'frame': [], 'time': []}
+
+    for ts in universe.trajectory[frames]:
+        columns['frame'].append(ts.frame)
+        columns['time'].append(ts.time)
+        for analysis, state in zip(analyses, states):
+            for key, value in analysis.get_columns(analysis.compute(universe, state)).items():
+                columns.setdefault(key, []).append(value)
+
+    return pd.DataFrame(columns)
+
+
+def _run_frame_block_from_files(topology_file: str, trajectory_file: str, analyses: list[FrameAnalysis],
+                                frames: np.ndarray) -> pd.DataFrame:
+    return run_frame_block(mda.Universe(topology_file, trajectory_file), analyses, frames)
+
+
+class ColumnWriter:
+    """
+    Class to stream blocks of rows to a file as they are made. Files ending in .parquet are written with pyarrow, one
+    row group per block, and anything else is written as a tab separated file
+    """
+    def __init__(self, file: str):
+        self.file = file
+        self._writer = None
+        self._parquet = file.endswith('.parquet')
+
+        if os.path.exists(file):
+            os.remove(file)
+
+    def write(self, data: pd.DataFrame):
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.file, table.schema)
+            self._writer.write_table(table)
+        else:
+            data.to_csv(self.file, sep="\t", index=False, mode='a', header=not os.path.exists(self.file))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -1,6 +1,11 @@
 from __future__ import annotations
+import numpy as np
+import pandas as pd
 import MDAnalysis as mda
 from Materials_Data_Analytics.metadynamics.free_energy import FreeEnergySpace
+from Materials_Data_Analytics.core.parallel import iter_jobs, get_n_workers
+from Materials_Data_Analytics.core.trajectory_analysis import FrameAnalysis, ColumnWriter, run_frame_block, \
+    _run_frame_block_from_files
 
 
 class Universe:
@@ -26,7 +31,72 @@ class Universe:
         else:
             raise ValueError("fes must be a FreeEnergyShape, or list of FreeEnergyShapes")
 
+        self._tpr_file = tpr_file
+        self._xtc_file = xtc_file
+        self._analyses = []
+
         if xtc_file and tpr_file:
             self._mdu = mda.Universe(tpr_file, xtc_file)
         else:
             self._mdu = None
+
+    def add_analysis(self, analysis: FrameAnalysis):
+        """
+        Function to register a per-frame analysis, to be run with the other registered analyses in one pass over the
+        trajectory
+        :param analysis: the analysis to add
+        :return: self
+        """
+        if analysis.name in [a.name for a in self._analyses]:
+            raise ValueError("There is already an analysis with that name")
+
+        self._analyses.append(analysis)
+
+        return self
+
+    def run_analyses(self, start: int = None, stop: int = None, step: int = None, n_jobs: int = None,
+                     output_file: str = None, block_size: int = 1000) -> pd.DataFrame | None:
+        """
+        Function to run all the registered analyses in one pass over the trajectory. The frames are split into blocks,
+        and the results of each block are written to the output file as soon as they are ready
+        :param start: first frame
+        :param stop: frame to stop before
+        :param step: take every step'th frame
+        :param n_jobs: number of processes to run blocks of frames in, -1 to use all cores. Each process opens its own
+        universe from the tpr and xtc files
+        :param output_file: file to stream the results to, a .parquet file or a tab separated file. If None the results
+        are returned
+        :param block_size: number of frames in each block
+        :return: data frame with a row for each frame, or None if the results are written to a file
+        """
+        if self._mdu is None:
+            raise ValueError("You need a tpr and xtc file in the universe to run analyses")
+        if len(self._analyses) == 0:
+            raise ValueError("Add some analyses before running them")
+
+        frames = np.arange(0, len(self._mdu.trajectory))[start:stop:step]
+        blocks = [frames[i:i + block_size] for i in range(0, len(frames), block_size)]
+        writer = ColumnWriter(output_file) if output_file is not None else None
+        results = []
+
+        if get_n_workers(n_jobs) == 1:
+            block_results = (run_frame_block(self._mdu, self._analyses, b) for b in blocks)
+        else:
+            block_results = iter_jobs(_run_frame_block_from_files,
+                                      [(self._tpr_file, self._xtc_file, self._analyses, b) for b in blocks], n_jobs)
+
+        try:
+            for block_result in block_results:
+                if writer is not None:
+                    writer.write(block_result)
+                else:
+                    results.append(block_result)
+        finally:
+            block_results.close()
+            if writer is not None:
+                writer.close()
+
+        if writer is not None:
+            return None
+
+        return pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=['frame', 'time'])
@@ -0,0 +1,289 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+
+# names that each column can have in Biologic exports, and the name they are given when read in
+BIOLOGIC_COLUMNS = {
+    'potential': ['Ewe/V', '<Ewe>/V', '<Ewe/V>'],
+    'current': ['<I>/mA', 'I/mA'],
+    'time': ['time/s']
+}
+
+MPR_MAGIC = b'BIO-LOGIC MODULAR FILE\x1a'
+
+# column ids in the VMP data module of .mpr files, with their names and types
+MPR_COLUMNS = {
+    4: ('time/s', '<f8'), 5: ('control/V/mA', '<f4'), 6: ('Ewe/V', '<f4'), 7: ('dQ/mA.h', '<f8'), 8: ('I/mA', '<f4'),
+    9: ('Ece/V', '<f4'), 11: ('I/mA', '<f8'), 13: ('(Q-Qo)/mA.h', '<f8'), 16: ('Analog IN 1/V', '<f4'),
+    19: ('control/V', '<f4'), 20: ('control/mA', '<f4'), 23: ('dQ/mA.h', '<f8'), 24: ('cycle number', '<f8'),
+    26: ('Rapp/Ohm', '<f4'), 32: ('freq/Hz', '<f4'), 33: ('|Ewe|/V', '<f4'), 34: ('|I|/A', '<f4'),
+    35: ('Phase(Z)/deg', '<f4'), 36: ('|Z|/Ohm', '<f4'), 37: ('Re(Z)/Ohm', '<f4'), 38: ('-Im(Z)/Ohm', '<f4'),
+    39: ('I Range', '<u2'), 69: ('R/Ohm', '<f4'), 70: ('P/W', '<f4'), 74: ('Energy/W.h', '<f8'),
+    75: ('Analog OUT/V', '<f4'), 76: ('<I>/mA', '<f4'), 77: ('<Ewe>/V', '<f4'), 78: ('Cs-2/µF-2', '<f4'),
+    96: ('|Ece|/V', '<f4'), 98: ('Phase(Zce)/deg', '<f4'), 99: ('|Zce|/Ohm', '<f4'), 100: ('Re(Zce)/Ohm', '<f4'),
+    101: ('-Im(Zce)/Ohm', '<f4'), 123: ('Energy charge/W.h', '<f8'), 124: ('Energy discharge/W.h', '<f8'),
+    125: ('Capacitance charge/µF', '<f8'), 126: ('Capacitance discharge/µF', '<f8'), 131: ('Ns', '<u2'),
+    163: ('|Estack|/V', '<f4'), 168: ('Rcmp/Ohm', '<f4'), 169: ('Cs/µF', '<f4'), 172: ('Cp/µF', '<f4'),
+    173: ('Cp-2/µF-2', '<f4'), 174: ('<Ewe>/V', '<f4'), 211: ('Q charge/discharge/mA.h', '<f8'), 241: ('|E1|/V', '<f4'), 242: ('|E2|/V', '<f4'),
+    271: ('Phase(Z1) / deg', '<f4'), 272: ('Phase(Z2) / deg', '<f4'), 301: ('|Z1|/Ohm', '<f4'),
+    302: ('|Z2|/Ohm', '<f4'), 331: ('Re(Z1)/Ohm', '<f4'), 332: ('Re(Z2)/Ohm', '<f4'), 361: ('-Im(Z1)/Ohm', '<f4'),
+    362: ('-Im(Z2)/Ohm', '<f4'), 391: ('<E1>/V', '<f4'), 392: ('<E2>/V', '<f4'), 422: ('Phase(Zstack)/deg', '<f4'),
+    423: ('|Zstack|/Ohm', '<f4'), 424: ('Re(Zstack)/Ohm', '<f4'), 425: ('-Im(Zstack)/Ohm', '<f4'),
+    426: ('<Estack>/V', '<f4'), 430: ('Phase(Zwe-ce)/deg', '<f4'), 431: ('|Zwe-ce|/Ohm', '<f4'),
+    432: ('Re(Zwe-ce)/Ohm', '<f4'), 433: ('-Im(Zwe-ce)/Ohm', '<f4'), 434: ('(Q-Qo)/C', '<f8'), 435: ('dQ/C', '<f8'),
+    441: ('<Ecv>/V', '<f4'), 462: ('Temperature/°C', '<f4'), 467: ('Q charge/discharge/mA.h', '<f8'),
+    468: ('half cycle', '<u4'), 469: ('z cycle', '<u4'), 471: ('<Ece>/V', '<f4'), 473: ('THD Ewe/%', '<f4'),
+    474: ('THD I/%', '<f4'), 476: ('NSD Ewe/%', '<f4'), 477: ('NSD I/%', '<f4'), 479: ('NSR Ewe/%', '<f4'),
+    480: ('NSR I/%', '<f4'), 486: ('|Ewe h2|/V', '<f4'), 487: ('|Ewe h3|/V', '<f4'), 488: ('|Ewe h4|/V', '<f4'),
+    489: ('|Ewe h5|/V', '<f4'), 490: ('|Ewe h6|/V', '<f4'), 491: ('|Ewe h7|/V', '<f4'), 492: ('|I h2|/A', '<f4'),
+    493: ('|I h3|/A', '<f4'), 494: ('|I h4|/A', '<f4'), 495: ('|I h5|/A', '<f4'), 496: ('|I h6|/A', '<f4'),
+    497: ('|I h7|/A', '<f4'), 498: ('Q charge/mA.h', '<f8'), 499: ('Q discharge/mA.h', '<f8'),
+    500: ('step time/s', '<f8'), 501: ('Efficiency/%', '<f8'), 502: ('Capacity/mA.h', '<f8')
+}
+
+# column ids that are bits of a single flags byte at the start of each record
+MPR_FLAGS = [1, 2, 3, 21, 31, 65]
+
+
+def read_biologic(path_or_buffer, columns: dict = None) -> pd.DataFrame:
+    """
+    Function to read the potential, current and time from a Biologic file, without parsing the other columns.
+    Text exports (.txt or .mpt, with or without the EC-Lab header block) and binary .mpr files can be read
+    :param path_or_buffer: path to the file, or a text buffer with the contents of a text export
+    :param columns: dict of the names to give the columns and the list of names each can have in the file. By default
+    the potential, current and time
+    :return: data frame with a float column for each of the columns
+    """
+    if type(path_or_buffer) == str and path_or_buffer.lower().endswith('.mpr'):
+        return read_biologic_mpr(path_or_buffer, columns)
+
+    return read_biologic_text(path_or_buffer, columns)
+
+
+def _get_column_names(header: list[str], columns: dict) -> dict:
+    """
+    Function to find which column in the file is used for each of the columns
+    :param header: the column names in the file
+    :param columns: dict of the names to give the columns and the list of names each can have in the file
+    :return: dict of the name in the file to the name to give it
+    """
+    names = {}
+    for name, options in columns.items():
+        found = [o for o in options if o in header]
+        if len(found) == 0:
+            raise ValueError(f"The Biologic file has no {name} column, looked for {', '.join(options)}")
+        names[found[0]] = name
+
+    return names
+
+
+def _read_text_header(buffer, columns: dict) -> dict:
+    """
+    Function to read the header of a Biologic text export, skipping the EC-Lab header block of .mpt files, and leave
+    the buffer at the first row
+    :param buffer: text buffer at the start of the file
+    :param columns: dict of the names to give the columns and the list of names each can have in the file
+    :return: dict of the position of each column needed to the name to give it
+    """
+    line = buffer.readline()
+    if line.startswith('EC-Lab ASCII FILE'):
+        n_header = int(re.search(r'(\d+)', buffer.readline()).group(1))
+        for _ in range(0, n_header - 3):
+            buffer.readline()
+        line = buffer.readline()
+
+    # the rows don't always have the trailing tab of the header, so the columns are picked by position
+    header = line.rstrip('\r\n').split('\t')
+    names = _get_column_names(header, columns)
+    return {header.index(n): names[n] for n in names.keys()}
+
+
+def _get_decimal(row: str) -> str:
+    return ',' if ',' in row and '.' not in row else '.'
+
+
+def _read_text_rows(rows, positions: dict, decimal: str) -> pd.DataFrame:
+    data = pd.read_csv(rows, sep='\t', header=None, usecols=list(positions.keys()), decimal=decimal,
+                       dtype={i: np.float64 for i in positions.keys()}, engine='c')
+    return data.rename(columns=positions)
+
+
+def read_biologic_text(path_or_buffer, columns: dict = None) -> pd.DataFrame:
+    """
+    Function to read the columns needed from a Biologic text export. The EC-Lab header block of .mpt files is skipped,
+    and commas are read as decimal points if the file uses them
+    :param path_or_buffer: path to the file, or a text buffer
+    :param columns: dict of the names to give the columns and the list of names each can have in the file
+    :return: data frame with a float column for each of the columns
+    """
+    columns = BIOLOGIC_COLUMNS if columns is None else columns
+    buffer = open(path_or_buffer, 'r', encoding='latin-1') if type(path_or_buffer) == str else path_or_buffer
+
+    try:
+        positions = _read_text_header(buffer, columns)
+        position = buffer.tell() if buffer.seekable() else None
+        first_row = buffer.readline()
+
+        if position is not None:
+            buffer.seek(position)
+            rows = buffer
+        else:
+            rows = io.StringIO(first_row + buffer.read())
+
+        data = _read_text_rows(rows, positions, _get_decimal(first_row))
+    finally:
+        if type(path_or_buffer) == str:
+            buffer.close()
+
+    return data[list(columns.keys())]
+
+
+class BiologicTail:
+    """
+    Class to read a Biologic text export while the potentiostat is still writing it. Each read gives the rows added
+    since the last one, and only complete lines are read so a row that is half written is left for the next read. The
+    rows are numbered on from the rows read before, the same as reading the whole file at once
+    """
+    def __init__(self, path: str, columns: dict = None):
+        """
+        :param path: path to the text export
+        :param columns: dict of the names to give the columns and the list of names each can have in the file
+        """
+        self.path = path
+        self.columns = BIOLOGIC_COLUMNS if columns is None else columns
+        self._offset = 0
+        self._positions = None
+        self._decimal = None
+        self._n_rows = 0
+
+    def read(self) -> pd.DataFrame:
+        """
+        Function to read the complete rows added to the file since the last read
+        :return: data frame with a float column for each of the columns, which is empty if there are no new rows
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            contents = f.read()
+
+        # latin-1 has one byte per character, so the number of characters read is the number of bytes to move on
+        text = contents[:contents.rfind(b'\n') + 1].decode('latin-1')
+        buffer = io.StringIO(text)
+
+        if self._positions is None:
+            if text.startswith('EC-Lab ASCII FILE'):
+                lines = text.splitlines()
+                n_header = int(re.search(r'(\d+)', lines[1]).group(1)) if len(lines) > 1 else None
+                if n_header is None or len(lines) < n_header:
+                    return self._make_frame(pd.DataFrame(columns=list(self.columns.keys()), dtype=np.float64))
+            elif len(text) == 0:
+                return self._make_frame(pd.DataFrame(columns=list(self.columns.keys()), dtype=np.float64))
+            self._positions = _read_text_header(buffer, self.columns)
+
+        rows = buffer.read()
+        self._offset += len(text)
+
+        if len(rows) == 0:
+            return self._make_frame(pd.DataFrame(columns=list(self.columns.keys()), dtype=np.float64))
+
+        if self._decimal is None:
+            self._decimal = _get_decimal(rows[:rows.find('\n')])
+
+        return self._make_frame(_read_text_rows(io.StringIO(rows), self._positions, self._decimal))
+
+    def _make_frame(self, data: pd.DataFrame) -> pd.DataFrame:
+        data.index = pd.RangeIndex(self._n_rows, self._n_rows + len(data))
+        self._n_rows += len(data)
+        return data[list(self.columns.keys())]
+
+
+def _get_mpr_modules(contents: bytes) -> dict:
+    """
+    Function to split the contents of a .mpr file into its modules. Each module starts with MODULE, a short and a long
+    name, and then a header which has a different length in different versions of EC-Lab, so both lengths are tried
+    and the one that ends the module at the start of the next module or the end of the file is used
+    :param contents: the bytes of the file
+    :return: dict of the short name of each module to a tuple of its version and its data
+    """
+    if not contents.startswith(MPR_MAGIC):
+        raise ValueError("This is not a Biologic .mpr file")
+
+    modules = {}
+    start = contents.find(b'MODULE')
+
+    while start != -1:
+        name = contents[start + 6:start + 16].decode('latin-1').strip()
+        for header in [np.dtype([('length', '<u4'), ('version', '<u4'), ('date', 'S8')]),
+                       np.dtype([('max_length', '<u4'), ('length', '<u4'), ('version', '<u4'), ('unknown', '<u4'),
+                                 ('date', 'S8')])]:
+            data_start = start + 6 + 10 + 25 + header.itemsize
+            values = np.frombuffer(contents, dtype=header, count=1, offset=start + 41)[0]
+            end = data_start + int(values['length'])
+            if end == len(contents) or contents[end:end + 6] == b'MODULE':
+                break
+        else:
+            raise ValueError(f"Could not read the {name} module of the .mpr file")
+
+        modules[name] = (int(values['version']), contents[data_start:end])
+        start = contents.find(b'MODULE', end) if end < len(contents) else -1
+
+    return modules
+
+
+def _get_mpr_column_ids(data: bytes, version: int, n_columns: int) -> np.ndarray:
+    """
+    Function to get the column ids from the start of the VMP data module. Versions 2 and 3 of the module store them as
+    little endian shorts. Version 0 stores them as single bytes in files from EC-Lab before 11.50, and as big endian
+    shorts after, which start with a zero byte as no id is above 255 * 256
+    :param data: the data of the VMP data module
+    :param version: the version of the module
+    :param n_columns: the number of columns
+    :return: array of the column ids
+    """
+    if version != 0:
+        return np.frombuffer(data, dtype='<u2', count=n_columns, offset=5).astype(int)
+    if data[5] != 0:
+        return np.frombuffer(data, dtype='u1', count=n_columns, offset=5).astype(int)
+    return np.frombuffer(data, dtype='>u2', count=n_columns, offset=5).astype(int)
+
+
+def read_biologic_mpr(path: str, columns: dict = None) -> pd.DataFrame:
+    """
+    Function to read the columns needed from a Biologic .mpr file straight from its binary data
+    :param path: path to the file
+    :param columns: dict of the names to give the columns and the list of names each can have in the file
+    :return: data frame with a float column for each of the columns
+    """
+    columns = BIOLOGIC_COLUMNS if columns is None else columns
+
+    with open(path, 'rb') as f:
+        contents = f.read()
+
+    modules = _get_mpr_modules(contents)
+    if 'VMP data' not in modules:
+        raise ValueError("The .mpr file has no VMP data module")
+
+    version, data = modules['VMP data']
+    n_points = int(np.frombuffer(data, dtype='<u4', count=1, offset=0)[0])
+    n_columns = int(np.frombuffer(data, dtype='u1', count=1, offset=4)[0])
+    column_ids = _get_mpr_column_ids(data, version, n_columns)
+
+    fields = []
+    if any(c in MPR_FLAGS for c in column_ids):
+        fields.append(('flags', 'u1'))
+    for c in column_ids:
+        if c in MPR_FLAGS:
+            continue
+        if c not in MPR_COLUMNS:
+            raise ValueError(f"Unknown column id {c} in the .mpr file")
+        name, dtype = MPR_COLUMNS[c]
+        while name in [f[0] for f in fields]:
+            name = name + ' '
+        fields.append((name, dtype))
+
+    # the records are at the end of the module, after a header that changes length between versions
+    record = np.dtype(fields)
+    records = np.frombuffer(data, dtype=record, count=n_points, offset=len(data) - n_points * record.itemsize)
+    names = _get_column_names(list(record.names), columns)
+
+    return pd.DataFrame({names[n]: records[n].astype(np.float64) for n in names.keys()})[list(columns.keys())]
@@ -1,4 +1,5 @@
 from Materials_Data_Analytics.experiment_modelling.core import ElectrochemicalMeasurement
+from Materials_Data_Analytics.experiment_modelling.biologic import read_biologic, read_biologic_text, BiologicTail
 from Materials_Data_Analytics.materials.electrolytes import Electrolyte
 from Materials_Data_Analytics.materials.ions import Cation, Anion
 import pandas as pd
@@ -6,9 +7,35 @@ import numpy as np
 from typing import Union
 import plotly.express as px
 import plotly.graph_objects as go
-import scipy.integrate as integrate
 import base64
+import functools
+import inspect
 import io
+import glob
+from Materials_Data_Analytics.core.parallel import iter_jobs_as_completed
+
+
+def _cached(method):
+    """
+    Decorator to keep the result of a CyclicVoltammogram method for each set of arguments, so calling it again on the
+    same data costs nothing. The results are forgotten when the data is changed by drop_cycles or downsample, and data
+    frames are copied on the way out so the kept result can't be changed by the caller
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (method.__name__, tuple(arguments.arguments.items())[1:])
+
+        if key not in self._cache:
+            self._cache[key] = method(self, *args, **kwargs)
+
+        result = self._cache[key]
+        return result.copy() if type(result) == pd.DataFrame else result
+
+    return wrapper
 
 
 class CyclicVoltammogram(ElectrochemicalMeasurement):
@@ -28,157 +55,279 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
         
         super().__init__(electrolyte, metadata=metadata)
 
-        self._data = pd.DataFrame()
-
-        if len(potential) and len(current) and len(time) != 0:
-            self._data = (pd
-                          .DataFrame({'potential': potential, 'current': current, 'time': time})
-                          .pipe(self._wrangle_data)
-                          )
+        self._cache = {}
+        self._tail = None
+        self._data, self._live = self._wrangle_data(pd.DataFrame({'potential': potential, 'current': current, 'time': time}))
         
         self._max_cycle = self._data['cycle'].max()
         self._max_segment = self._data['segment'].max()
-        self._steps_per_cycle = (self._data
-                                 .query('cycle != cycle.max() and cycle != cycle.min()')
-                                 .astype({'cycle': 'int'})
-                                 .groupby(['cycle']).count()['potential'].mean().round(0)
-                                 )
+        self._steps_per_cycle = np.round(self._data
+                                          .query('cycle != cycle.max() and cycle != cycle.min()')
+                                          .astype({'cycle': 'int'})
+                                          .groupby(['cycle']).count()['potential'].mean(), 0)
 
-    def _wrangle_data(self, data, first_index = 5) -> pd.DataFrame:
+    def _wrangle_data(self, data, first_index = 5) -> tuple[pd.DataFrame, dict]:
         """
-        Function to wrangle the data
-        :param data: pd.DataFrame with columns potential, current, cycle, time
+        Function to wrangle the data. The current roots, directions, segments, segment end points and cycles are all
+        found on numpy arrays, and the data frame is only made once at the end
+        :param data: pd.DataFrame with columns potential, current, time
+        :param first_index: the rows with an index up to this are dropped
+        :return: the wrangled data, and the state needed to append more points to it
         """
         data = (data
-                .query('index > @first_index')
+                .loc[data.index > first_index]
                 .dropna()
-                .reset_index(drop=True)
-                .sort_values(by=['time'])
-                .assign(time = lambda x: x['time'] - x['time'].min())
-                .pipe(self._find_current_roots)
-                .pipe(self._determine_direction)
-                .pipe(self._make_segments)
-                .pipe(self._add_endpoints)
-                .pipe(self._make_cycles)
-                .pipe(self._check_types)
-                .sort_values(by=['time', 'segment'])
-                .reset_index(drop=True)
                 )
-        
-        return data
-    
+
+        order = np.argsort(data['time'].to_numpy(dtype=float), kind='stable')
+        potential = data['potential'].to_numpy(dtype=float)[order]
+        current = data['current'].to_numpy(dtype=float)[order]
+        time = data['time'].to_numpy(dtype=float)[order]
+        time = time - time.min() if len(time) > 0 else time
+
+        # add the points where the current passes through zero
+        roots, time_roots, potential_roots = self._get_current_roots(time, current, potential)
+        time = np.insert(time, roots, time_roots)
+        potential = np.insert(potential, roots, potential_roots)
+        current = np.insert(current, roots, 0.0)
+
+        scan = self._get_scan_directions(potential)
+        oxidation = self._smooth_directions(scan)
+        segment = self._get_segments(oxidation)
+
+        # the directions of all but the last few points can't change when more points are added, which is kept to
+        # append points later
+        anchor = self._get_anchor(scan)
+        start = max(anchor, 0)
+        live = {
+            't0': data['time'].min() if len(data) > 0 else None,
+            'first_index': first_index,
+            'anchored': anchor >= 0,
+            'potential': potential[start:], 'current': current[start:], 'time': time[start:], 'scan': scan[start:],
+            'segment': segment[anchor] if anchor >= 0 else 0
+        }
+
+        # double up the last point of each segment as the first point of the next one
+        starts = np.flatnonzero(np.diff(segment)) + 1
+        origin = np.insert(np.arange(0, len(time)), starts, starts)
+        time = np.insert(time, starts, time[starts - 1])
+        potential = np.insert(potential, starts, potential[starts - 1])
+        current = np.insert(current, starts, current[starts - 1])
+        oxidation = np.insert(oxidation, starts, oxidation[starts])
+        segment = np.insert(segment, starts, segment[starts])
+
+        order = np.lexsort((segment, time))
+        data = pd.DataFrame({
+            'potential': potential[order],
+            'current': current[order],
+            'time': time[order],
+            'direction': self._get_direction_names(oxidation[order]),
+            'segment': segment[order].astype(int),
+            'cycle': self._get_cycles(segment[order]).astype(int)
+        })
+        live['n_final'] = int(np.sum(origin <= anchor))
+        live['counts'] = np.bincount(data['cycle'].to_numpy()[:live['n_final']])
+
+        return data, live
+
+    @staticmethod
+    def _get_current_roots(time: np.ndarray, current: np.ndarray, potential: np.ndarray) -> tuple:
+        """
+        Function to find where the current changes sign, and the time and potential of the zero current point by linear
+        interpolation between the points either side. The roots are kept between the two points, so that rounding
+        can't put them out of order when the current is exactly zero at one of them
+        :param time: array of times
+        :param current: array of currents
+        :param potential: array of potentials
+        :return: the index of the point after each root, and the times and potentials of the roots
+        """
+        sign = np.sign(current)
+        roots = np.flatnonzero(sign[1:] != sign[:-1]) + 1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = []
+            for x in [time, potential]:
+                slope = (current[roots] - current[roots - 1]) / (x[roots] - x[roots - 1])
+                intercept = current[roots - 1] - slope * x[roots - 1]
+                root = np.where(x[roots] == x[roots - 1], x[roots - 1], -intercept / slope)
+                values.append(np.clip(root, np.minimum(x[roots - 1], x[roots]), np.maximum(x[roots - 1], x[roots])))
+
+        return roots, values[0], values[1]
+
+    @classmethod
+    def _get_directions(cls, potential: np.ndarray) -> np.ndarray:
+        """
+        Function to get the direction of the scan at each point. Points where the potential doesn't change take the
+        direction of the point before, and single points going the other way are smoothed out
+        :param potential: array of potentials
+        :return: boolean array, True for oxidation and False for reduction
+        """
+        return cls._smooth_directions(cls._get_scan_directions(potential))
+
+    @staticmethod
+    def _get_scan_directions(potential: np.ndarray, previous_potential: float = None,
+                             previous_oxidation: bool = None) -> np.ndarray:
+        """
+        Function to get the direction the potential moves in to get to each point, with points where it doesn't change
+        taking the direction of the point before
+        :param potential: array of potentials
+        :param previous_potential: potential of the point before the first one, if these points carry on from others
+        :param previous_oxidation: direction of the point before the first one, if these points carry on from others
+        :return: boolean array, True for oxidation and False for reduction
+        """
+        n = len(potential)
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+
+        if previous_potential is not None:
+            dv = np.diff(np.concatenate([[previous_potential], potential]))
+            state = np.concatenate([[int(previous_oxidation)], np.where(dv > 0, 1, np.where(dv < 0, 0, -1))])
+            filled = np.maximum.accumulate(np.where(state >= 0, np.arange(0, n + 1), 0))
+            return (state[filled] == 1)[1:]
+
+        dv = np.diff(potential, prepend=np.nan)
+        state = np.where(dv > 0, 1, np.where(dv < 0, 0, -1))
+        state[0] = 1 if n > 1 and dv[1] > 0 else 0
+        filled = np.maximum.accumulate(np.where(state >= 0, np.arange(0, n), 0))
+        return state[filled] == 1
+
+    @staticmethod
+    def _get_single_points(oxidation: np.ndarray) -> np.ndarray:
+        """
+        Function to find the points with a different direction to both their neighbours
+        """
+        single = np.zeros(len(oxidation), dtype=bool)
+        single[1:-1] = (oxidation[1:-1] != oxidation[:-2]) & (oxidation[1:-1] != oxidation[2:])
+        return single
+
+    @classmethod
+    def _smooth_directions(cls, oxidation: np.ndarray) -> np.ndarray:
+        """
+        Function to smooth out single points going the other way to the points either side of them. A point that is
+        different to both its neighbours takes the direction of the point before. Going along in order, a point right
+        after one that was changed is not changed, so in a run of these points every other one is changed
+        :param oxidation: boolean array of the directions the potential moves in
+        :return: boolean array, True for oxidation and False for reduction
+        """
+        n = len(oxidation)
+        oxidation = oxidation.copy()
+        single = cls._get_single_points(oxidation)
+        run_start = single & ~np.concatenate([[False], single[:-1]])
+        run_start = np.maximum.accumulate(np.where(run_start, np.arange(0, n), 0))
+        change = single & ((np.arange(0, n) - run_start) % 2 == 0)
+        oxidation[change] = ~oxidation[change]
+
+        return oxidation
+
+    @classmethod
+    def _get_anchor(cls, scan: np.ndarray) -> int:
+        """
+        Function to find the last point whose direction can't change when more points are added. This is the last
+        point before the end that isn't a single point, as the smoothing of the points after it doesn't depend on the
+        points before it. The direction of the first point depends on the second, so with less than two points none
+        are settled
+        :param scan: boolean array of the directions the potential moves in
+        :return: the index of the point, or -1 if there isn't one
+        """
+        if len(scan) < 2:
+            return -1
+        settled = np.flatnonzero(~cls._get_single_points(scan)[:-1])
+        return int(settled[-1])
+
+    @staticmethod
+    def _get_direction_names(oxidation: np.ndarray) -> np.ndarray:
+        return np.array(['reduction', 'oxidation'], dtype=object)[oxidation.astype(int)]
+
+    @staticmethod
+    def _get_segments(oxidation: np.ndarray) -> np.ndarray:
+        """
+        Function to number the segments, which change each time the direction changes
+        :param oxidation: boolean array of the directions
+        :return: array of segment numbers, starting from 0
+        """
+        return np.concatenate([[0], np.cumsum(oxidation[1:] != oxidation[:-1])]).astype(int)[:len(oxidation)]
+
+    @staticmethod
+    def _get_cycles(segment: np.ndarray) -> np.ndarray:
+        """
+        Function to number the cycles, with a new cycle starting at each odd segment
+        :param segment: array of segment numbers
+        :return: array of cycle numbers
+        """
+        segments = np.unique(segment)
+        cycles = np.cumsum(segments % 2 == 1)
+        return cycles[np.searchsorted(segments, segment)]
+
     def _find_current_roots(self, data: pd.DataFrame) -> pd.DataFrame:
         """
         Function to find the time and voltage points where the current passes through 0
         """
-        raw_roots_indexes = (data
-                             .copy()
-                             .assign(sign_diff = lambda x: np.sign(x['current']).diff())
-                             .query('sign_diff != 0 and sign_diff.notna()')
-                             .index
-                             )
-        
-        for i in raw_roots_indexes:
-            data_interpolate = data.iloc[i-1:i+1]
-            time_root = self.get_root_linear_interpolation(data_interpolate['time'], data_interpolate['current'])
-            potential_root = self.get_root_linear_interpolation(data_interpolate['potential'], data_interpolate['current'])
+        data = data.reset_index(drop=True)
+        roots, time_roots, potential_roots = self._get_current_roots(data['time'].to_numpy(dtype=float),
+                                                                     data['current'].to_numpy(dtype=float),
+                                                                     data['potential'].to_numpy(dtype=float))
+        new_rows = (data
+                    .iloc[roots - 1]
+                    .assign(potential = potential_roots, time = time_roots, current = 0.0)
+                    )
 
-            new_row = (data_interpolate
-                       .query('index == index.min()')
-                       .assign(potential = potential_root)
-                       .assign(time = time_root)
-                       .assign(current = 0)
-                       )
+        position = np.concatenate([np.arange(0, len(data)), roots - 0.5])
+        data = pd.concat([data, new_rows], ignore_index=True)
+        order = np.lexsort((position, data['time'].to_numpy()))
 
-            data = pd.concat([data, new_row], ignore_index=True) 
+        return data.iloc[order].reset_index(drop=True)
 
-        return data.sort_values(by=['time']).reset_index(drop=True)
-    
     def _determine_direction(self, data: pd.DataFrame) -> pd.DataFrame:
         """
         Function to determine the direction of the cycle (either oxidation or reduction)
         :param data: pd.DataFrame with potential and time
         """
-        potential = data['potential']
-        potential_shifted = potential.shift(1)
-        dv = potential - potential_shifted
-        directions = ['oxidation'] if dv[1] > 0 else ['reduction']
-
-        for i in range(1, len(dv)):
-            if dv[i] > 0:
-                directions.append('oxidation')
-            elif dv[i] < 0:
-                directions.append('reduction')
-            elif dv[i] == 0:
-                directions.append(directions[i-1])
-        
-        for i in range(1, len(directions)-1):
-            if directions[i] != directions[i-1] and directions[i] != directions[i+1]:
-                directions[i] = directions[i-1]
+        oxidation = self._get_directions(data['potential'].to_numpy(dtype=float))
+        return data.assign(direction = self._get_direction_names(oxidation))
 
-        data = data.assign(direction = directions)
-            
-        return data
-    
     def _add_endpoints(self, data: pd.DataFrame) -> pd.DataFrame:
         """
         Function to double up data points at the end of the cycles so that each cycle is complete when filtered by direction
         """
-        for s in range(data['segment'].min()+1, data['segment'].max()+1):
-            prev_seg_num = s - 1
-            prev_time = data.query('segment == @prev_seg_num')['time'].iloc[-1]
-            prev_current = data.query('segment == @prev_seg_num')['current'].iloc[-1]
-            prev_potential = data.query('segment == @prev_seg_num')['potential'].iloc[-1]
+        data = data.iloc[np.argsort(data['time'].to_numpy(), kind='stable')]
+        segment = data['segment'].to_numpy()
+        position = np.arange(0, len(data))
+        segments = np.unique(segment)
+        first = np.full(len(segments), len(data))
+        last = np.full(len(segments), -1)
+        np.minimum.at(first, np.searchsorted(segments, segment), position)
+        np.maximum.at(last, np.searchsorted(segments, segment), position)
 
-            new_row = (data
-                    .query('segment == @s')
-                    .query('time == time.min()')
-                    .assign(time = prev_time, current = prev_current, potential = prev_potential)
+        # each segment after the first gets the last point of the segment before it
+        has_previous = np.isin(segments - 1, segments)
+        previous = last[np.searchsorted(segments, segments[has_previous] - 1)]
+        new_rows = (data
+                    .iloc[first[has_previous]]
+                    .assign(time = data['time'].to_numpy()[previous],
+                            current = data['current'].to_numpy()[previous],
+                            potential = data['potential'].to_numpy()[previous])
                     )
-            
-            data = pd.concat([data, new_row], ignore_index=True).sort_values(by=['time'])
 
-        return data
-    
-    def _make_cycles(self, data: pd.DataFrame) -> pd.DataFrame:
-        """
-        Function to find the cycles of the cyclic voltammogram
-        """
-        cycle = 0
-        new_data = []
-        for group_name, group_df in data.groupby('segment'):
-            if group_name % 2 == 1:
-                cycle += 1
-            group_df['cycle'] = cycle
-            new_data.append(group_df)
+        data = pd.concat([data, new_rows])
+        order = np.lexsort((data['segment'].to_numpy(), data['time'].to_numpy()))
 
-        data = pd.concat(new_data, ignore_index=True)
+        return data.iloc[order]
 
-        return data
-    
-    def _check_types(self, data) -> pd.DataFrame:
+    def _make_cycles(self, data: pd.DataFrame) -> pd.DataFrame:
         """
-        Function to check the data types in the data columns
-        :param data: pd.DataFrame with columns potential, current, cycle, time
+        Function to find the cycles of the cyclic voltammogram
         """
         return (data
-                .assign(cycle = lambda x: x['cycle'].astype(int))
-                .assign(time = lambda x: x['time'].astype(float))
-                .assign(potential = lambda x: x['potential'].astype(float))
-                .assign(current = lambda x: x['current'].astype(float))
-                .assign(segment = lambda x: x['segment'].astype(int))
-                .assign(direction = lambda x: x['direction'].astype(str))
+                .assign(cycle = self._get_cycles(data['segment'].to_numpy()))
+                .reset_index(drop=True)
                 )
     
-    @staticmethod
-    def _make_segments(data) -> pd.DataFrame:
+    @classmethod
+    def _make_segments(cls, data) -> pd.DataFrame:
         """
         Function to find the segments of the cyclic voltammogram
         """
-        direction_change = data['direction'] != data['direction'].shift(1)
-        segments = direction_change.cumsum() - 1
-        data = data.assign(segment=segments)
-        return data
+        return data.assign(segment = cls._get_segments(data['direction'].to_numpy() == 'oxidation'))
 
     @property
     def data(self) -> pd.DataFrame:
@@ -191,6 +340,23 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
 
         return data
 
+    @_cached
+    def _get_plot_data(self) -> pd.DataFrame:
+        """
+        Function to get the data with the cycle and direction of each point as one column, for colouring the plots
+        """
+        return self.data.assign(cycle_direction = lambda x: x['cycle'].astype('str') + ', ' + x['direction'])
+
+    @_cached
+    def _get_segment_indices(self) -> dict:
+        """
+        Function to get the positions in the data of the points of each segment
+        """
+        segment = self._data['segment'].to_numpy()
+        order = np.argsort(segment, kind='stable')
+        segments, first = np.unique(segment[order], return_index=True)
+        return dict(zip(segments.tolist(), np.split(order, first[1:])))
+
     @classmethod
     def from_html_base64(cls, file_contents, source, scan_rate = None, **kwargs):
         """
@@ -201,7 +367,7 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
         file_data = io.StringIO(decoded.decode('utf-8'))
 
         if source == 'biologic':
-            data = pd.read_table(file_data, sep='\t')
+            data = read_biologic_text(file_data)
             cv = cls.from_biologic(data=data, **kwargs)
         elif source == 'aftermath':
             data = pd.read_table(file_data, sep=",")
@@ -214,13 +380,14 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
     @classmethod
     def from_biologic(cls, path: str = None, data: pd.DataFrame = None, **kwargs):
         """
-        Function to make a CyclicVoltammogram object from a biologic file
+        Function to make a CyclicVoltammogram object from a biologic file. Only the potential, current and time columns
+        are read from the file, which can be a text export (.txt or .mpt) or a binary .mpr file
         """
 
         if path is None and data is not None:
             data = data
         elif path is not None and data is None:
-            data = pd.read_table(path, sep='\t')
+            data = read_biologic(path)
 
         data = (data
                 .rename({'Ewe/V': 'potential', '<I>/mA': 'current', 'time/s': 'time'}, axis=1)
@@ -265,12 +432,151 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
 
         return cv
     
+    @classmethod
+    def from_biologic_live(cls, path: str, **kwargs):
+        """
+        Function to make a CyclicVoltammogram object from a Biologic text export that is still being written. Call
+        update to add the rows written since
+        :param path: path to the text export
+        """
+        tail = BiologicTail(path)
+        data = tail.read()
+        cv = cls(potential=data['potential'], current=data['current'], time=data['time'], **kwargs)
+        cv._tail = tail
+
+        return cv
+
+    def update(self):
+        """
+        Function to add the rows written to the file since it was last read, for objects made with from_biologic_live
+        """
+        if self._tail is None:
+            raise ValueError("Only CyclicVoltammogram objects made with from_biologic_live can be updated")
+
+        # the rows are numbered from the start of the file, so the first rows are dropped the same as reading it at once
+        data = self._tail.read()
+        data = data.loc[data.index > self._live['first_index']] if self._live is not None else data
+        return self.append(potential=data['potential'], current=data['current'], time=data['time'])
+
+    def append(self,
+               potential: Union[list, pd.Series, np.array],
+               current: Union[list, pd.Series, np.array],
+               time: Union[list, pd.Series, np.array]):
+        """
+        Function to add points measured after the ones already in the data. Only the new points and the last few points
+        before them, whose direction could still change, are wrangled, and only the charges of the segments with new
+        points are integrated again, so the data ends up the same as making the object from all the points at once
+        :param potential: the potentials of the new points
+        :param current: the currents of the new points
+        :param time: the times of the new points, in the same units as the data
+        """
+        if self._live is None:
+            raise ValueError("Points can't be appended after drop_cycles or downsample")
+
+        live = self._live
+        data = pd.DataFrame({'potential': potential, 'current': current, 'time': time}).dropna()
+        if len(data) == 0:
+            return self
+
+        # with no points in the data yet, the times start from the first of these points
+        t0 = data['time'].min() if live['t0'] is None else live['t0']
+
+        order = np.argsort(data['time'].to_numpy(dtype=float), kind='stable')
+        potential = data['potential'].to_numpy(dtype=float)[order]
+        current = data['current'].to_numpy(dtype=float)[order]
+        time = data['time'].to_numpy(dtype=float)[order] - t0
+        if len(live['time']) > 0 and time[0] < live['time'][-1]:
+            raise ValueError("The appended points need to be after the points already in the data")
+
+        # without a settled point, the points kept from before are wrangled again with the new ones from scratch
+        if not live['anchored']:
+            potential = np.concatenate([live['potential'], potential])
+            current = np.concatenate([live['current'], current])
+            time = np.concatenate([live['time'], time])
+            live = dict(live, potential=np.zeros(0), current=np.zeros(0), time=np.zeros(0), scan=np.zeros(0, dtype=bool))
+        n_before = min(len(live['time']), 1)
+
+        # add the points where the current passes through zero, including between the last point and the first new one
+        roots, time_roots, potential_roots = self._get_current_roots(np.concatenate([live['time'][-1:], time]),
+                                                                     np.concatenate([live['current'][-1:], current]),
+                                                                     np.concatenate([live['potential'][-1:], potential]))
+        time = np.insert(time, roots - n_before, time_roots)
+        potential = np.insert(potential, roots - n_before, potential_roots)
+        current = np.insert(current, roots - n_before, 0.0)
+
+        # the first point is the last one whose direction is settled, so the smoothing starts again from it
+        if n_before > 0:
+            scan = self._get_scan_directions(potential, live['potential'][-1], live['scan'][-1])
+        else:
+            scan = self._get_scan_directions(potential)
+        scan = np.concatenate([live['scan'], scan])
+        time = np.concatenate([live['time'], time])
+        potential = np.concatenate([live['potential'], potential])
+        current = np.concatenate([live['current'], current])
+        oxidation = self._smooth_directions(scan)
+        segment = live['segment'] + self._get_segments(oxidation)
+
+        anchor = self._get_anchor(scan)
+        start = max(anchor, 0)
+        window = {'potential': potential[start:], 'current': current[start:], 'time': time[start:], 'scan': scan[start:],
+                  'segment': segment[anchor] if anchor >= 0 else 0, 'anchored': anchor >= 0}
+
+        starts = np.flatnonzero(np.diff(segment)) + 1
+        origin = np.insert(np.arange(0, len(time)), starts, starts)
+        time = np.insert(time, starts, time[starts - 1])
+        potential = np.insert(potential, starts, potential[starts - 1])
+        current = np.insert(current, starts, current[starts - 1])
+        oxidation = np.insert(oxidation, starts, oxidation[starts])
+        segment = np.insert(segment, starts, segment[starts])
+
+        # the rows of the first point are already in the data
+        order = np.lexsort((segment, time))
+        order = order[origin[order] >= n_before]
+        n_final = live['n_final']
+        new_rows = pd.DataFrame({
+            'potential': potential[order],
+            'current': current[order],
+            'time': time[order],
+            'direction': self._get_direction_names(oxidation[order]),
+            'segment': segment[order].astype(int),
+            'cycle': ((segment[order] + 1) // 2).astype(int)
+        }, index=pd.RangeIndex(n_final, n_final + len(order)))
+
+        settled = origin[order] <= anchor
+        cycle = new_rows['cycle'].to_numpy()
+        counts = np.bincount(cycle[settled], minlength=len(live['counts']))
+        counts[:len(live['counts'])] += live['counts']
+        all_counts = np.bincount(cycle[~settled], minlength=len(counts))
+        all_counts[:len(counts)] += counts
+
+        new_rows = new_rows[self._data.columns]
+        self._data = pd.concat([self._data.iloc[:n_final], new_rows]) if n_final > 0 else new_rows
+        self._live = dict(window, t0=t0, first_index=live['first_index'], n_final=n_final + int(settled.sum()),
+                          counts=counts)
+        all_counts = all_counts[self._data['cycle'].iloc[0]:]
+        self._max_cycle = self._data['cycle'].iloc[-1]
+        self._max_segment = self._data['segment'].iloc[-1]
+        self._steps_per_cycle = np.float64(all_counts[1:-1].mean().round(0)) if len(all_counts) > 2 else np.nan
+
+        # the charges of the segments before the first one with new points stay the same
+        # the segments aren't sorted when points have the same time, so the rows are picked by segment
+        first_segment = new_rows['segment'].min()
+        changed = self._data.query('segment >= @first_segment')
+        charges = {k: v for k, v in self._cache.items() if k[0] == '_get_segment_charges'}
+        self._cache = {}
+        for key, integrals in charges.items():
+            self._cache[key] = pd.concat([integrals.query('segment < @first_segment'),
+                                          self._integrate_segments(changed, dict(key[1])['method'])],
+                                         ignore_index=True)
+
+        return self
+
     def drop_cycles(self, drop: list[int] | int = None, keep: list[int] | int = None) -> pd.DataFrame:
         """
         Function to edit which cycles are being considered
         """
         if type(drop) == int:
-            drop = [int]
+            drop = [drop]
 
         if type(keep) == int:
             keep = [keep]
@@ -281,13 +587,15 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
         if keep is not None:
             self._data = self._data.query('cycle in @keep')
 
+        self._cache = {}
+        self._live = None
         return self
     
     def get_current_potential_plot(self, **kwargs):
         """
         Function to plot the cyclic voltammogram
         """
-        data = self.data.assign(cycle_direction = lambda x: x['cycle'].astype('str') + ', ' + x['direction'])
+        data = self._get_plot_data()
 
         figure = px.line(data, x='potential', y='current', color='cycle_direction', markers=True, 
                          labels={'potential': 'Potential [V]', 'current': 'Current [mA]'}, **kwargs)
@@ -306,7 +614,7 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
         """
         Function to plot the current vs time
         """
-        data = self.data.assign(cycle_direction = lambda x: x['cycle'].astype('str') + ', ' + x['direction'])
+        data = self._get_plot_data()
 
         figure = px.line(data, x='time', y='current', color='cycle_direction', markers=True, 
                          labels={'time': 'Time [s]', 'current': 'Current [mA]', 'cycle_direction': 'Cycle, Direction'}, **kwargs)
@@ -325,7 +633,7 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
         """
         Function to plot the potential vs time
         """
-        data = self.data.assign(cycle_direction = lambda x: x['cycle'].astype('str') + ', ' + x['direction'])
+        data = self._get_plot_data()
         
         figure = px.line(data, x='time', y='potential', color='cycle_direction', markers=True, 
                          labels={'time': 'Time [s]', 'potential': 'Potential [V]'}, **kwargs)
@@ -364,43 +672,121 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
     def steps_per_cycle(self) -> int:
         return self._steps_per_cycle
     
-    #TODO: I dont like this function, it should be more general
-    def _integrate_curves(self, data: pd.DataFrame, direction: str, valence: str) -> float:
+    @staticmethod
+    def _get_group_integrals(x: np.ndarray, y: np.ndarray, groups: np.ndarray, n_groups: int,
+                             method: str = 'simpson') -> np.ndarray:
         """
-        Function to integrate data
+        Function to integrate y over x for many groups of points at once. The points of each group need to be next to
+        each other and in order of x. Simpson's rule is done the same way as scipy.integrate.simpson, with the
+        correction for the last interval when a group has an even number of points
+        :param x: array of x values
+        :param y: array of y values
+        :param groups: array of the group of each point, from 0 to n_groups - 1
+        :param n_groups: number of groups
+        :param method: 'simpson' or 'trapezoid'
+        :return: array with the integral of each group, 0 for groups with less than two points
         """
-        if valence == 'positive':
-            current_data = data.query('current >= 0')
-        elif valence == 'negative':
-            current_data = data.query('current <= 0')
-        else:
-            raise ValueError('Valence must be either positive or negative')
+        if method not in ['simpson', 'trapezoid']:
+            raise ValueError("method must be either simpson or trapezoid")
+
+        n = np.bincount(groups, minlength=n_groups)
+        if len(x) < 2:
+            return np.zeros(n_groups)
+
+        start = np.concatenate([[0], np.cumsum(n)[:-1]])
+        position = np.arange(0, len(x)) - start[groups]
+        n_points = n[groups]
+        h = np.diff(x)
+        same = groups[1:] == groups[:-1]
+
+        # trapezoids between the neighbouring points of each group, which is also used for groups of two points
+        trapezoid = 0.5 * h * (y[1:] + y[:-1])
+        if method == 'trapezoid':
+            return np.bincount(groups[:-1][same], weights=trapezoid[same], minlength=n_groups)
 
-        int_current = current_data.query('direction == @direction')['current'].to_numpy()
-        int_time = current_data.query('direction == @direction')['time'].to_numpy()
-        integral = abs(integrate.simpson(int_current, x=int_time))
+        integrals = np.zeros(n_groups)
+        pairs = n == 2
+        integrals[pairs] = np.bincount(groups[:-1][same], weights=trapezoid[same], minlength=n_groups)[pairs]
 
-        return integral
+        # parabolas through each pair of intervals
+        last = np.where(n_points % 2 == 1, n_points - 1, n_points - 2)[:-2]
+        use = (position[:-2] % 2 == 0) & (position[:-2] + 2 <= last) & (n_points[:-2] > 2)
+        h0, h1 = h[:-1][use], h[1:][use]
+        y0, y1, y2 = y[:-2][use], y[1:-1][use], y[2:][use]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hsum = h0 + h1
+            hprod = h0 * h1
+            h0divh1 = np.where(h1 != 0, h0 / h1, 0)
+            h1divh0 = np.where(h0divh1 != 0, 1 / h0divh1, 0)
+            hsumdivhprod = np.where(hprod != 0, hsum / hprod, 0)
+            parabolas = hsum / 6 * (y0 * (2 - h1divh0) + y1 * hsum * hsumdivhprod + y2 * (2 - h0divh1))
+        integrals += np.bincount(groups[:-2][use], weights=parabolas, minlength=n_groups)
 
-    def get_charge_passed(self, average_segments = False) -> pd.DataFrame:
+        # correction for the last interval of groups with an even number of points
+        even = np.flatnonzero((n % 2 == 0) & (n > 2))
+        end = start[even] + n[even] - 1
+        h0, h1 = x[end - 1] - x[end - 2], x[end] - x[end - 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            alpha = np.where(h1 + h0 != 0, (2 * h1 ** 2 + 3 * h0 * h1) / (6 * (h1 + h0)), 0)
+            beta = np.where(h0 != 0, (h1 ** 2 + 3 * h0 * h1) / (6 * h0), 0)
+            eta = np.where(h0 * (h0 + h1) != 0, h1 ** 3 / (6 * h0 * (h0 + h1)), 0)
+        integrals[even] += alpha * y[end] + beta * y[end - 1] - eta * y[end - 2]
+
+        return integrals
+
+    def _integrate_segments(self, data: pd.DataFrame, method: str = 'simpson') -> pd.DataFrame:
+        """
+        Function to get the anodic, cathodic and total charges of the segments in some data. The charges of every
+        segment are found at once, from the points of each segment with positive and negative current
+        :param data: the rows of the data to integrate
+        :param method: 'simpson' or 'trapezoid'
+        """
+        data = data.iloc[np.argsort(data['segment'].to_numpy(), kind='stable')]
+        segment = data['segment'].to_numpy()
+        time = data['time'].to_numpy(dtype=float)
+        current = data['current'].to_numpy(dtype=float)
+
+        segments, first, groups = np.unique(segment, return_index=True, return_inverse=True)
+        charges = {}
+        for name, mask in [('anodic_charge', current >= 0), ('cathodic_charge', current <= 0)]:
+            charges[name] = np.abs(self._get_group_integrals(time[mask], current[mask], groups[mask], len(segments),
+                                                             method))
+
+        direction = data['direction'].to_numpy()[first]
+        integrals = pd.DataFrame({
+            'direction': direction,
+            'segment': segments,
+            'cycle': data['cycle'].to_numpy()[first],
+            'anodic_charge': charges['anodic_charge'],
+            'cathodic_charge': charges['cathodic_charge'],
+            'total_charge': (charges['anodic_charge'] - charges['cathodic_charge']) * np.where(direction == 'reduction', -1, 1)
+        })
+        
+        return integrals
+
+    @_cached
+    def _get_segment_charges(self, method: str = 'simpson') -> pd.DataFrame:
+        """
+        Function to get the charges of all the segments. When points are appended, only the segments with new points
+        are integrated again
         """
-        Function to get the integrals of the current
-        """ 
-        data = self._data.query('segment != 0 and segment != @self._max_segment').copy()
+        return self._integrate_segments(self._data, method)
 
-        integrals = (data
-                     .groupby(['segment'], group_keys=False)
-                     .apply(lambda df: (df
-                                        .assign(anodic_charge = lambda x: self._integrate_curves(x, direction=x['direction'].iloc[0], valence='positive'))
-                                        .assign(cathodic_charge = lambda x: self._integrate_curves(x, direction=x['direction'].iloc[0], valence='negative'))
-                                        ))
-                     .drop(columns=['potential', 'time', 'current'])
-                     .drop_duplicates()
+    @_cached
+    def get_charge_passed(self, average_segments = False, method: str = 'simpson') -> pd.DataFrame:
+        """
+        Function to get the integrals of the current, with the anodic and cathodic charges of every segment apart from
+        the first and last
+        :param average_segments: average the charges over the segments in each direction
+        :param method: 'simpson' or 'trapezoid'
+        """
+        integrals = (self
+                     ._get_segment_charges(method)
+                     .query('segment != 0 and segment != @self._max_segment')
                      .reset_index(drop=True)
-                     .assign(valence = lambda x: [-1 if i == 'reduction' else 1 for i in x.direction])
-                     .assign(total_charge = lambda x: (x.anodic_charge - x.cathodic_charge)*x.valence)
-                     .drop(columns=['valence'])
                      )
+        labels = [c for c in self._data.columns if c in ['direction', 'segment', 'cycle']]
+        integrals = integrals[labels + ['anodic_charge', 'cathodic_charge', 'total_charge']]
         
         if average_segments is True:
             integrals = (integrals
@@ -417,39 +803,58 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
         
         return integrals
     
-    def get_maximum_charges_passed(self, average_sections = False) -> pd.DataFrame:
+    @_cached
+    def _get_sections(self) -> dict:
         """
-        Function to get the maximum charges passed in each direction
-        """ 
-        data = (self
-                ._data.query('segment != 0 and segment != @self._max_segment')
-                .copy()
-                .assign(section = lambda x: (x['current'] == 0).cumsum())
-                )
-        
-        additional_points = (data
-                             .assign(sos = lambda x: (x['current'] == 0))
-                             .query('sos == True')
-                             .assign(section = lambda x: x['section'] - 1)  
-                             .drop(columns=['sos'])
-                             )
+        Function to get the cumulative integral of the current over time and the positions of its zero crossings, so
+        that the charge between any two zero crossings is a difference of the cumulative integral
+        """
+        data = self._data.query('segment != 0 and segment != @self._max_segment')
+        order = np.argsort(data['time'].to_numpy(dtype=float), kind='stable')
+        time = data['time'].to_numpy(dtype=float)[order]
+        current = data['current'].to_numpy(dtype=float)[order]
+        cumulative = np.concatenate([[0], np.cumsum(0.5 * np.diff(time) * (current[1:] + current[:-1]))])
 
-        max_charges_passed = (pd
-                              .concat([data, additional_points], axis=0)
-                              .sort_values(by=['time'])
-                              .reset_index(drop=True)
-                              .groupby(['section'], group_keys=False)
-                              .apply(lambda df: (df
-                                                  .assign(total_charge = integrate.simpson(df.current, x=df.time))
-                                                  .assign(t_min = df.time.min())
-                                                  .assign(t_max = df.time.max())
-                                                  .filter(['total_charge', 'section', 't_min', 't_max'])
-                                                  .drop_duplicates()
-                                                  ))
-                              .assign(type = lambda x: ['anodic_charge' if i > 0 else 'cathodic_charge' for i in x['total_charge']])
-                              .assign(total_charge = lambda x: x['total_charge'].abs())
-                              .query('section != section.max() and section != section.min()')
-                              )
+        return {
+            'time': time,
+            'current': current,
+            'cumulative': cumulative,
+            'zeros': np.flatnonzero(current == 0)
+        }
+
+    @_cached
+    def get_maximum_charges_passed(self, average_sections = False, method: str = 'simpson') -> pd.DataFrame:
+        """
+        Function to get the maximum charges passed in each direction, from the integrals of the current between each
+        pair of neighbouring zero crossings. All the sections are integrated at once, and with the trapezoid rule the
+        charges are just differences of the cumulative integral at the zero crossings
+        :param average_sections: average the charges over the sections of each type
+        :param method: 'simpson' or 'trapezoid'
+        """
+        if method not in ['simpson', 'trapezoid']:
+            raise ValueError("method must be either simpson or trapezoid")
+
+        sections = self._get_sections()
+        zeros = sections['zeros']
+        time = sections['time']
+
+        if method == 'trapezoid':
+            total_charge = np.diff(sections['cumulative'][zeros])
+        else:
+            # the points of every section, with each zero crossing at the end of one section and the start of the next
+            lengths = np.diff(zeros) + 1
+            groups = np.repeat(np.arange(0, len(lengths)), lengths)
+            positions = np.arange(0, lengths.sum()) - (np.cumsum(lengths) - lengths)[groups]
+            rows = zeros[:-1][groups] + positions
+            total_charge = self._get_group_integrals(time[rows], sections['current'][rows], groups, len(lengths))
+
+        max_charges_passed = pd.DataFrame({
+            'total_charge': np.abs(total_charge),
+            'section': np.arange(1, len(zeros)),
+            't_min': time[zeros[:-1]],
+            't_max': time[zeros[1:]],
+            'type': np.where(total_charge > 0, 'anodic_charge', 'cathodic_charge').astype(object)
+        })
         
         if average_sections is True:
             max_charges_passed = (max_charges_passed
@@ -501,12 +906,17 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
         """
         Function to return a plot showing the area integrated to get the maximum charges passed 
         """
-        data = self.data.assign(cycle_direction = lambda x: x['cycle'].astype('str') + ', ' + x['direction'])
-        charge_data = self.get_maximum_charges_passed()
-        charge_valence = charge_data.query('section == @section')['type'].iloc[0]
+        sections = self._get_sections()
+        zeros = sections['zeros']
+        if section < 1 or section >= len(zeros):
+            raise ValueError(f"section must be between 1 and {len(zeros) - 1}")
+
+        data = self._get_plot_data()
+        charge = sections['cumulative'][zeros[section]] - sections['cumulative'][zeros[section - 1]]
+        charge_valence = 'anodic_charge' if charge > 0 else 'cathodic_charge'
 
-        t_min = charge_data.query('section == @section')['t_min'].iloc[0]
-        t_max = charge_data.query('section == @section')['t_max'].iloc[0]
+        t_min = sections['time'][zeros[section - 1]]
+        t_max = sections['time'][zeros[section]]
         c_min = data.query('time >= @t_min and time <= @t_max')['current'].min()
         c_max = data.query('time >= @t_min and time <= @t_max')['current'].max()
 
@@ -539,9 +949,9 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
 
         direction = direction.lower()
 
-        data = self.data.copy().assign(cycle_direction = lambda x: x['cycle'].astype('str') + ', ' + x['direction'])
+        data = self._get_plot_data()
         segment = data.query('cycle == @cycle and direction == @direction')['segment'].values[0]
-        data_area = data.query('segment == @segment')
+        data_area = data.iloc[self._get_segment_indices()[segment]]
         data_area_positive = data_area.query('current >= 0')
         data_area_negative = data_area.query('current <= 0')
 
@@ -568,10 +978,130 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
 
         return figure
 
-    def downsample(self, n: int | list[float] = 400) -> pd.DataFrame:
+    @staticmethod
+    def _get_segment_starts(segment: np.ndarray) -> tuple:
+        """
+        Function to get where each segment starts, for data with the points of each segment next to each other
+        :param segment: array of the segment of each point
+        :return: array of the position of the first point of each segment, and the array of the segment number of each
+        point counted from 0
+        """
+        change = np.concatenate([[True], segment[1:] != segment[:-1]])
+        return np.flatnonzero(change), np.cumsum(change) - 1
+
+    @classmethod
+    def _get_minmax_positions(cls, time: np.ndarray, current: np.ndarray, segment: np.ndarray, n: int) -> np.ndarray:
+        """
+        Function to get the points with the lowest and highest current in each of n time bins of every segment, so
+        that peaks are kept however few points are left
+        :param time: array of the time of each point, in order within each segment
+        :param current: array of the current of each point
+        :param segment: array of the segment of each point
+        :param n: number of time bins in each segment
+        :return: array of the positions of the points to keep
+        """
+        starts, groups = cls._get_segment_starts(segment)
+        ends = np.concatenate([starts[1:], [len(time)]]) - 1
+        t_min = time[starts]
+        t_span = np.where(time[ends] > t_min, time[ends] - t_min, 1)
+        bins = np.clip(((time - t_min[groups]) / t_span[groups] * n).astype(int), 0, n - 1)
+
+        bin_starts, bin_groups = cls._get_segment_starts(groups * n + bins)
+        positions = []
+        for extreme in [np.minimum, np.maximum]:
+            found = np.flatnonzero(current == extreme.reduceat(current, bin_starts)[bin_groups])
+            positions.append(found[np.concatenate([[True], bin_groups[found][1:] != bin_groups[found][:-1]])])
+
+        return np.concatenate(positions)
+
+    @classmethod
+    def _get_lttb_positions(cls, time: np.ndarray, current: np.ndarray, segment: np.ndarray, n: int) -> np.ndarray:
+        """
+        Function to pick n points of every segment with Largest-Triangle-Three-Buckets. The first and last points are
+        kept and the rest are split into n - 2 buckets, and from each bucket the point making the largest triangle with
+        the point picked from the bucket before and the mean of the bucket after is picked. All the segments are done
+        together, one bucket at a time
+        :param time: array of the time of each point, in order within each segment
+        :param current: array of the current of each point
+        :param segment: array of the segment of each point
+        :param n: number of points to keep in each segment, at least 3
+        :return: array of the positions of the points to keep
+        """
+        if n < 3:
+            raise ValueError("n must be at least 3 for lttb downsampling")
+
+        starts, groups = cls._get_segment_starts(segment)
+        lengths = np.diff(np.concatenate([starts, [len(time)]]))
+        position = np.arange(0, len(time)) - starts[groups]
+        n_buckets = n - 2
+
+        # segments with n points or less are kept whole
+        short = lengths[groups] <= n
+        inner = ~short & (position > 0) & (position < lengths[groups] - 1)
+        points = np.flatnonzero(inner)
+        bucket = (position[points] - 1) * n_buckets // (lengths[groups[points]] - 2)
+        key = groups[points] * n_buckets + bucket
+        count = np.bincount(key, minlength=len(starts) * n_buckets)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_time = np.bincount(key, weights=time[points], minlength=len(count)) / count
+            mean_current = np.bincount(key, weights=current[points], minlength=len(count)) / count
+
+        # the points of each bucket, over all the segments, in order of position
+        points = points[np.argsort(bucket, kind='stable')]
+        bucket_points = np.split(points, np.cumsum(np.bincount(bucket, minlength=n_buckets))[:-1])
+        a_time, a_current = time[starts].copy(), current[starts].copy()
+        picked = [np.flatnonzero(short), starts, starts + lengths - 1]
+
+        for b, p in enumerate(bucket_points):
+            if len(p) == 0:
+                continue
+            g = groups[p]
+            if b == n_buckets - 1:
+                c_time, c_current = time[starts + lengths - 1][g], current[starts + lengths - 1][g]
+            else:
+                c_time, c_current = mean_time[g * n_buckets + b + 1], mean_current[g * n_buckets + b + 1]
+
+            area = np.abs((a_time[g] - c_time) * (current[p] - a_current[g]) - (a_time[g] - time[p]) * (c_current - a_current[g]))
+            group_starts, group_index = cls._get_segment_starts(g)
+            found = np.flatnonzero(area == np.maximum.reduceat(area, group_starts)[group_index])
+            found = found[np.concatenate([[True], group_index[found][1:] != group_index[found][:-1]])]
+
+            a_time[g[found]], a_current[g[found]] = time[p[found]], current[p[found]]
+            picked.append(p[found])
+
+        return np.concatenate(picked)
+
+    def downsample(self, n: int | list[float] = 400, method: str = 'mean') -> pd.DataFrame:
         """
-        Function to downsample the data
+        Function to downsample the data. With 'mean' the points of each segment are averaged in n time bins and the
+        current roots found again. 'minmax' keeps the points with the lowest and highest current in each of n time
+        bins, and 'lttb' keeps n points of each segment with Largest-Triangle-Three-Buckets, which both keep the peaks.
+        These two only pick from the points already there, so the segment end points and current roots are kept as
+        they are
+        :param n: number of time bins, or of points for 'lttb', in each segment
+        :param method: 'mean', 'minmax' or 'lttb'
         """
+        if method not in ['mean', 'minmax', 'lttb']:
+            raise ValueError("method must be either mean, minmax or lttb")
+
+        if method != 'mean':
+            time = self._data['time'].to_numpy(dtype=float)
+            current = self._data['current'].to_numpy(dtype=float)
+            segment = self._data['segment'].to_numpy()
+            starts, _ = self._get_segment_starts(segment)
+            get_positions = self._get_minmax_positions if method == 'minmax' else self._get_lttb_positions
+
+            keep = np.zeros(len(time), dtype=bool)
+            keep[get_positions(time, current, segment, n)] = True
+            keep[starts] = True
+            keep[np.concatenate([starts[1:], [len(time)]]) - 1] = True
+            keep[current == 0] = True
+
+            self._data = self._data.iloc[np.flatnonzero(keep)]
+            self._cache = {}
+            self._live = None
+            return self
+
         # from a range and number of intervals, get the bin edges
         def get_bins(df, n):
             t_min = df['time'].min()
@@ -606,6 +1136,81 @@ class CyclicVoltammogram(ElectrochemicalMeasurement):
                              )
         
         self._data = down_sampled_data
+        self._cache = {}
+        self._live = None
         return self
-    
 
+
+def _get_file_charges(path: str, source: str = 'biologic', analysis: str = 'charge_passed', average: bool = False,
+                      scan_rate: float = None, **kwargs) -> tuple[pd.DataFrame, dict, str]:
+    """
+    Function to read one potentiostat file and get its charges, catching any error so that one bad file doesn't stop
+    the rest of a batch
+    :param path: path to the file
+    :param source: 'biologic' or 'aftermath'
+    :param analysis: 'charge_passed' or 'maximum_charges_passed'
+    :param average: average over the segments or sections
+    :param scan_rate: scan rate for aftermath files
+    :return: the charges, the metadata of the cyclic voltammogram and the error message if there was one
+    """
+    try:
+        if source == 'biologic':
+            cv = CyclicVoltammogram.from_biologic(path=path, **kwargs)
+        elif source == 'aftermath':
+            cv = CyclicVoltammogram.from_aftermath(path=path, scan_rate=scan_rate, **kwargs)
+        else:
+            raise ValueError('The source must be either biologic or aftermath')
+
+        if analysis == 'charge_passed':
+            charges = cv.get_charge_passed(average_segments=average)
+        else:
+            charges = cv.get_maximum_charges_passed(average_sections=average)
+
+        return charges.reset_index(drop=True), dict(cv.metadata), None
+    except Exception as error:
+        return None, {}, f"{type(error).__name__}: {error}"
+
+
+def get_batch_charges(paths: str | list[str], source: str = 'biologic', analysis: str = 'charge_passed',
+                      average: bool = False, scan_rate: float = None, n_jobs: int = None, callback=None,
+                      **kwargs) -> pd.DataFrame:
+    """
+    Function to get the charges passed from a batch of potentiostat files, read in parallel
+    :param paths: a glob pattern, or a list of paths
+    :param source: 'biologic' or 'aftermath'
+    :param analysis: 'charge_passed' for get_charge_passed, or 'maximum_charges_passed' for get_maximum_charges_passed
+    :param average: average over the segments or sections
+    :param scan_rate: scan rate for aftermath files
+    :param n_jobs: number of processes to use. If None or 1 the files are done one after the other, and -1 uses all cores
+    :param callback: function called as each file finishes, with the path, the number of files done, the number of files
+    and the error message or None
+    :param kwargs: passed on to from_biologic or from_aftermath, e.g. electrolyte or metadata
+    :return: data frame with the file, the metadata and the charges of each file. Files that failed have a row with the
+    error message in the error column
+    """
+    if source not in ['biologic', 'aftermath']:
+        raise ValueError('The source must be either biologic or aftermath')
+    if analysis not in ['charge_passed', 'maximum_charges_passed']:
+        raise ValueError('The analysis must be either charge_passed or maximum_charges_passed')
+
+    paths = sorted(glob.glob(paths)) if type(paths) == str else list(paths)
+    results = [None] * len(paths)
+
+    arg_list = [(path, source, analysis, average, scan_rate) for path in paths]
+    for n_done, (i, result, error) in enumerate(iter_jobs_as_completed(_get_file_charges, arg_list, n_jobs, kwargs), 1):
+        results[i] = result if error is None else (None, {}, f"{type(error).__name__}: {error}")
+        if callback is not None:
+            callback(paths[i], n_done, len(paths), results[i][2])
+
+    batch = []
+    for path, (charges, metadata, error) in zip(paths, results):
+        charges = pd.DataFrame(index=[0]) if charges is None else charges
+        batch.append(charges.assign(file=path, **metadata, error=error))
+
+    if len(batch) == 0:
+        return pd.DataFrame(columns=['file', 'error'])
+
+    batch = pd.concat(batch, ignore_index=True)
+    first = ['file'] + list(dict.fromkeys(k for _, metadata, _ in results for k in metadata.keys()))
+
+    return batch[first + [c for c in batch.columns if c not in first and c != 'error'] + ['error']]
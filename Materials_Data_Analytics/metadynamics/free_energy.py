@@ -5,8 +5,13 @@ import os
 import plotly.graph_objects as go
 import plotly.express as px
 from pandas import DataFrame
+from scipy.interpolate import RegularGridInterpolator
 from visualisation.themes import custom_dark_template
 from Materials_Data_Analytics.laws_and_constants import boltzmann_energy_to_population, Kb, boltzmann_population_to_energy
+from Materials_Data_Analytics.metadynamics.plumed_cache import read_plumed_table, get_cache
+from Materials_Data_Analytics.metadynamics.histogram import WeightedHistogram
+from Materials_Data_Analytics.metadynamics.spatial_index import SpatialIndex
+from Materials_Data_Analytics.core.parallel import iter_jobs, map_jobs
 pd.set_option('mode.chained_assignment', None)
 
 
@@ -14,17 +19,36 @@ class MetaTrajectory:
     """
     Class to handle colvar files, which here are thought of as a metadynamics trajectory in CV space.
     """
-    def __init__(self, colvar_file: str, temperature: float = 298, metadata: dict = None):
+    _column_names = {'metad.bias': 'bias', 'metad.rct': 'reweight_factor', 'metad.rbias': 'reweight_bias',
+                     'opes.bias': 'reweight_bias', 'opes.rct': 'reweight_factor', 'opes.zed': 'zed',
+                     'opes.neff': 'neff', 'opes.nker': 'nker'}
+    _bias_columns = ['bias', 'reweight_bias', 'reweight_factor']
+
+    def __init__(self, colvar_file: str, temperature: float = 298, metadata: dict = None, in_memory: bool = True):
+        """
+        :param colvar_file: path to the colvar file
+        :param temperature: temperature of the trajectory
+        :param metadata: any metadata to do with this trajectory
+        :param in_memory: read the whole colvar file into memory. If False, only the header is read and the data is
+        streamed from the file in chunks when it is needed
+        """
+        self._file = colvar_file
+        self._max_reweight_bias = None
+
+        if in_memory:
+            data, self._opes = self._read_file(colvar_file)
+            self._data = data.pipe(self._get_weights, temperature=temperature)
+            columns = self._data.columns.to_list()
+        else:
+            col_names = self._read_header(colvar_file)
+            self._opes = True if 'opes.bias' in col_names else False
+            self._data = None
+            columns = [self._column_names.get(c, c) for c in col_names]
 
-        data, self._opes = self._read_file(colvar_file)
-        self._data = data.pipe(self._get_weights, temperature=temperature)
+        self._columns = columns
         self.walker = int(colvar_file.split("/")[-1].split(".")[-1])
-        self.cvs = (self
-                    ._data
-                    .drop(columns=['time', 'bias', 'reweight_factor', 'reweight_bias', 'weight', 'zed','neff', 'nker'], errors='ignore')
-                    .columns
-                    .to_list()
-                    )
+        self.cvs = [c for c in columns
+                    if c not in ['time', 'bias', 'reweight_factor', 'reweight_bias', 'weight', 'zed', 'neff', 'nker']]
         self.temperature = temperature
         self._metadata = metadata
 
@@ -32,6 +56,21 @@ class MetaTrajectory:
     def opes(self):
         return self._opes
 
+    @property
+    def in_memory(self):
+        return self._data is not None
+
+    @staticmethod
+    def _read_header(file: str) -> list[str]:
+        """
+        Function to read the column names from the header of a plumed file
+        :param file: file to read the header from
+        :return: list of column names
+        """
+        with open(file) as col_file:
+            col_names = col_file.readline().strip().split(" ")[2:]
+        return col_names
+
     @staticmethod
     def _read_file(file: str):
         """
@@ -39,21 +78,96 @@ class MetaTrajectory:
         :param file: file to read in
         :return: _data in that file in pandas format
         """
-        col_file = open(file)
-        col_names = col_file.readline().strip().split(" ")[2:]
-        col_file.close()
+        col_names = MetaTrajectory._read_header(file)
         opes = True if 'opes.bias' in col_names else False
 
         # TODO: Check that opes.bias is the right bias to use for reweighting!
-        colvar = (pd.read_table(file, sep='\s+', comment="#", names=col_names, dtype=np.float64)
-                  .rename(columns={'metad.bias': 'bias', 'metad.rct': 'reweight_factor', 'metad.rbias':
-                                   'reweight_bias', 'opes.bias': 'reweight_bias', 'opes.rct': 'reweight_factor',
-                                   'opes.zed': 'zed', 'opes.neff': 'neff', 'opes.nker': 'nker'})
+        colvar = (read_plumed_table(file, col_names)
+                  .rename(columns=MetaTrajectory._column_names)
                   .assign(time=lambda x: x['time'] / 1000)
                   )
 
         return colvar, opes
 
+    @staticmethod
+    def _read_chunks(file: str, columns: list[str], chunk_size: int = 1000000):
+        """
+        Generator to read a colvar file in chunks, only parsing the columns asked for
+        :param file: file to read in
+        :param columns: the (renamed) columns to parse
+        :param chunk_size: number of frames in each chunk
+        :return: generator of dataframes
+        """
+        col_names = MetaTrajectory._read_header(file)
+        raw_names = {MetaTrajectory._column_names.get(c, c): c for c in col_names}
+        use_cols = [raw_names[c] for c in columns]
+        cached = get_cache().get(file) if get_cache() is not None else None
+
+        # if the file has been cached then slice the memory mapped columns rather than parsing the text
+        if cached is not None and list(cached) == col_names:
+            n_frames = cached[col_names[0]].shape[0]
+            reader = (pd.DataFrame({c: np.array(cached[c][start:start + chunk_size]) for c in use_cols})
+                      for start in range(0, n_frames, chunk_size))
+        else:
+            reader = pd.read_csv(file, sep=r'\s+', comment="#", names=col_names, usecols=use_cols, dtype=np.float64,
+                                 engine='c', chunksize=chunk_size)
+
+        for chunk in reader:
+            chunk = chunk.rename(columns=MetaTrajectory._column_names).filter(columns)
+            if 'time' in columns:
+                chunk['time'] = chunk['time'] / 1000
+            yield chunk
+
+    def _get_max_reweight_bias(self, chunk_size: int = 1000000) -> float:
+        """
+        Function to get the maximum reweight bias in the trajectory, which is needed to normalise the weights. Only the
+        reweight bias column is parsed, and the result is stored after the first pass
+        :param chunk_size: number of frames to read at once
+        :return: the maximum reweight bias
+        """
+        if self._max_reweight_bias is None:
+            if self._data is not None:
+                self._max_reweight_bias = self._data['reweight_bias'].max()
+            else:
+                self._max_reweight_bias = max([c['reweight_bias'].max() for c in
+                                               self._read_chunks(self._file, ['reweight_bias'], chunk_size)])
+
+        return self._max_reweight_bias
+
+    def iter_data(self, cvs: list[str] = None, chunk_size: int = 1000000, extra_columns: list[str] = None):
+        """
+        Generator to get the trajectory data in chunks. Only the time, the requested cvs and the bias columns are parsed,
+        and the weight column is computed chunk by chunk, so the full trajectory is never held in memory.
+        :param cvs: the cvs to get, defaults to all the cvs in the trajectory
+        :param chunk_size: number of frames in each chunk. If None, a trajectory in memory is given as one chunk
+        :param extra_columns: any other columns of the trajectory to get, such as zed or neff
+        :return: generator of dataframes with the time, cvs, bias and weight columns
+        """
+        cvs = self.cvs if cvs is None else cvs
+        extra_columns = [] if extra_columns is None else extra_columns
+
+        for cv in cvs:
+            if cv not in self.cvs:
+                raise ValueError(f"{cv} is not a cv in this trajectory")
+
+        for c in extra_columns:
+            if c not in self._columns:
+                raise ValueError(f"{c} is not a column in this trajectory")
+
+        columns = ['time'] + cvs + [c for c in self._bias_columns if c in self._columns]
+        columns = columns + [c for c in extra_columns if c not in columns and c != 'weight']
+
+        if self._data is not None:
+            chunk_size = max(self._data.shape[0], 1) if chunk_size is None else chunk_size
+            for start in range(0, self._data.shape[0], chunk_size):
+                yield self._data.iloc[start:start + chunk_size].filter(columns + ['weight'])
+        else:
+            chunk_size = 1000000 if chunk_size is None else chunk_size
+            max_bias = self._get_max_reweight_bias(chunk_size)
+            for chunk in self._read_chunks(self._file, columns, chunk_size):
+                chunk['weight'] = np.exp((chunk['reweight_bias'] - max_bias) / (Kb * self.temperature))
+                yield chunk
+
     @staticmethod
     def _get_weights(data: pd.DataFrame, temperature: float = 298, y_col: str = 'reweight_bias',
                      y_col_out: str = 'weight') -> pd.DataFrame:
@@ -81,7 +195,7 @@ class MetaTrajectory:
         :param time_resolution: reduce the size of the data frame by reducing the time resolution
         :return:
         """
-        data = self._data.copy()
+        data = self._data.copy() if self._data is not None else pd.concat(self.iter_data(), ignore_index=True)
 
         if with_metadata:
             data['temperature'] = self.temperature
@@ -133,6 +247,8 @@ class FreeEnergyShape:
         self.cvs = self._data.columns.values.tolist()[:dimension]
         self.dimension = dimension
         self._metadata = metadata
+        self._time_grid = None
+        self._indexes = {}
 
     @property
     def metadata(self):
@@ -167,22 +283,55 @@ class FreeEnergyShape:
         :param val_col: column from which to get the return
         :return: value
         """
-        new_cols = []
-        data = data.copy()
-
+        total_distance = np.zeros(data.shape[0])
         for key, value in ref_coordinate.items():
-            new_col = key + "_distance"
-            new_cols.append(new_col)
-            data[new_col] = (data[key].abs() - value)**2
-
-        data["total_distance"] = 0
-        for c in new_cols:
-            data["total_distance"] = data["total_distance"] + data[c]
+            total_distance = total_distance + (data[key].to_numpy() - value)**2
 
-        sorted_data = data.sort_values('total_distance').reset_index(drop=True)
-        closest_value = sorted_data.loc[0, val_col]
+        closest_value = data[val_col].to_numpy()[np.argmin(total_distance)]
         return closest_value
 
+    def _get_index(self, data: pd.DataFrame, key: str | int | float = None) -> SpatialIndex:
+        """
+        Function to get the spatial index of the cvs of a data frame of this shape. The index is kept until the data
+        frame is replaced, so it only has to be made once
+        :param data: the data frame
+        :param key: the key to keep the index under, the time stamp for time data or None for the main data
+        :return: SpatialIndex
+        """
+        if key not in self._indexes or self._indexes[key][0] is not data:
+            self._indexes[key] = (data, SpatialIndex.from_data(data, self.cvs))
+
+        return self._indexes[key][1]
+
+    @staticmethod
+    def _get_coordinates(coordinates: pd.DataFrame | dict[str, float | list | np.ndarray], cvs: list[str]) -> np.ndarray:
+        if type(coordinates) == pd.DataFrame:
+            return coordinates[cvs].to_numpy(dtype=np.float64)
+
+        return np.column_stack([np.atleast_1d(np.asarray(coordinates[c], dtype=np.float64)) for c in cvs])
+
+    def get_nearest_values(self, coordinates: pd.DataFrame | dict[str, float | list | np.ndarray],
+                           val_col: str = 'energy') -> np.ndarray:
+        """
+        Function to get the value in val_col at the nearest point of the shape to each of a batch of coordinates
+        :param coordinates: data frame with a column for each cv, or dict with a value or list of values for each cv
+        :param val_col: column from which to get the values
+        :return: array with a value for each coordinate
+        """
+        rows = self._get_index(self._data).nearest(self._get_coordinates(coordinates, self.cvs))
+        return self._data[val_col].to_numpy()[rows]
+
+    def get_interpolated_values(self, coordinates: pd.DataFrame | dict[str, float | list | np.ndarray],
+                                val_col: str = 'energy') -> np.ndarray:
+        """
+        Function to linearly interpolate the values in val_col to each of a batch of coordinates
+        :param coordinates: data frame with a column for each cv, or dict with a value or list of values for each cv
+        :param val_col: column from which to get the values
+        :return: array with a value for each coordinate
+        """
+        index = self._get_index(self._data)
+        return index.interpolate(self._get_coordinates(coordinates, self.cvs), self._data[val_col].to_numpy())
+
     @staticmethod
     def _get_mean_in_range(data: pd.DataFrame, ref_col, val_col, area: tuple[int | float, int | float]):
         """
@@ -212,7 +361,15 @@ class FreeEnergyShape:
             if cv not in self.cvs:
                 raise ValueError("The keys for the datum dictionary need to be cvs!")
 
-        if type(datum[self.cvs[0]]) == float or type(datum[self.cvs[0]]) == int:
+        if (type(datum[self.cvs[0]]) == float or type(datum[self.cvs[0]]) == int) and set(datum) == set(self.cvs):
+            point = self._get_coordinates(datum, self.cvs)
+            adjust_value = self._data['energy'].to_numpy()[self._get_index(self._data).nearest(point)[0]]
+            self._data['energy'] = self._data['energy'] - adjust_value
+            if self._time_data is not None:
+                for k, v in self._time_data.items():
+                    adjust_value = v['energy'].to_numpy()[self._get_index(v, key=k).nearest(point)[0]]
+                    v['energy'] = v['energy'] - adjust_value
+        elif type(datum[self.cvs[0]]) == float or type(datum[self.cvs[0]]) == int:
             adjust_value = self.get_nearest_value(self._data, datum, 'energy')
             self._data['energy'] = self._data['energy'] - adjust_value
             if self._time_data is not None:
@@ -229,6 +386,8 @@ class FreeEnergyShape:
         else:
             raise ValueError("Enter either a float or a tuple!")
 
+        self._time_grid = None
+
         return self
 
     @staticmethod
@@ -291,7 +450,7 @@ class FreeEnergyLine(FreeEnergyShape):
         col_names = col_file.readline().strip().split(" ")[2:]
         cv = col_names[0]
         col_file.close()
-        data = pd.read_table(file, sep='\s+', comment="#", names=col_names, dtype=np.float64)
+        data = read_plumed_table(file, col_names)
         if "file.free" in col_names:
             data = data.rename(columns={'file.free': 'energy', 'der_'+cv: 'delta_e'})
         else:
@@ -300,42 +459,69 @@ class FreeEnergyLine(FreeEnergyShape):
 
         return data
 
-    def get_time_difference(self, region_1: float | int | tuple[float | int, float | int],
-                            region_2: float | int | tuple[float | int, float | int] = None,
-                            with_metadata: bool = False) -> pd.DataFrame:
+    def _get_time_grid(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        Function to get how the difference in energy between two points changes over time, or the energy of one point
-        over time if region_2 is None. It can accept both numbers and tuples. If a tuple is given, it will take the mean
-        of the CV over the interval given by the tuple.
-        :param region_1: a point or region of the FES that you want to track as the first point
-        :param region_2: a point or region of the FES that you want to track as the second point
-        :param with_metadata: whether to return _data with the line _metadata
-        :return: pandas dataframe with the _data
+        Function to get the time data as arrays with a row for each time stamp, so that the time stamps can be queried
+        all at once. If the time stamps have different numbers of points, the shorter rows are padded with nan
+        :return: the sorted time stamps, the cv value of each point and the energy of each point
         """
-        time_data = []
+        if self._time_data is None:
+            raise ValueError("You need time _data to use this function")
 
-        for key, df in self._time_data.items():
+        if self._time_grid is None:
+            time_stamps = sorted(self._time_data)
+            n_points = max([df.shape[0] for df in self._time_data.values()])
+            cv_grid = np.full((len(time_stamps), n_points), np.nan)
+            energy_grid = np.full((len(time_stamps), n_points), np.nan)
+            for i, t in enumerate(time_stamps):
+                df = self._time_data[t]
+                cv_grid[i, :df.shape[0]] = df[self.cvs[0]].to_numpy()
+                energy_grid[i, :df.shape[0]] = df['energy'].to_numpy()
+            self._time_grid = (np.array(time_stamps), cv_grid, energy_grid)
 
-            if type(region_1) == int or type(region_1) == float:
-                value_1 = df.loc[(df[self.cvs[0]] - region_1).abs().argsort()[:1], 'energy'].values[0]
-            elif type(region_1) == tuple:
-                value_1 = df.loc[df[self.cvs[0]].between(min(region_1), max(region_1)), 'energy'].values.mean()
-            else:
-                raise ValueError("Use either a number or tuple of two numbers")
-
-            if (type(region_2) == int or type(region_2) == float) and region_2 is not None:
-                value_2 = df.loc[(df[self.cvs[0]] - region_2).abs().argsort()[:1], 'energy'].values[0]
-            elif type(region_2) == tuple and region_2 is not None:
-                value_2 = df.loc[df[self.cvs[0]].between(min(region_2), max(region_2)), 'energy'].values.mean()
-            elif region_2 is None:
-                value_2 = 0
-            else:
-                raise ValueError("Use either a number or tuple of two numbers")
+        return self._time_grid
 
-            difference = value_2 - value_1
-            time_data.append(pd.DataFrame({'time_stamp': [key], 'energy_difference': [difference]}))
+    @staticmethod
+    def _get_region_energy(region: float | int | tuple[float | int, float | int], cv_grid: np.ndarray,
+                           energy_grid: np.ndarray) -> np.ndarray:
+        """
+        Function to get the energy of a point, or the mean energy over a region, for every row of the time grid
+        :param region: a point or region of the FES
+        :param cv_grid: the cv value of each point, with a row for each time stamp
+        :param energy_grid: the energy of each point, with a row for each time stamp
+        :return: array with the energy for each time stamp
+        """
+        if type(region) == int or type(region) == float:
+            nearest = np.nanargmin(np.abs(cv_grid - region), axis=1)
+            return energy_grid[np.arange(0, energy_grid.shape[0]), nearest]
+        elif type(region) == tuple:
+            in_region = (cv_grid >= min(region)) & (cv_grid <= max(region))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(in_region, energy_grid, 0).sum(axis=1) / in_region.sum(axis=1)
+        else:
+            raise ValueError("Use either a number or tuple of two numbers")
 
-        time_data = pd.concat(time_data).sort_values('time_stamp')
+    def get_time_differences(self, region_pairs: list[tuple] | dict[str, tuple],
+                             with_metadata: bool = False) -> pd.DataFrame:
+        """
+        Function to get how the difference in energy between pairs of points or regions changes over time, for all the
+        time stamps at once. Each pair is (region_1, region_2) and gives the energy of region_2 minus the energy of
+        region_1, or minus zero if region_2 is None. Points take the energy at the nearest cv value, and tuples take the
+        mean energy over the interval.
+        :param region_pairs: list of (region_1, region_2) pairs, or a dict with the column name for each pair as the key
+        :param with_metadata: whether to return _data with the line _metadata
+        :return: pandas dataframe with a time_stamp column and a column for each pair
+        """
+        if type(region_pairs) != dict:
+            region_pairs = {f"{r[0]} to {r[1]}": r for r in region_pairs}
+
+        time_stamps, cv_grid, energy_grid = self._get_time_grid()
+        time_data = pd.DataFrame({'time_stamp': time_stamps})
+
+        for name, (region_1, region_2) in region_pairs.items():
+            value_1 = self._get_region_energy(region_1, cv_grid, energy_grid)
+            value_2 = 0 if region_2 is None else self._get_region_energy(region_2, cv_grid, energy_grid)
+            time_data[name] = value_2 - value_1
 
         if with_metadata:
             time_data['temperature'] = self.temperature
@@ -344,6 +530,20 @@ class FreeEnergyLine(FreeEnergyShape):
 
         return time_data
 
+    def get_time_difference(self, region_1: float | int | tuple[float | int, float | int],
+                            region_2: float | int | tuple[float | int, float | int] = None,
+                            with_metadata: bool = False) -> pd.DataFrame:
+        """
+        Function to get how the difference in energy between two points changes over time, or the energy of one point
+        over time if region_2 is None. It can accept both numbers and tuples. If a tuple is given, it will take the mean
+        of the CV over the interval given by the tuple.
+        :param region_1: a point or region of the FES that you want to track as the first point
+        :param region_2: a point or region of the FES that you want to track as the second point
+        :param with_metadata: whether to return _data with the line _metadata
+        :return: pandas dataframe with the _data
+        """
+        return self.get_time_differences({'energy_difference': (region_1, region_2)}, with_metadata=with_metadata)
+
     def set_errors_from_time_dynamics(self, n_timestamps: int, bins: int = 200):
         """
         Function to get _data and errors from considering the time dynamics of the FES
@@ -382,12 +582,31 @@ class FreeEnergyLine(FreeEnergyShape):
 
 
 class FreeEnergySurface(FreeEnergyShape):
-
+    """
+    Free energy surface over two cvs. As well as the long data frame, the surface keeps a dense grid of the two cv axes
+    and a 2D energy array, which is what the gradients and symmetrisation work on. Whichever of the two is missing is
+    made from the other when it is needed, and derived fields such as the mean force are kept until the surface changes.
+    """
     def __init__(self, data: pd.DataFrame | dict[int | float, pd.DataFrame], temperature: float = 298,
                  metadata: dict = None):
 
+        self._long_data = None
+        self._grid = None
+        self._derived = {}
         super().__init__(data, temperature, dimension=2, metadata=metadata)
 
+    @property
+    def _data(self) -> pd.DataFrame:
+        if self._long_data is None:
+            self._long_data = self._get_long_data()
+        return self._long_data
+
+    @_data.setter
+    def _data(self, data: pd.DataFrame):
+        self._long_data = data
+        self._grid = None
+        self._derived = {}
+
     @staticmethod
     def _read_file(file: str, temperature: float = 298):
         """
@@ -402,7 +621,7 @@ class FreeEnergySurface(FreeEnergyShape):
         col_file.close()
         drop_cols = [c for c in col_names if 'der_' in c]
 
-        data = (pd.read_table(file, sep='\s+', comment="#", names=col_names, dtype=np.float64)
+        data = (read_plumed_table(file, col_names)
                 .drop(columns=drop_cols)
                 .rename(columns={'file.free': 'energy'})
                 .pipe(boltzmann_energy_to_population, temperature=temperature, x_col=col_names[0])
@@ -410,6 +629,50 @@ class FreeEnergySurface(FreeEnergyShape):
 
         return data
 
+    def _get_grid(self) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+        """
+        Function to get the dense grid of the surface
+        :return: the first cv axis, the second cv axis, and a dict of 2D arrays indexed by [first cv, second cv] which
+        always has the energy
+        """
+        if self._grid is None:
+            energy = self._long_data.pivot(index=self.cvs[0], columns=self.cvs[1], values='energy')
+            self._grid = (energy.index.to_numpy(), energy.columns.to_numpy(), {'energy': energy.to_numpy()})
+
+        return self._grid
+
+    def _set_grid(self, x: np.ndarray, y: np.ndarray, fields: dict[str, np.ndarray]):
+        """
+        Function to replace the surface with a dense grid. The long data frame is made from the grid when it is next
+        needed
+        :param x: the first cv axis
+        :param y: the second cv axis
+        :param fields: dict of 2D arrays indexed by [first cv, second cv], which needs to have the energy
+        :return: self
+        """
+        self._long_data = None
+        self._grid = (x, y, fields)
+        self._derived = {}
+        return self
+
+    def _get_long_data(self) -> pd.DataFrame:
+        """
+        Function to make the long data frame from the dense grid, with the first cv changing fastest
+        :return: the long data frame
+        """
+        x, y, fields = self._grid
+        data = pd.DataFrame({self.cvs[0]: np.tile(x, len(y)), self.cvs[1]: np.repeat(y, len(x))})
+        for name, values in fields.items():
+            data[name] = values.ravel(order='F')
+
+        return data
+
+    def set_datum(self, datum: dict[str, float | int | tuple[float | int, float | int]]):
+        super().set_datum(datum)
+        self._grid = None
+        self._derived = {}
+        return self
+
     def set_as_symmetric(self, symmetry_rule: str = 'y=x'):
         """
         Function to make the free energy surface symmetric according to some line of symmetry. Currently only 'y=x' is
@@ -418,32 +681,28 @@ class FreeEnergySurface(FreeEnergyShape):
         :return:
         """
         if symmetry_rule == 'y=x':
-            x = self._data.pivot(index=[self.cvs[0]], columns=[self.cvs[1]], values=['energy']).index.to_list()
-            y = [i[1] for i in self._data.pivot(index=self.cvs[0], columns=self.cvs[1], values=['energy']).columns.to_list()]
-            v = self._data.pivot(index=self.cvs[0], columns=self.cvs[1], values=['energy']).to_numpy()
+            x, y, fields = self._get_grid()
+            v = fields['energy']
             v_sym = (v + v.T)/2
             err = np.absolute(v - v_sym)
-
-            data = (pd
-                    .DataFrame(v_sym, index=x, columns=y)
-                    .reset_index()
-                    .rename(columns={'index': self.cvs[0]})
-                    .melt(id_vars=self.cvs[0], var_name=self.cvs[1], value_name='energy')
-                    )
-
-            err = (pd
-                   .DataFrame(err, index=x, columns=y)
-                   .reset_index()
-                   .rename(columns={'index': self.cvs[0]})
-                   .melt(id_vars=self.cvs[0], var_name=self.cvs[1], value_name='symmetry_error')
-                   )
-
-            self._data = data.merge(err)
+            self._set_grid(x, y, {'energy': v_sym, 'symmetry_error': err})
         else:
             raise ValueError("That symmetry hasn't been built in yet.")
 
         return self
 
+    def _get_force_grid(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Function to get the mean force on the dense grid, which is kept until the surface changes
+        :return: the first cv axis, the second cv axis, and the force along each cv as 2D arrays
+        """
+        if 'force' not in self._derived:
+            x, y, fields = self._get_grid()
+            force = [-f for f in np.gradient(fields['energy'], x, y)]
+            self._derived['force'] = (x, y, force[0], force[1])
+
+        return self._derived['force']
+
     def get_mean_force(self) -> pd.DataFrame:
         """
         Function to get the mean force from the free energy surface
@@ -451,39 +710,54 @@ class FreeEnergySurface(FreeEnergyShape):
         """
         cv1 = self.cvs[0]
         cv2 = self.cvs[1]
-        x = self._data.pivot(index=[cv1], columns=[cv2], values=['energy']).index.to_list()
-        y = [i[1] for i in self._data.pivot(index=[cv1], columns=[cv2], values=['energy']).columns.to_list()]
-        v = self._data.pivot(index=[cv1], columns=[cv2], values=['energy']).to_numpy()
 
-        force = [-f for f in np.gradient(v, x, y)]
+        if 'mean_force' not in self._derived:
+            x, y, force_1, force_2 = self._get_force_grid()
+            self._derived['mean_force'] = pd.DataFrame({
+                cv1: np.tile(x, len(y)),
+                cv2: np.repeat(y, len(x)),
+                f'{cv1}_grad': force_1.ravel(order='F'),
+                f'{cv2}_grad': force_2.ravel(order='F')
+            })
 
-        grad1 = (pd
-                 .DataFrame(force[0], index=x, columns=y)
-                 .reset_index()
-                 .rename(columns={'index': cv1})
-                 .melt(id_vars=[cv1], var_name=cv2, value_name=f'{cv1}_grad')
-                 )
+        return self._derived['mean_force'].copy()
 
-        grad2 = (pd
-                 .DataFrame(force[1], index=x, columns=y)
-                 .reset_index()
-                 .rename(columns={'index': cv1})
-                 .melt(id_vars=[cv1], var_name=cv2, value_name=f'{cv2}_grad')
-                 )
+    def get_mean_force_at(self, coordinates: np.ndarray | pd.DataFrame, method: str = 'linear') -> np.ndarray:
+        """
+        Function to get the mean force at a batch of points by interpolating the force grid. The interpolators are kept
+        until the surface changes, so repeated calls only cost the interpolation
+        :param coordinates: array of shape (number of points, 2) in the order of the surface cvs, or a data frame with a
+        column for each cv
+        :param method: interpolation method, 'nearest', 'linear' for bilinear, or 'cubic' for a cubic spline
+        :return: array of shape (number of points, 2) with the force along each cv
+        """
+        if method not in ['nearest', 'linear', 'cubic']:
+            raise ValueError("method needs to be 'nearest', 'linear' or 'cubic'")
+
+        if type(coordinates) == pd.DataFrame:
+            coordinates = coordinates[self.cvs].to_numpy(dtype=np.float64)
+
+        key = f'force_{method}'
+        if key not in self._derived:
+            x, y, force_1, force_2 = self._get_force_grid()
+            self._derived[key] = [RegularGridInterpolator((x, y), f, method=method, bounds_error=False, fill_value=None)
+                                  for f in [force_1, force_2]]
 
-        force = grad1.merge(grad2)
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
 
-        return force
+        return np.column_stack([interpolator(coordinates) for interpolator in self._derived[key]])
 
 
 class FreeEnergySpace:
 
-    def __init__(self, hills_file: str | list[str] = None, temperature: float = 298, metadata: dict = None):
+    def __init__(self, hills_file: str | list[str] = None, temperature: float = 298, metadata: dict = None,
+                 n_jobs: int = None):
         """
         init file for the free energy space
         :param hills_file: path to the hills file
         :param temperature: temperature at which the free energy space is defined
         :param metadata: any metadata to do with this space
+        :param n_jobs: number of processes to read bias-exchange hills files with
         """
         self.n_walker = 0
         self.sigmas = None
@@ -505,47 +779,41 @@ class FreeEnergySpace:
                 self_opes, self._biasexchange = self.get_hills_attributes(hills_file)
         elif hills_file is not None and type(hills_file) == list:
             self._hills, self.sigmas, self.n_walker, self.n_timesteps, self.max_time, self.dt, self.cvs, \
-                self_opes, self._biasexchange = self.get_bias_exchange_hills_attributes(hills_file)
+                self_opes, self._biasexchange = self.get_bias_exchange_hills_attributes(hills_file, n_jobs=n_jobs)
 
         # if hills_file is not None and type(hills_file) == list:
 
-    def get_bias_exchange_hills_attributes(self, hills_files: list[str]):
+    def get_bias_exchange_hills_attributes(self, hills_files: list[str], n_jobs: int = None):
         """
-        Function to get attributes from a hills file if its a bias-exchange simulation
+        Function to get attributes from a hills file if its a bias-exchange simulation. Each file is read once, and the
+        time increments and opes status of each replica are checked against the first replica as the files are read
         :param hills_files: hills file paths as a list
+        :param n_jobs: number of processes to read the hills files with, -1 to use all cores
         :return:
         """
-        hills_list = [self.get_hills_attributes(h)[0] for h in hills_files]
-        sigma_list = [self.get_hills_attributes(h)[1] for h in hills_files]
-        n_timestep_list = [self.get_hills_attributes(h)[3] for h in hills_files]
-        max_time_list = [self.get_hills_attributes(h)[4] for h in hills_files]
-        dt_list = [self.get_hills_attributes(h)[5] for h in hills_files]
-        opes_list = [self.get_hills_attributes(h)[7] for h in hills_files]
-        cvs = [self.get_hills_attributes(h)[6][0] for h in hills_files]
-        sigmas = {k: v for d in sigma_list for k, v in d.items()}
+        hills_list = []
+        sigmas = {}
+        cvs = []
+        n_timesteps, max_time, dt, opes = None, None, None, None
         n_walker = len(hills_files)
         biasexchange = True
 
-        hills = (pd
-                 .concat([(hills_list[i]
-                           .rename(columns={cvs[i]: 'value'})
-                           .assign(variable=cvs[i])
-                           .drop(columns=["walker"])
-                           ) for i in range(0, len(hills_files))])
-                 .sort_values(["time", "variable"])
-                 )
-
-        if len(set(n_timestep_list)) == 1 and len(set(max_time_list)) == 1 and len(set(dt_list)) == 1:
-            n_timesteps = n_timestep_list[0]
-            max_time = max_time_list[0]
-            dt = dt_list[0]
-        else:
-            raise ValueError("Check the time increments of your HILLS files")
+        replicas = iter_jobs(FreeEnergySpace._get_hills_attributes, [(h,) for h in hills_files], n_jobs)
+        for i, (h, s, _, n, m, d, c, o, _) in enumerate(replicas):
+            if i == 0:
+                n_timesteps, max_time, dt, opes = n, m, d, o
+            elif n != n_timesteps or m != max_time or d != dt:
+                replicas.close()
+                raise ValueError("Check the time increments of your HILLS files")
+            elif o != opes:
+                replicas.close()
+                raise ValueError("Check the opes status of your hills files")
 
-        if len(set(opes_list)) == 1:
-            opes = opes_list[0]
-        else:
-            raise ValueError("Check the opes status of your hills files")
+            sigmas.update(s)
+            cvs.append(c[0])
+            hills_list.append(h.rename(columns={c[0]: 'value'}).assign(variable=c[0]).drop(columns=["walker"]))
+
+        hills = pd.concat(hills_list).sort_values(["time", "variable"])
 
         return hills, sigmas, n_walker, n_timesteps, max_time, dt, cvs, opes, biasexchange
 
@@ -555,7 +823,11 @@ class FreeEnergySpace:
         :param hills_file: hills file path
         :return:
         """
-        hills, sigmas = self._read_file(hills_file)
+        return self._get_hills_attributes(hills_file)
+
+    @staticmethod
+    def _get_hills_attributes(hills_file: str):
+        hills, sigmas = FreeEnergySpace._read_file(hills_file)
         n_walker = hills[hills['time'] == min(hills['time'])].shape[0]
         n_timesteps = hills[['time']].drop_duplicates().shape[0]
         max_time = hills['time'].max()
@@ -574,18 +846,22 @@ class FreeEnergySpace:
         return self._metadata
 
     @classmethod
-    def from_standard_directory(cls, standard_dir, colvar_string_matcher: str = "COLVAR_REWEIGHT.", **kwargs):
+    def from_standard_directory(cls, standard_dir, colvar_string_matcher: str = "COLVAR_REWEIGHT.",
+                                in_memory: bool = True, n_jobs: int = None, **kwargs):
         """
         alternate constructor to make a free energy space from a standard metadynamics directory. In this directory,
         the free energy lines and surfaces are held in folders called FES_* . The reweight data is held in COLVAR files
         called COLVAR_REWEIGHT.* .
         :param standard_dir: The directory with the plumed/gromacs files
         :param colvar_string_matcher: the string that matches to the colvar files names
+        :param in_memory: read the colvar files into memory. If False, the trajectories are streamed from file
+        :param n_jobs: number of processes to read the hills files and the headers of streamed colvar files with, -1 to
+        use all cores. Colvar files read into memory are always read in this process
         :return: a populated FreeEnergySpace
         """
         temperature = kwargs['temperature'] if 'temperature' in kwargs.keys() else 298
 
-        space = cls(**kwargs)
+        space = cls(n_jobs=n_jobs, **kwargs)
 
         for f in os.scandir(standard_dir):
             if (f.is_dir() and f.path.split("/")[-1].split("_")[0] == "FES"
@@ -607,11 +883,17 @@ class FreeEnergySpace:
                 surface = FreeEnergySurface.from_plumed(files, temperature=temperature)
                 space.add_surface(surface)
 
-        for f in [standard_dir + "/" + f for f in os.listdir(standard_dir)
-                  if colvar_string_matcher in f and 'bck' not in f]:
+        colvar_files = [standard_dir + "/" + f for f in os.listdir(standard_dir)
+                        if colvar_string_matcher in f and 'bck' not in f]
+
+        # in memory trajectories would have to send their whole weighted data frame back from the worker processes,
+        # which is slower than reading them here, so only streamed trajectories are made in the pool
+        arg_list = [(f, temperature, in_memory) for f in colvar_files]
+        trajectories = map_jobs(_load_meta_trajectory, arg_list, None if in_memory else n_jobs)
+
+        for f, traj in zip(colvar_files, trajectories):
             file = f.split("/")[-1]
             print(f"Adding {file} as a metaD trajectory")
-            traj = MetaTrajectory(f, temperature=temperature)
             space.add_metad_trajectory(traj)
 
         return space
@@ -634,7 +916,7 @@ class FreeEnergySpace:
         col_names = col_file.readline().strip().split(" ")[2:]
         col_file.close()
         sigmas = [col for col in col_names if col.split("_")[0] == 'sigma']
-        data = pd.read_table(file, sep='\s+', comment="#", names=col_names, dtype=np.float64)
+        data = read_plumed_table(file, col_names)
         sigmas = {s.split("_")[1]: data.loc[0, s] for s in sigmas}
 
         data = (data
@@ -849,20 +1131,13 @@ class FreeEnergySpace:
         return figure
 
     @staticmethod
-    def _reweight_traj_data(data: pd.DataFrame, cv: str | list[str], bins: int | list[int | float] = 200,
-                            temperature: float = 298, conditions: str | list[str] = None):
+    def _filter_data(data: pd.DataFrame, conditions: str | list[str] = None) -> pd.DataFrame:
         """
-        Function to reweight a _data frame using weights. Can do both one dimensional binning and two-dimensional
-        binning
-        :param data: _data frame to reweight
-        :param cv: the collective variable you are reweighting over
-        :param bins: number of bins, or a list of bin boundaries
-        :param temperature: temperature to get the population
-        :param conditions: conditions for the reweighting to discard frames
-        :return: reweighted dataframe
+        Function to filter a data frame with query style conditions
+        :param data: data frame to filter
+        :param conditions: conditions to discard frames
+        :return: filtered data frame
         """
-
-        # filter the data if there is a condition
         if conditions:
             if type(conditions) == str:
                 data = data.query(conditions)
@@ -870,8 +1145,20 @@ class FreeEnergySpace:
                 for c in conditions:
                     data = data.query(c)
 
+        return data
+
+    @staticmethod
+    def _get_reweighted_frame(histogram: tuple, cv: str | list[str], bins: int | list[int | float] = 200,
+                              temperature: float = 298) -> pd.DataFrame:
+        """
+        Function to turn a density normalised histogram into a reweighted data frame with populations and energies
+        :param histogram: tuple of the density and bin edges, as returned by np.histogram or np.histogram2d
+        :param cv: the collective variable(s) of the histogram
+        :param bins: number of bins, or a list of bin boundaries
+        :param temperature: temperature to get the energy
+        :return: reweighted dataframe
+        """
         if type(cv) == str:
-            histogram = np.histogram(a=data[cv], bins=bins, weights=data['weight'], density=True)
             x_points = [(histogram[1][i] + histogram[1][i + 1]) / 2 for i in range(0, len(histogram[1]) - 1)]
             if type(bins) == list:
                 x_widths = [(histogram[1][i+1] - histogram[1][i]) for i in range(0, len(histogram[1]) - 1)]
@@ -885,7 +1172,6 @@ class FreeEnergySpace:
             }).pipe(boltzmann_population_to_energy, temperature=temperature)
 
         elif type(cv) == list and len(cv) == 2:
-            histogram = np.histogram2d(x=data[cv[0]], y=data[cv[1]], bins=bins, weights=data['weight'], density=True)
             x_points = [(histogram[1][i] + histogram[1][i + 1]) / 2 for i in range(0, len(histogram[1]) - 1)]
             y_points = [(histogram[2][i] + histogram[2][i + 1]) / 2 for i in range(0, len(histogram[2]) - 1)]
             reweighted_data = (pd.DataFrame(histogram[0], index=x_points, columns=y_points)
@@ -898,29 +1184,196 @@ class FreeEnergySpace:
 
         return reweighted_data
 
-    def get_reweighted_surface(self, cvs: list[str, str], bins: list[int, int], conditions: str | list[str] = None):
+    @staticmethod
+    def _reweight_traj_data(data: pd.DataFrame, cv: str | list[str], bins: int | list[int | float] = 200,
+                            temperature: float = 298, conditions: str | list[str] = None):
+        """
+        Function to reweight a _data frame using weights. Can do both one dimensional binning and two-dimensional
+        binning
+        :param data: _data frame to reweight
+        :param cv: the collective variable you are reweighting over
+        :param bins: number of bins, or a list of bin boundaries
+        :param temperature: temperature to get the population
+        :param conditions: conditions for the reweighting to discard frames
+        :return: reweighted dataframe
+        """
+
+        # filter the data if there is a condition
+        data = FreeEnergySpace._filter_data(data, conditions)
+
+        if type(cv) == str:
+            histogram = np.histogram(a=data[cv], bins=bins, weights=data['weight'], density=True)
+        elif type(cv) == list and len(cv) == 2:
+            histogram = np.histogram2d(x=data[cv[0]], y=data[cv[1]], bins=bins, weights=data['weight'], density=True)
+        else:
+            raise ValueError('Reweighting only supports one or two CVs at the moment')
+
+        return FreeEnergySpace._get_reweighted_frame(histogram, cv, bins, temperature)
+
+    @staticmethod
+    def _iter_traj_chunks(traj_list: list, cvs: list[str], conditions: str | list[str] = None,
+                          chunk_size: int = None, filtered: bool = True):
+        """
+        Generator to go through a list of trajectories chunk by chunk, with the conditions applied to each chunk. Only
+        the cvs asked for, and any other columns used in the conditions, are read.
+        :param traj_list: list of trajectories
+        :param cvs: the cvs to get
+        :param conditions: conditions to discard frames
+        :param chunk_size: number of frames to read at once. If None, trajectories in memory are given in one chunk
+        :param filtered: apply the conditions to the chunks. If False, the chunks still have the columns to apply them
+        :return: generator of dataframes
+        """
+        for t in traj_list:
+            if not set(cvs).issubset(t.cvs):
+                raise ValueError("no trajectories in this space have that CV")
+
+        condition_list = [conditions] if type(conditions) == str else conditions if conditions else []
+
+        for traj in traj_list:
+            condition_columns = [c for c in traj._columns if c not in cvs and any(c in cond for cond in condition_list)]
+            for chunk in traj.iter_data(cvs, chunk_size=chunk_size, extra_columns=condition_columns):
+                yield FreeEnergySpace._filter_data(chunk, conditions) if filtered else chunk
+
+    @staticmethod
+    def _get_traj_ranges(traj_list: list, cvs: list[str], bins: int | list[int | float] = 200,
+                         conditions: str | list[str] = None, chunk_size: int = None,
+                         max_time: bool = False) -> list[tuple] | None | tuple:
+        """
+        Function to get the range of each cv over a list of trajectories, which is needed to make the bin edges if the
+        number of bins is given rather than the bin edges
+        :param traj_list: list of trajectories
+        :param cvs: the cvs to get the ranges for
+        :param bins: number of bins, or a list of bin boundaries
+        :param conditions: conditions to discard frames
+        :param chunk_size: number of frames to read at once
+        :param max_time: also get the last time in the trajectories, before the conditions are applied, in the same pass
+        :return: list with the (min, max) of each cv, or None if the bin edges are given. With max_time, a tuple of this
+        and the last time
+        """
+        get_ranges = type(bins) == int or (len(cvs) > 1 and len(bins) == len(cvs) and any(type(b) == int for b in bins))
+        limits = []
+        times = []
+
+        if get_ranges or max_time:
+            for chunk in FreeEnergySpace._iter_traj_chunks(traj_list, cvs, conditions, chunk_size, filtered=False):
+                if chunk.shape[0] > 0:
+                    times.append(chunk['time'].max())
+                chunk = FreeEnergySpace._filter_data(chunk, conditions)
+                if get_ranges and chunk.shape[0] > 0:
+                    limits.append((chunk[cvs].min().to_numpy(), chunk[cvs].max().to_numpy()))
+
+        if get_ranges:
+            if not limits:
+                raise ValueError("There is no data left to reweight!")
+            ranges = [(min([lim[0][i] for lim in limits]), max([lim[1][i] for lim in limits]))
+                      for i in range(0, len(cvs))]
+        else:
+            ranges = None
+
+        return (ranges, max(times)) if max_time else ranges
+
+    @staticmethod
+    def _get_traj_histogram(traj_list: list, cv: str | list[str], bins: int | list[int | float] = 200,
+                            conditions: str | list[str] = None, chunk_size: int = None) -> WeightedHistogram:
+        """
+        Function to accumulate the weighted histogram of a list of trajectories, trajectory by trajectory and chunk by
+        chunk, on fixed bin edges. If the number of bins is given rather than the bin edges, an extra pass over the cv
+        columns is done to get the range of the data.
+        :param traj_list: list of trajectories to reweight
+        :param cv: the collective variable(s) you are reweighting over
+        :param bins: number of bins, or a list of bin boundaries
+        :param conditions: conditions for the reweighting to discard frames
+        :param chunk_size: number of frames to read at once. If None, trajectories in memory are binned in one go
+        :return: the accumulated histogram
+        """
+        cvs = [cv] if type(cv) == str else cv
+        ranges = FreeEnergySpace._get_traj_ranges(traj_list, cvs, bins, conditions, chunk_size)
+        histogram = WeightedHistogram.from_bins(cv, bins, ranges)
+
+        for chunk in FreeEnergySpace._iter_traj_chunks(traj_list, cvs, conditions, chunk_size):
+            histogram.add_data(chunk)
+
+        return histogram
+
+    @staticmethod
+    def _get_traj_cumulative_histograms(traj_list: list, cv: str | list[str], bins: int | list[int | float] = 200,
+                                        n_timestamps: int = 10, conditions: str | list[str] = None,
+                                        chunk_size: int = None) -> list[WeightedHistogram]:
+        """
+        Function to get the histograms of a list of trajectories using all the frames up to each of n_timestamps evenly
+        spaced times. Each frame is assigned to a time block and a bin in one pass, and the histogram for each timestamp
+        is the cumulative sum over the blocks, so the cost does not grow with the number of timestamps. All the
+        timestamps share the bin edges, so if the number of bins is given the bins span the range of the whole data.
+        :param traj_list: list of trajectories to reweight
+        :param cv: the collective variable(s) you are reweighting over
+        :param bins: number of bins, or a list of bin boundaries
+        :param n_timestamps: number of time stamps
+        :param conditions: conditions for the reweighting to discard frames
+        :param chunk_size: number of frames to read at once
+        :return: list with the histogram at each timestamp
+        """
+        cvs = [cv] if type(cv) == str else cv
+        ranges, max_time = FreeEnergySpace._get_traj_ranges(traj_list, cvs, bins, conditions, chunk_size, max_time=True)
+        time_stamps = np.array([(i + 1) * max_time / n_timestamps for i in range(0, n_timestamps)])
+        histogram = WeightedHistogram.from_bins(cv, bins, ranges)
+        n_bins = histogram.counts.size
+        counts = np.zeros(n_timestamps * n_bins)
+
+        for chunk in FreeEnergySpace._iter_traj_chunks(traj_list, cvs, conditions, chunk_size):
+            bin_index = histogram.get_bin_index([chunk[c].to_numpy() for c in cvs])
+            block_index = np.searchsorted(time_stamps, chunk['time'].to_numpy(), side='left')
+            keep = (bin_index >= 0) & (block_index < n_timestamps)
+            counts += np.bincount(block_index[keep] * n_bins + bin_index[keep], weights=chunk['weight'].to_numpy()[keep],
+                                  minlength=n_timestamps * n_bins)
+
+        counts = counts.reshape((n_timestamps, *histogram.counts.shape)).cumsum(axis=0)
+
+        return [histogram.copy(counts=c) for c in counts]
+
+    @staticmethod
+    def _reweight_traj_stream(traj_list: list, cv: str | list[str], bins: int | list[int | float] = 200,
+                              temperature: float = 298, conditions: str | list[str] = None,
+                              chunk_size: int = None) -> pd.DataFrame:
+        """
+        Function to reweight a list of trajectories without concatenating them, using a histogram accumulated chunk by
+        chunk. With a chunk_size the trajectories are streamed, so they never have to be held in memory.
+        :param traj_list: list of trajectories to reweight
+        :param cv: the collective variable(s) you are reweighting over
+        :param bins: number of bins, or a list of bin boundaries
+        :param temperature: temperature to get the population
+        :param conditions: conditions for the reweighting to discard frames
+        :param chunk_size: number of frames to read at once
+        :return: reweighted dataframe
+        """
+        if type(cv) == list and len(cv) != 2:
+            raise ValueError('Reweighting only supports one or two CVs at the moment')
+
+        histogram = FreeEnergySpace._get_traj_histogram(traj_list, cv, bins, conditions, chunk_size)
+
+        return FreeEnergySpace._get_reweighted_frame(histogram.get_histogram(), cv, bins, temperature)
+
+    def get_reweighted_surface(self, cvs: list[str, str], bins: list[int, int], conditions: str | list[str] = None,
+                               chunk_size: int = None):
         """
         Function to get a reweighted surface
         :param cvs: list with the two cvs. The first will go on the x-axis, the second on the y-axis
         :param bins: list with two integers for the number of bins in each CV
         :param conditions: conditions to apply to the reweighting
+        :param chunk_size: if given, stream the trajectories in chunks of this many frames
         :return: a free energy surface
         """
-        data = []
-        for w, t in self.trajectories.items():
-            if cvs[0] in t.cvs and cvs[1] in t.cvs:
-                data.append(t.get_data())
-        if not data:
+        traj_list = [t for t in self.trajectories.values() if cvs[0] in t.cvs and cvs[1] in t.cvs]
+        if not traj_list:
             raise ValueError("no trajectories in this space have that CV")
-        data = pd.concat(data).sort_values('time')
-        fes_data = self._reweight_traj_data(data, cvs, bins, self.temperature, conditions=conditions)
+        fes_data = self._reweight_traj_stream(traj_list, cvs, bins, self.temperature, conditions=conditions,
+                                              chunk_size=chunk_size)
         surface = FreeEnergySurface(fes_data, temperature=self.temperature, metadata=self._metadata)
         return surface
 
     @staticmethod
     def _reweight_traj_list(traj_list: list, cv: str, bins: int | list[int | float] = 200, n_timestamps: int = None,
-                            verbosity: bool = False, conditions: str | list[str] = None, temperature: float = 298
-                            ) -> (pd.DataFrame | dict[pd.DataFrame]):
+                            verbosity: bool = False, conditions: str | list[str] = None, temperature: float = 298,
+                            cumulative: bool = False, chunk_size: int = None) -> (pd.DataFrame | dict[pd.DataFrame]):
         """
         Function to reweight a list of trajectories.
         :param traj_list: list of trajectories to reweight.
@@ -930,24 +1383,38 @@ class FreeEnergySpace:
         :param verbosity: print progress?
         :param conditions: some query style conditions to put on the histogram.
         :param temperature: temperature to get the population.
+        :param cumulative: get all the time stamps in one pass over the data, with the same bins for every time stamp,
+        which is needed when streaming with chunk_size. By default each time stamp is histogrammed separately and a
+        number of bins is spread over the data up to it.
+        :param chunk_size: number of frames to read at once, streaming the trajectories.
         :return: reweighted trajectory data.
         """
-        # grab the data from the trajectories
-        data = []
         for t in traj_list:
-            if cv in t.cvs:
-                data.append(t.get_data())
-            else:
+            if cv not in t.cvs:
                 raise ValueError("no trajectories in this space have that CV")
-        data = pd.concat(data).sort_values('time')
 
         # reweight the data
         if n_timestamps is None:
             fes_data = (FreeEnergySpace
-                        ._reweight_traj_data(data, cv, bins, temperature=temperature, conditions=conditions)
+                        ._reweight_traj_stream(traj_list, cv, bins, temperature=temperature, conditions=conditions,
+                                               chunk_size=chunk_size)
                         .filter([cv, 'energy', 'population'])
                         )
+        elif type(n_timestamps) == int and cumulative:
+            histograms = FreeEnergySpace._get_traj_cumulative_histograms(traj_list, cv, bins, n_timestamps,
+                                                                         conditions=conditions, chunk_size=chunk_size)
+            fes_data = {}
+            for i, h in enumerate(histograms):
+                fes_data[i+1] = (FreeEnergySpace
+                                 ._get_reweighted_frame(h.get_histogram(), cv, bins, temperature)
+                                 .filter([cv, 'energy', 'population'])
+                                 )
+                if verbosity:
+                    print(f"Made histogram for {i} timestamp")
+        elif type(n_timestamps) == int and chunk_size is not None:
+            raise ValueError("Use cumulative=True for time stamps when streaming the trajectories with chunk_size")
         elif type(n_timestamps) == int:
+            data = pd.concat([t.get_data() for t in traj_list]).sort_values('time')
             fes_data = {}
             max_time = data['time'].max()
             for i in range(0, n_timestamps):
@@ -966,8 +1433,8 @@ class FreeEnergySpace:
         return fes_data
 
     def get_reweighted_line(self, cv: str, bins: int | list[int | float] = 200, n_timestamps: int = None,
-                            verbosity: bool = False, conditions: str | list[str] = None, adaptive_bins: bool = False
-                            ) -> FreeEnergyLine:
+                            verbosity: bool = False, conditions: str | list[str] = None, adaptive_bins: bool = False,
+                            chunk_size: int = None, cumulative: bool = False) -> FreeEnergyLine:
         """
         Function to get a free energy line from a free energy space with meta trajectories in it, using weighted
         histogram analysis.
@@ -977,6 +1444,10 @@ class FreeEnergySpace:
         :param verbosity: print progress?
         :param conditions: some query style conditions to put on the histogram
         :param adaptive_bins: whether to use bins with equal number of points
+        :param chunk_size: if given, stream the trajectories in chunks of this many frames rather than concatenating them
+        :param cumulative: get all the time stamps in one pass over the data, with the same bins for every time stamp,
+        which is needed when streaming with chunk_size. By default each time stamp is histogrammed separately and a
+        number of bins is spread over the data up to it.
         :return:
         """
         # grab the trajectories and put them in a list
@@ -985,19 +1456,23 @@ class FreeEnergySpace:
             traj_list.append(t)
 
         # if using adaptive bins then get the quantiles
-        if adaptive_bins is True:
+        if adaptive_bins is True and chunk_size is None:
             traj_list_data = [s.get_data() for s in traj_list]
             bins = pd.qcut(pd.concat(traj_list_data)[cv], bins, retbins=True)[1]
+        elif adaptive_bins is True:
+            cv_data = [c[cv] for t in traj_list for c in t.iter_data([cv], chunk_size=chunk_size)]
+            bins = pd.qcut(pd.concat(cv_data), bins, retbins=True)[1]
 
         # reweight the trajectories
-        fes_data = self._reweight_traj_list(traj_list, cv, bins, n_timestamps, verbosity, conditions, self.temperature)
+        fes_data = self._reweight_traj_list(traj_list, cv, bins, n_timestamps, verbosity, conditions, self.temperature,
+                                            cumulative=cumulative, chunk_size=chunk_size)
 
         line = FreeEnergyLine(fes_data, temperature=self.temperature, metadata=self._metadata)
         return line
 
     def get_reweighted_line_with_walker_error(self, cv: str, bins: int | list[int | float] = 200,
                                               verbosity: bool = False, conditions: str | list[str] = None,
-                                              adaptive_bins: bool = False) -> FreeEnergyLine:
+                                              adaptive_bins: bool = False, n_jobs: int = None) -> FreeEnergyLine:
         """
         Function to get a free energy line from a free energy space with meta trajectories in it, using weighted
         histogram
@@ -1007,32 +1482,64 @@ class FreeEnergySpace:
         :param verbosity: print progress?
         :param conditions: some query style conditions to put on the histogram
         :param adaptive_bins: whether to make bins on quartiles
+        :param n_jobs: number of processes to get the walker histograms with, -1 to use all cores. Each process streams
+        its walker from file and only sends back the counts in each bin
         :return:
         """
         if self.n_walker == 1:
             raise ValueError("there is only data from one walker in this space!")
 
+        # with a process pool the walkers are streamed from file, so their data is never loaded in this process
+        parallel = not (n_jobs is None or n_jobs == 1)
+        if parallel:
+            for t in self.trajectories.values():
+                if cv not in t.cvs:
+                    raise ValueError("no trajectories in this space have that CV")
+            streamed = [MetaTrajectory(t._file, temperature=t.temperature, in_memory=False)
+                        for t in self.trajectories.values()]
+
         # grab the trajectories and put them in a list to get the bins if using adaptive
-        if adaptive_bins is True and type(bins) == int:
+        if adaptive_bins is True and type(bins) == int and parallel:
+            cv_data = [c[cv] for t in streamed for c in t.iter_data([cv])]
+            bins = pd.qcut(pd.concat(cv_data), bins, retbins=True, duplicates='drop')[1]
+        elif adaptive_bins is True and type(bins) == int:
             traj_data = [t.get_data() for t in self.trajectories.values()]
             bins = pd.qcut(pd.concat(traj_data)[cv], bins, retbins=True, duplicates='drop')[1]
         elif adaptive_bins is True and type(bins) == list:
             raise ValueError("If using adaptive bins then give bins an integer, not a list")
+        elif adaptive_bins is False and type(bins) == int and parallel:
+            # pd.cut only uses the minimum and maximum, so the streamed range gives the same bins
+            cv_range = self._get_traj_ranges(streamed, [cv], bins)[0]
+            bins = pd.cut(pd.Series(cv_range), bins, retbins=True, duplicates='drop')[1]
         elif adaptive_bins is False and type(bins) == int:
             traj_data = [t.get_data() for t in self.trajectories.values()]
             bins = pd.cut(pd.concat(traj_data)[cv], bins, retbins=True, duplicates='drop')[1]
 
         # reweight each trajectory individually
         fes_data = []
-        for w, t in self.trajectories.items():
-            if verbosity:
-                print(f"Getting reweighted data for walker {w}")
-            new_fes_data = (self
-                            ._reweight_traj_list([t], cv, bins, verbosity=verbosity, conditions=conditions,
-                                                 temperature=self.temperature)
-                            .assign(walker=w)
-                            )
-            fes_data.append(new_fes_data)
+        if not parallel:
+            for w, t in self.trajectories.items():
+                if verbosity:
+                    print(f"Getting reweighted data for walker {w}")
+                new_fes_data = (self
+                                ._reweight_traj_list([t], cv, bins, verbosity=verbosity, conditions=conditions,
+                                                     temperature=self.temperature)
+                                .assign(walker=w)
+                                )
+                fes_data.append(new_fes_data)
+        else:
+            histogram = WeightedHistogram.from_bins(cv, bins)
+            counts = map_jobs(_get_walker_counts, [(t, histogram, conditions) for t in streamed], n_jobs)
+            for w, c in zip(self.trajectories.keys(), counts):
+                if verbosity:
+                    print(f"Got reweighted data for walker {w}")
+                new_fes_data = (self
+                                ._get_reweighted_frame(histogram.copy(counts=c).get_histogram(), cv, bins,
+                                                       self.temperature)
+                                .filter([cv, 'energy', 'population'])
+                                .assign(walker=w)
+                                )
+                fes_data.append(new_fes_data)
 
         # get the mean and std for each value of the cv and turn it into a line
         line = (pd
@@ -1076,3 +1583,24 @@ class FreeEnergySpace:
             raise ValueError("trajectory_data needs to be a bool!")
 
         return data
+
+
+def _load_meta_trajectory(file: str, temperature: float = 298, in_memory: bool = True) -> MetaTrajectory:
+    return MetaTrajectory(file, temperature=temperature, in_memory=in_memory)
+
+
+def _get_walker_counts(traj: MetaTrajectory, histogram: WeightedHistogram, conditions: str | list[str] = None,
+                       chunk_size: int = 1000000) -> np.ndarray:
+    """
+    Function to get the weighted counts of one walker on fixed bin edges, so that only the counts array has to be sent
+    back from a worker process
+    :param traj: the trajectory of the walker
+    :param histogram: empty histogram with the bin edges to use
+    :param conditions: conditions for the reweighting to discard frames
+    :param chunk_size: number of frames to read at once
+    :return: array with the counts in each bin
+    """
+    for chunk in FreeEnergySpace._iter_traj_chunks([traj], histogram.cvs, conditions, chunk_size):
+        histogram.add_data(chunk)
+
+    return histogram.counts
@@ -0,0 +1,226 @@
+from __future__ import annotations
+import pandas as pd
+import numpy as np
+from Materials_Data_Analytics.laws_and_constants import boltzmann_population_to_energy
+
+
+class WeightedHistogram:
+    """
+    Class to accumulate a weighted histogram over fixed bin edges, in any number of dimensions. Data can be added in
+    chunks, from one or many walkers, and partial histograms with the same bin edges can be merged, so trajectories never
+    need to be concatenated or read twice.
+    """
+    def __init__(self, cvs: str | list[str], edges: np.ndarray | list[np.ndarray] | list[tuple[int, tuple]],
+                 counts: np.ndarray = None):
+        """
+        :param cvs: the collective variable, or list of collective variables, that the histogram is over
+        :param edges: the bin edges for each cv. A (number of bins, (min, max)) tuple can be given for a dimension
+        instead of the edges, in which case the bins are uniform and the faster uniform binning is used
+        :param counts: weighted counts to start the histogram with, defaults to an empty histogram
+        """
+        self.cvs = [cvs] if type(cvs) == str else list(cvs)
+
+        if type(cvs) == str:
+            edges = [edges]
+
+        if len(edges) != len(self.cvs):
+            raise ValueError("Give one set of bin edges for each cv")
+
+        self._uniform = []
+        self._edges = []
+        for e in edges:
+            if type(e) == tuple:
+                self._uniform.append(e)
+                self._edges.append(np.histogram_bin_edges(np.array([]), bins=e[0], range=e[1]))
+            else:
+                self._uniform.append(None)
+                self._edges.append(np.asarray(e, dtype=np.float64))
+
+        for e in self._edges:
+            if e.ndim != 1 or len(e) < 2 or np.any(np.diff(e) < 0):
+                raise ValueError("Bin edges must be one dimensional, increasing and have at least two values")
+
+        shape = tuple([len(e) - 1 for e in self._edges])
+
+        if counts is None:
+            self._counts = np.zeros(shape)
+        elif np.shape(counts) != shape:
+            raise ValueError("The counts need to have one value for each bin")
+        else:
+            self._counts = np.array(counts, dtype=np.float64)
+
+    @classmethod
+    def from_bins(cls, cvs: str | list[str], bins: int | list, ranges: list[tuple[float, float]] = None):
+        """
+        alternate constructor to make the histogram from a numpy style bins argument. For two or more dimensions bins
+        can be an int, a list with an int or edges for each cv, or a list of edges to use for all the cvs
+        :param cvs: the collective variable, or list of collective variables
+        :param bins: number of bins, or a list of bin edges
+        :param ranges: the (min, max) of each cv, needed for any dimension where the number of bins is given
+        :return: WeightedHistogram
+        """
+        cv_list = [cvs] if type(cvs) == str else list(cvs)
+        n_dims = len(cv_list)
+
+        if type(bins) == int:
+            bins = [bins] * n_dims
+        elif n_dims == 1:
+            bins = [bins]
+        elif len(bins) != n_dims:
+            bins = [bins] * n_dims
+
+        edges = []
+        for i, b in enumerate(bins):
+            if type(b) == int and ranges is None:
+                raise ValueError("You need to give the ranges if using a number of bins")
+            elif type(b) == int:
+                edges.append((b, (float(ranges[i][0]), float(ranges[i][1]))))
+            else:
+                edges.append(np.asarray(b, dtype=np.float64))
+
+        return cls(cv_list if type(cvs) != str else cvs, edges if type(cvs) != str else edges[0])
+
+    @property
+    def edges(self) -> list[np.ndarray]:
+        return self._edges
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._counts
+
+    @property
+    def total_weight(self) -> float:
+        return self._counts.sum()
+
+    def get_bin_index(self, values: np.ndarray | list[np.ndarray]) -> np.ndarray:
+        """
+        Function to get the flat index of the bin each sample falls in, using the same edge rules as np.histogram
+        :param values: array of values for a one dimensional histogram, or a list of arrays with one for each cv
+        :return: array with the flat bin index of each sample, or -1 if the sample is outside the bin edges
+        """
+        values = [values] if len(self.cvs) == 1 and np.ndim(values) == 1 else values
+
+        if len(values) != len(self.cvs):
+            raise ValueError("Give one array of values for each cv")
+
+        indexes = []
+        keep = np.ones(len(values[0]), dtype=bool)
+        for v, e in zip(values, self._edges):
+            v = np.asarray(v, dtype=np.float64)
+            index = np.searchsorted(e, v, side='right')
+            index[v == e[-1]] -= 1
+            keep &= (index > 0) & (index < len(e))
+            indexes.append(index - 1)
+
+        flat_index = np.full(len(keep), -1, dtype=np.int64)
+        flat_index[keep] = np.ravel_multi_index([i[keep] for i in indexes], self._counts.shape)
+
+        return flat_index
+
+    def add(self, values: np.ndarray | list[np.ndarray], weights: np.ndarray):
+        """
+        Function to add samples to the histogram. Values outside the bin edges are discarded, and the last bin includes
+        its right edge, as in np.histogram
+        :param values: array of values for a one dimensional histogram, or a list of arrays with one for each cv
+        :param weights: the weight of each sample
+        :return: self
+        """
+        values = [values] if len(self.cvs) == 1 and np.ndim(values) == 1 else values
+        weights = np.asarray(weights, dtype=np.float64)
+
+        if len(values) != len(self.cvs):
+            raise ValueError("Give one array of values for each cv")
+
+        if len(self.cvs) == 1:
+            bins = self._uniform[0][0] if self._uniform[0] else self._edges[0]
+            value_range = self._uniform[0][1] if self._uniform[0] else None
+            self._counts += np.histogram(values[0], bins=bins, range=value_range, weights=weights)[0]
+        else:
+            flat_index = self.get_bin_index(values)
+            keep = flat_index >= 0
+            self._counts += (np
+                             .bincount(flat_index[keep], weights=weights[keep], minlength=self._counts.size)
+                             .reshape(self._counts.shape)
+                             )
+
+        return self
+
+    def add_data(self, data: pd.DataFrame, weight_col: str = 'weight'):
+        """
+        Function to add the samples in a data frame to the histogram
+        :param data: data frame with a column for each cv and a weight column
+        :param weight_col: the column with the weights
+        :return: self
+        """
+        return self.add([data[c].to_numpy() for c in self.cvs], data[weight_col].to_numpy())
+
+    def _check_compatible(self, other: WeightedHistogram):
+        if other.cvs != self.cvs:
+            raise ValueError("The histograms need to be over the same cvs to merge them")
+        for e1, e2 in zip(self._edges, other.edges):
+            if not np.array_equal(e1, e2):
+                raise ValueError("The histograms need to have the same bin edges to merge them")
+
+    def copy(self, counts: np.ndarray = None) -> WeightedHistogram:
+        """
+        Function to copy the histogram
+        :param counts: counts to give the copy, defaults to the counts of this histogram
+        :return: WeightedHistogram with the same cvs and bin edges
+        """
+        new = WeightedHistogram.__new__(WeightedHistogram)
+        new.cvs = list(self.cvs)
+        new._uniform = list(self._uniform)
+        new._edges = [e.copy() for e in self._edges]
+        new._counts = self._counts.copy() if counts is None else np.array(counts, dtype=np.float64)
+
+        if new._counts.shape != self._counts.shape:
+            raise ValueError("The counts need to have one value for each bin")
+
+        return new
+
+    def merge(self, other: WeightedHistogram | list[WeightedHistogram]):
+        """
+        Function to add the counts of other histograms with the same bin edges to this histogram
+        :param other: histogram or list of histograms to merge in
+        :return: self
+        """
+        others = other if type(other) == list else [other]
+        for o in others:
+            self._check_compatible(o)
+            self._counts += o.counts
+        return self
+
+    def __add__(self, other: WeightedHistogram) -> WeightedHistogram:
+        return self.copy().merge(other)
+
+    def get_histogram(self) -> tuple:
+        """
+        Function to get the histogram normalised as a probability density, in the same format as np.histogram and
+        np.histogram2d with density=True
+        :return: tuple of the density and the bin edges of each dimension
+        """
+        widths = np.diff(self._edges[0])
+        for e in self._edges[1:]:
+            widths = np.multiply.outer(widths, np.diff(e))
+
+        density = self._counts / widths / self.total_weight
+
+        return (density, *self._edges)
+
+    def get_data(self, temperature: float = 298, density: bool = True) -> pd.DataFrame:
+        """
+        Function to get a data frame with the bin centres, populations and energies of the histogram
+        :param temperature: temperature to get the energy
+        :param density: normalise the population as a probability density. If False the population is the fraction of
+        the total weight in each bin
+        :return: data frame with a column for each cv, the population and the energy
+        """
+        histogram = self.get_histogram()
+        population = histogram[0] if density else self._counts / self.total_weight
+        centres = np.meshgrid(*[(e[1:] + e[:-1]) / 2 for e in self._edges], indexing='ij')
+
+        data = pd.DataFrame({c: centres[i].ravel(order='F') for i, c in enumerate(self.cvs)})
+        data['population'] = population.ravel(order='F')
+        data = data.pipe(boltzmann_population_to_energy, temperature=temperature)
+
+        return data
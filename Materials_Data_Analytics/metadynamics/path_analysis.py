@@ -1,3 +1,4 @@
+from __future__ import annotations
 import pandas as pd
 import numpy as np
 from Materials_Data_Analytics.metadynamics.free_energy import FreeEnergySurface
@@ -67,6 +68,8 @@ class SurfacePath(Path):
 
         super().__init__(path=path)
         self._shape = shape
+        self.n_iterations = None
+        self.converged = None
 
         if self._dimensions != 2 or shape.dimension != 2:
             raise ValueError("Check the path and surface both have dimension of 2!")
@@ -82,17 +85,168 @@ class SurfacePath(Path):
         if index < 0 or index > self._path.index.max():
             raise ValueError("The index needs to be between 0 and the max index")
 
-        surface_forces = self._shape.get_mean_force()
-        cv1 = self._cvs[0]
-        cv2 = self._cvs[1]
-
         if index == self._path.index.max() or index == 0:
-            fx = 0
-            fy = 0
+            return np.array([0, 0])
+
+        point = self._path.loc[[index], self._shape.cvs]
+        force = self._shape.get_mean_force_at(point, method='nearest')[0]
+
+        return np.array([force[self._shape.cvs.index(c)] for c in self._cvs])
+
+    def get_surface_forces(self, method: str = 'linear', fix_ends: bool = True) -> pd.DataFrame:
+        """
+        Function to get the forces from the free energy surface on every point of the path at once, interpolated from
+        the mean force on the surface grid
+        :param method: interpolation method, 'nearest', 'linear' for bilinear, or 'cubic' for a cubic spline
+        :param fix_ends: set the force on the first and last points to zero
+        :return: data frame with the path and the force along each cv
+        """
+        forces = self._shape.get_mean_force_at(self._path[self._shape.cvs], method=method)
+
+        if fix_ends:
+            forces[[0, -1], :] = 0
+
+        data = self._path.copy()
+        for c in self._cvs:
+            data[f'{c}_grad'] = forces[:, self._shape.cvs.index(c)]
+
+        return data
+
+    @staticmethod
+    def _reparametrise(images: np.ndarray) -> np.ndarray:
+        """
+        Function to move the images along the path so that they are equally spaced in arc length, keeping the ends
+        :param images: array of shape (number of images, 2)
+        :return: the equally spaced images
+        """
+        arc_length = np.concatenate([[0], np.cumsum(np.linalg.norm(np.diff(images, axis=0), axis=1))])
+
+        if arc_length[-1] == 0:
+            return images
+
+        new_arc_length = np.linspace(0, arc_length[-1], images.shape[0])
+        return np.column_stack([np.interp(new_arc_length, arc_length, images[:, i]) for i in range(0, 2)])
+
+    @staticmethod
+    def _get_tangents(images: np.ndarray) -> np.ndarray:
+        """
+        Function to get the unit tangent to the path at each image from the neighbouring images
+        :param images: array of shape (number of images, 2)
+        :return: array of unit tangents
+        """
+        tangents = np.gradient(images, axis=0)
+        norms = np.linalg.norm(tangents, axis=1, keepdims=True)
+        return np.divide(tangents, norms, out=np.zeros_like(tangents), where=norms > 0)
+
+    def get_minimum_free_energy_path(self, method: str = 'string', n_iterations: int = 2000, step_size: float = None,
+                                     tolerance: float = 1e-4, fix_ends: bool = False, spring_constant: float = None,
+                                     interpolation: str = 'linear', callback=None) -> SurfacePath:
+        """
+        Function to optimise this path into a minimum free energy path on the surface, moving all the images at once
+        with forces interpolated from the mean force of the surface. With method='string' the zero temperature string
+        method is used: every image moves along the force and the images are then put back to equal arc length. With
+        method='neb' the nudged elastic band is used: the images move along the force perpendicular to the path, and
+        springs along the path keep them spaced.
+        :param method: 'string' or 'neb'
+        :param n_iterations: maximum number of iterations
+        :param step_size: how far the images move per unit force. Defaults to a fifth of the smallest grid spacing
+        divided by the largest force on the surface
+        :param tolerance: the path is converged when no image moves more than this, in units of the grid spacing of
+        each cv, in one iteration
+        :param fix_ends: keep the first and last images where they are. If False, the ends relax into the minima
+        :param spring_constant: spring constant for the nudged elastic band. Defaults to the largest force on the
+        surface divided by the starting spacing of the images
+        :param interpolation: how to interpolate the force, 'nearest', 'linear' or 'cubic'
+        :param callback: function called after every iteration with the iteration number, the images as a data frame
+        and the largest move. If it returns True, the optimisation stops
+        :return: a new SurfacePath with the optimised images
+        """
+        if method not in ['string', 'neb']:
+            raise ValueError("method needs to be 'string' or 'neb'")
+
+        cvs = self._shape.cvs
+        x, y, force_1, force_2 = self._shape._get_force_grid()
+        spacing = np.array([np.diff(x).min(), np.diff(y).min()])
+        max_force = np.nanmax(np.abs(np.concatenate([force_1[np.isfinite(force_1)], force_2[np.isfinite(force_2)]])))
+        lower = np.array([x.min(), y.min()])
+        upper = np.array([x.max(), y.max()])
+
+        if step_size is None:
+            step_size = 0.2 * spacing.min() / max_force
+
+        images = self._path[cvs].to_numpy(dtype=np.float64)
+
+        if spring_constant is None and method == 'neb':
+            spring_constant = max_force / np.linalg.norm(np.diff(images, axis=0), axis=1).mean()
+
+        converged = False
+        iteration = 0
+        for iteration in range(1, n_iterations + 1):
+            forces = np.nan_to_num(self._shape.get_mean_force_at(images, method=interpolation), posinf=0, neginf=0)
+
+            if method == 'neb':
+                tangents = self._get_tangents(images)
+                tangents[[0, -1], :] = 0
+                forces = forces - (forces * tangents).sum(axis=1, keepdims=True) * tangents
+                segments = np.linalg.norm(np.diff(images, axis=0), axis=1)
+                stretch = np.zeros(images.shape[0])
+                stretch[1:-1] = segments[1:] - segments[:-1]
+                forces = forces + spring_constant * stretch[:, None] * tangents
+
+            if fix_ends:
+                forces[[0, -1], :] = 0
+
+            new_images = np.clip(images + step_size * forces, lower, upper)
+
+            if method == 'string':
+                new_images = self._reparametrise(new_images)
+
+            change = np.abs((new_images - images) / spacing).max()
+            images = new_images
+
+            stop = callback(iteration, pd.DataFrame(images, columns=cvs), change) if callback is not None else False
+
+            if change < tolerance:
+                converged = True
+                break
+            elif stop is True:
+                break
+
+        path = SurfacePath(pd.DataFrame(images, columns=cvs)[self._cvs], shape=self._shape)
+        path.n_iterations = iteration
+        path.converged = converged
+
+        return path
+
+    def get_free_energy_profile(self, interpolation: str = 'linear') -> pd.DataFrame:
+        """
+        Function to get the free energy along the path
+        :param interpolation: 'nearest' to take the energy of the nearest grid point, or 'linear' to interpolate
+        :return: data frame with the path, the arc length along the path and the energy
+        """
+        if interpolation == 'nearest':
+            energy = self._shape.get_nearest_values(self._path)
+        elif interpolation == 'linear':
+            energy = self._shape.get_interpolated_values(self._path)
         else:
-            x = self._path[cv1].iloc[index]
-            y = self._path[cv2].iloc[index]
-            fx = FreeEnergyShape.get_nearest_value(surface_forces, {cv1: x}, val_col=f"{cv1}_grad")
-            fy = FreeEnergyShape.get_nearest_value(surface_forces, {cv2: y}, val_col=f"{cv2}_grad")
+            raise ValueError("interpolation needs to be 'nearest' or 'linear'")
+
+        steps = np.linalg.norm(np.diff(self._path[self._cvs].to_numpy(dtype=np.float64), axis=0), axis=1)
+
+        return (self._path
+                .copy()
+                .assign(arc_length=np.concatenate([[0], np.cumsum(steps)]))
+                .assign(energy=energy)
+                )
 
-        return np.array([fx, fy])
+    def get_barrier(self, reverse: bool = False, interpolation: str = 'linear') -> float:
+        """
+        Function to get the free energy barrier along the path, the highest energy on the path minus the energy at the
+        start
+        :param reverse: give the barrier from the end of the path instead
+        :param interpolation: 'nearest' or 'linear'
+        :return: the barrier height
+        """
+        energy = self.get_free_energy_profile(interpolation=interpolation)['energy']
+        start = energy.iloc[-1] if reverse else energy.iloc[0]
+        return energy.max() - start
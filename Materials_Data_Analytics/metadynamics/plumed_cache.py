@@ -0,0 +1,209 @@
+from __future__ import annotations
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import shutil
+import hashlib
+
+
+class PlumedFileCache:
+    """
+    Class to cache parsed plumed files (COLVAR, HILLS, FES) on disk. Each file is stored as one binary .npy file per
+    float64 column, so a cached file can be loaded, or memory mapped, without parsing the text again. Entries are keyed
+    by the absolute path of the file, and are only used if the size and modification time of the file have not changed.
+    When the cache grows above max_size, the least recently used entries are removed.
+    """
+    def __init__(self, cache_dir: str = None, max_size: int | float = 2e9):
+        """
+        :param cache_dir: directory to hold the cache, defaults to ~/.cache/Materials_Data_Analytics/plumed
+        :param max_size: maximum size of the cache in bytes
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'Materials_Data_Analytics', 'plumed')
+
+        if max_size <= 0:
+            raise ValueError("max_size needs to be a positive number of bytes")
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _get_key(file: str) -> str:
+        """
+        Function to get the key of the cache entry for a file
+        :param file: path to the plumed file
+        :return: key
+        """
+        return hashlib.sha1(os.path.abspath(file).encode()).hexdigest()
+
+    def _get_entry_dir(self, file: str) -> str:
+        return os.path.join(self.cache_dir, self._get_key(file))
+
+    @staticmethod
+    def _read_meta(entry_dir: str) -> dict | None:
+        try:
+            with open(os.path.join(entry_dir, 'meta.json')) as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(entry_dir: str, meta: dict):
+        with open(os.path.join(entry_dir, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+    def get(self, file: str, mmap: bool = True) -> dict[str, np.ndarray] | None:
+        """
+        Function to get the cached columns of a file
+        :param file: path to the plumed file
+        :param mmap: memory map the columns rather than reading them into memory
+        :return: dictionary with the column names as keys and the column arrays as values, or None if the file is not
+        in the cache or has changed since it was cached
+        """
+        entry_dir = self._get_entry_dir(file)
+        meta = self._read_meta(entry_dir)
+
+        if meta is None:
+            return None
+
+        stat = os.stat(file)
+        if meta['size'] != stat.st_size or meta['mtime'] != stat.st_mtime_ns:
+            self.invalidate(file)
+            return None
+
+        mmap_mode = 'r' if mmap else None
+        columns = {c: np.load(os.path.join(entry_dir, f'col_{i}.npy'), mmap_mode=mmap_mode)
+                   for i, c in enumerate(meta['columns'])}
+
+        meta['last_access'] = time.time()
+        self._write_meta(entry_dir, meta)
+
+        return columns
+
+    def put(self, file: str, data: pd.DataFrame):
+        """
+        Function to add a parsed file to the cache
+        :param file: path to the plumed file that was parsed
+        :param data: the parsed data, with float64 columns
+        :return: self
+        """
+        stat = os.stat(file)
+        entry_dir = self._get_entry_dir(file)
+        tmp_dir = entry_dir + f'.tmp{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        for i, c in enumerate(data.columns):
+            np.save(os.path.join(tmp_dir, f'col_{i}.npy'), data[c].to_numpy(dtype=np.float64))
+
+        meta = {'file': os.path.abspath(file), 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                'columns': data.columns.to_list(), 'n_bytes': int(data.shape[0] * data.shape[1] * 8),
+                'last_access': time.time()}
+        self._write_meta(tmp_dir, meta)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self._evict()
+
+        return self
+
+    def _get_entries(self) -> list[tuple[str, dict]]:
+        entries = []
+        for f in os.scandir(self.cache_dir):
+            meta = self._read_meta(f.path) if f.is_dir() else None
+            if meta is not None:
+                entries.append((f.path, meta))
+        return entries
+
+    def _evict(self):
+        """
+        Function to remove the least recently used entries until the cache is smaller than max_size
+        """
+        entries = sorted(self._get_entries(), key=lambda e: e[1]['last_access'])
+        size = sum([e[1]['n_bytes'] for e in entries])
+
+        while size > self.max_size and len(entries) > 0:
+            entry_dir, meta = entries.pop(0)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            size = size - meta['n_bytes']
+
+    @property
+    def size(self) -> int:
+        return sum([meta['n_bytes'] for _, meta in self._get_entries()])
+
+    def invalidate(self, file: str | list[str] = None):
+        """
+        Function to remove files from the cache
+        :param file: path or list of paths to remove from the cache. If None, the whole cache is cleared
+        :return: self
+        """
+        if file is None:
+            for entry_dir, _ in self._get_entries():
+                shutil.rmtree(entry_dir, ignore_errors=True)
+        elif type(file) == list:
+            for f in file:
+                self.invalidate(f)
+        else:
+            shutil.rmtree(self._get_entry_dir(file), ignore_errors=True)
+
+        return self
+
+    def read_table(self, file: str, col_names: list[str]) -> pd.DataFrame:
+        """
+        Function to read a plumed file, using the cache if the file has been parsed before
+        :param file: path to the plumed file
+        :param col_names: the column names from the plumed header
+        :return: the parsed data
+        """
+        columns = self.get(file, mmap=False)
+
+        if columns is not None and list(columns) == col_names:
+            return pd.DataFrame(columns)
+
+        data = pd.read_table(file, sep=r'\s+', comment="#", names=col_names, dtype=np.float64)
+        self.put(file, data)
+
+        return data
+
+
+_cache = None
+
+
+def enable_cache(cache_dir: str = None, max_size: int | float = 2e9) -> PlumedFileCache:
+    """
+    Function to turn on the on-disk cache for all plumed files read by the metadynamics module
+    :param cache_dir: directory to hold the cache
+    :param max_size: maximum size of the cache in bytes
+    :return: the cache
+    """
+    global _cache
+    _cache = PlumedFileCache(cache_dir, max_size)
+    return _cache
+
+
+def disable_cache():
+    """
+    Function to turn off the on-disk cache. The cached files are left on disk
+    """
+    global _cache
+    _cache = None
+
+
+def get_cache() -> PlumedFileCache | None:
+    return _cache
+
+
+def read_plumed_table(file: str, col_names: list[str]) -> pd.DataFrame:
+    """
+    Function to read the data in a plumed file as float64 columns, going through the cache if it is enabled
+    :param file: path to the plumed file
+    :param col_names: the column names from the plumed header
+    :return: the parsed data
+    """
+    if _cache is not None:
+        return _cache.read_table(file, col_names)
+
+    return pd.read_table(file, sep=r'\s+', comment="#", names=col_names, dtype=np.float64)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import pandas as pd
+import numpy as np
+from scipy.spatial import cKDTree, Delaunay
+from scipy.interpolate import RegularGridInterpolator, LinearNDInterpolator
+
+
+class SpatialIndex:
+    """
+    Class to find nearest points, and interpolate values, in a set of points in cv space. If the points make a full
+    regular grid, such as a plumed FES or a reweighted histogram, each axis is searched on its own with a binary search.
+    Otherwise, a KD-tree is used. The index only holds the coordinates, so values that change, like energies after a
+    new datum, can be passed in for each query.
+    """
+    def __init__(self, points: np.ndarray):
+        """
+        :param points: array of shape (number of points, number of dimensions), or a 1D array for one dimension
+        """
+        points = np.asarray(points, dtype=np.float64)
+        points = points.reshape(-1, 1) if points.ndim == 1 else points
+
+        if points.ndim != 2 or points.shape[0] == 0:
+            raise ValueError("The points need to be an array of shape (number of points, number of dimensions)")
+
+        self._points = points
+        self.n_dims = points.shape[1]
+        self._axes, self._grid_rows = self._get_grid(points)
+        self._tree = cKDTree(points) if self._axes is None else None
+        self._triangulation = None
+
+    @classmethod
+    def from_data(cls, data: pd.DataFrame, cvs: list[str]):
+        """
+        alternate constructor to make the index from the cv columns of a data frame
+        :param data: data frame with a column for each cv
+        :param cvs: the cvs to index
+        :return: SpatialIndex
+        """
+        return cls(data[cvs].to_numpy(dtype=np.float64))
+
+    @property
+    def is_grid(self) -> bool:
+        return self._axes is not None
+
+    @property
+    def axes(self) -> list[np.ndarray] | None:
+        return self._axes
+
+    @staticmethod
+    def _get_grid(points: np.ndarray) -> tuple[list[np.ndarray] | None, np.ndarray | None]:
+        """
+        Function to check if the points make a full regular grid, with each combination of the axis values once
+        :param points: array of the points
+        :return: the sorted values on each axis and the row of each grid point, or None and None if not a grid
+        """
+        axes = [np.unique(points[:, i]) for i in range(0, points.shape[1])]
+        shape = tuple([len(a) for a in axes])
+
+        if np.prod(shape) != points.shape[0] or np.isnan(points).any():
+            return None, None
+
+        flat_index = np.ravel_multi_index([np.searchsorted(a, points[:, i]) for i, a in enumerate(axes)], shape)
+        rows = np.full(points.shape[0], -1)
+        rows[flat_index] = np.arange(0, points.shape[0])
+
+        if (rows < 0).any():
+            return None, None
+
+        return axes, rows.reshape(shape)
+
+    def _format_coordinates(self, coordinates: np.ndarray | list) -> np.ndarray:
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+
+        if coordinates.ndim == 1 and self.n_dims == 1:
+            coordinates = coordinates.reshape(-1, 1)
+        elif coordinates.ndim == 1:
+            coordinates = coordinates.reshape(1, -1)
+
+        if coordinates.ndim != 2 or coordinates.shape[1] != self.n_dims:
+            raise ValueError("The coordinates need to have one value for each dimension of the index")
+
+        return coordinates
+
+    @staticmethod
+    def _get_nearest_on_axis(axis: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Function to get the position of the nearest value on a sorted axis for each value, taking the lower value on a
+        tie
+        :param axis: sorted axis values
+        :param values: values to look up
+        :return: array of positions on the axis
+        """
+        if len(axis) == 1:
+            return np.zeros(len(values), dtype=np.int64)
+
+        upper = np.searchsorted(axis, values).clip(1, len(axis) - 1)
+        take_lower = (values - axis[upper - 1]) <= (axis[upper] - values)
+        return upper - take_lower
+
+    def nearest(self, coordinates: np.ndarray | list) -> np.ndarray:
+        """
+        Function to get the rows of the nearest points to a batch of coordinates
+        :param coordinates: array of shape (number of queries, number of dimensions). A 1D array is taken as one point,
+        or as many points if the index has one dimension
+        :return: array with the row of the nearest point for each query
+        """
+        coordinates = self._format_coordinates(coordinates)
+
+        if self.is_grid:
+            index = [self._get_nearest_on_axis(a, coordinates[:, i]) for i, a in enumerate(self._axes)]
+            return self._grid_rows[tuple(index)]
+        else:
+            return self._tree.query(coordinates)[1]
+
+    def interpolate(self, coordinates: np.ndarray | list, values: np.ndarray) -> np.ndarray:
+        """
+        Function to linearly interpolate values given at the indexed points to a batch of coordinates. Outside of the
+        points the values are extrapolated on a grid, and take the nearest value otherwise
+        :param coordinates: array of shape (number of queries, number of dimensions)
+        :param values: the value at each indexed point, in the same order as the points
+        :return: array with the interpolated value for each query
+        """
+        coordinates = self._format_coordinates(coordinates)
+        values = np.asarray(values, dtype=np.float64)
+
+        if len(values) != self._points.shape[0]:
+            raise ValueError("Give one value for each point in the index")
+
+        if self.is_grid and any([len(a) < 2 for a in self._axes]):
+            return values[self.nearest(coordinates)]
+        elif self.is_grid:
+            interpolator = RegularGridInterpolator(self._axes, values[self._grid_rows], method='linear',
+                                                   bounds_error=False, fill_value=None)
+            return interpolator(coordinates)
+        elif self.n_dims == 1:
+            order = np.argsort(self._points[:, 0], kind='stable')
+            return np.interp(coordinates[:, 0], self._points[order, 0], values[order])
+        else:
+            if self._triangulation is None:
+                self._triangulation = Delaunay(self._points)
+            interpolated = LinearNDInterpolator(self._triangulation, values)(coordinates)
+            outside = self._triangulation.find_simplex(coordinates) < 0
+            interpolated[outside] = values[self.nearest(coordinates[outside])]
+            return interpolated
@@ -1,10 +1,6 @@
 #!/usr/bin/env python3
 import click
-import os
-import pandas as pd
-import MDAnalysis as mda
-import networkx as nx
-from MDAnalysis.analysis import contacts
+from Materials_Data_Analytics.core.polymer_contacts import FragmentContactAnalysis, run_fragment_contacts
 
 
 @click.command()
@@ -13,13 +9,15 @@ from MDAnalysis.analysis import contacts
 @click.option("--tpr_file", "-s", type=str, default='Prod.tpr', help="tpr file for the MD universe")
 @click.option("--xtc_file", "-f", type=str, default='Prod.xtc', help="trajectory file for the MD universe")
 @click.option("--pol_num", "-n", type=int, default=100, help="Number of polymers in the universe")
-@click.option("--output_tsv", "-o", default="contacts.tsv", help="Output file (should be a tsv)", type=str)
+@click.option("--output_tsv", "-o", default="contacts.tsv", help="Output file (a tsv, a .parquet file, or a .npy file of sparse contacts). The tsv is in order of frame, with no index column", type=str)
 @click.option("--radius", "-r", default=4, help="radius in angstrom for the cut-off", type=float)
 @click.option("--trajectory_slicer", "-ts", default=1, help="take every ts'th frame from the trajectory", type=int)
-@click.option("--verbose", "-v", count=True)
+@click.option("--verbose", "-v", count=True, help="Report each frame, or each finished shard with --n-jobs")
 @click.option("--sparse", "-sp", is_flag=True, default=False, help="Store as a sparse dataframe?")
+@click.option("--n-jobs", "-j", default=1, help="Number of processes to split the frames over, -1 for all cores", type=int)
+@click.option("--resume", is_flag=True, default=False, help="Skip the frames already done by an earlier run")
 def main(reference_atoms: str, selection_atoms: str, tpr_file: str, xtc_file: str, pol_num: int, output_tsv: str, radius: float,
-         trajectory_slicer: int, verbose, sparse: bool = False):
+         trajectory_slicer: int, verbose, sparse: bool = False, n_jobs: int = 1, resume: bool = False):
     """
     Function to calculate edge data for a network using the polymers as a basis, and proximity as an edge
     :param reference_atoms: Pymol atom selection language for contact group a
@@ -27,59 +25,31 @@ def main(reference_atoms: str, selection_atoms: str, tpr_file: str, xtc_file: st
     :param tpr_file: tpr file for the MD universe
     :param xtc_file: trajectory file for the MD universe
     :param pol_num: Number of polymers in the universe
-    :param output_tsv: Output file (should be a tsv)
+    :param output_tsv: Output file, a tsv, a .parquet file, or a .npy file of sparse contacts for ContactNetwork. The
+    tsv has the time, ref, sel and n columns in order of frame, with no index column
     :param radius: radius for the cuttoff in angstrom
     :param trajectory_slicer: take every ts'th element from the time data in the trajectory
     :param verbose: how verbose to be
     :param sparse: output a sparse dataframe?
+    :param n_jobs: number of processes to split the frames over
+    :param resume: skip the frames already in the chunk files of an earlier run
     :return: file with contact information
     """
 
-    u = mda.Universe(tpr_file, xtc_file)
-    connection_data = []
-    pairs = []
+    analysis = FragmentContactAnalysis('contacts', reference_atoms, selection_atoms, n_fragments=pol_num, radius=radius)
 
-    for r in range(0, pol_num):
-        ref_group = u.atoms.fragments[r].select_atoms(reference_atoms)
+    def report_frame(ts):
+        if verbose >= 1:
+            click.echo(f"Calculating contacts at time {ts.time}", err=True)
 
-        if verbose == 1:
-            click.echo(f"Calculating contacts for polymer {r}", err=True)
+    # the frames of the other processes can't be reported as they are done, so the shards are reported as they finish
+    def report_shard(n_done, n_frames):
+        if verbose >= 1 and n_jobs != 1:
+            click.echo(f"Finished {n_done} of {n_frames} frames", err=True)
 
-        for s in range(0, pol_num):
-            sel_group = u.atoms.fragments[s].select_atoms(selection_atoms)
-
-            pairs.append((r, s))
-
-            if (s, r) not in pairs and s != r:
-                if verbose == 2:
-                    click.echo(f"Calculating contacts between polymer {r} and polymer {s}", err=True)
-                for ts in u.trajectory[::trajectory_slicer]:
-                    if verbose == 3:
-                        click.echo(f"Calculating contacts between polymer {r} and polymer {s} at time {u.trajectory.time}", err=True)
-                    dist = contacts.distance_array(ref_group.positions, sel_group.positions)
-                    n_contacts = contacts.contact_matrix(dist, radius).sum()
-
-                    if sparse and n_contacts != 0:
-                        connection_data.append(
-                            pd.DataFrame({
-                                'time': [u.trajectory.time],
-                                'ref': [r],
-                                'sel': [s],
-                                'n': [n_contacts]
-                            }))
-                    elif not sparse:
-                        connection_data.append(
-                            pd.DataFrame({
-                                'time': [u.trajectory.time],
-                                'ref': [r],
-                                'sel': [s],
-                                'n': [n_contacts]
-                            }))
-                    else:
-                        pass
-
-    connection_data = pd.concat(connection_data)
-    connection_data.to_csv(output_tsv, sep="\t")
+    run_fragment_contacts(tpr_file, xtc_file, analysis, output_tsv, frames=slice(None, None, trajectory_slicer),
+                          sparse=sparse, n_jobs=n_jobs, resume=resume, callback=report_frame,
+                          shard_callback=report_shard)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+import unittest
+import io
+import tempfile
+import shutil
+import os
+import numpy as np
+import pandas as pd
+from Materials_Data_Analytics.experiment_modelling.biologic import read_biologic, read_biologic_text, MPR_MAGIC, BiologicTail
+from Materials_Data_Analytics.experiment_modelling.cyclic_voltammetry import CyclicVoltammogram
+
+
+def write_mpr(path: str, columns: dict, new_header: bool = False):
+    """
+    Function to write a small .mpr file with a settings module and a data module with some columns
+    :param path: the file to write
+    :param columns: dict of column id to a tuple of the dtype and the values
+    :param new_header: use the longer module header of newer versions of EC-Lab
+    """
+    def module(name: str, data: bytes) -> bytes:
+        header = b'MODULE' + name.ljust(10).encode() + name.ljust(25).encode()
+        if new_header:
+            header += np.array([len(data), len(data), 3, 0], dtype='<u4').tobytes()
+        else:
+            header += np.array([len(data), 2], dtype='<u4').tobytes()
+        return header + b'01/01/24' + data
+
+    n_points = len(list(columns.values())[0][1])
+    record = np.dtype([('flags', 'u1')] + [(str(c), d) for c, (d, _) in columns.items()])
+    records = np.zeros(n_points, dtype=record)
+    for c, (_, values) in columns.items():
+        records[str(c)] = values
+
+    ids = [1, 2] + list(columns.keys())
+    data = (np.array([n_points], dtype='<u4').tobytes() + np.array([len(ids)], dtype='u1').tobytes()
+            + np.array(ids, dtype='<u2').tobytes())
+    data = data.ljust(0x196, b'\x00') + records.tobytes()
+
+    with open(path, 'wb') as f:
+        f.write(MPR_MAGIC.ljust(48, b' ') + b'\x00' * 4 + module('VMP Set', b'settings' * 10) + module('VMP data', data))
+
+
+class TestBiologic(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def test_only_reads_needed_columns(self):
+
+        data = read_biologic('test_trajectories/cyclic_voltammetry/biologic3.txt')
+        compare = (pd
+                   .read_table('test_trajectories/cyclic_voltammetry/biologic3.txt', sep='\t')
+                   .rename({'Ewe/V': 'potential', '<I>/mA': 'current', 'time/s': 'time'}, axis=1)
+                   .filter(['potential', 'current', 'time'])
+                   )
+        pd.testing.assert_frame_equal(data, compare)
+
+    def test_mpt_header_and_decimal_commas(self):
+
+        lines = ['EC-Lab ASCII FILE', 'Nb header lines : 5', '', 'Cyclic Voltammetry',
+                 'mode\tox/red\ttime/s\tcontrol/V\tEwe/V\tI/mA\tcycle number\t',
+                 '2\t1\t0,5\t0,1\t0,25\t-1,5E-003\t1', '2\t1\t1,5\t0,2\t0,35\t2,5E-003\t1']
+        path = os.path.join(self.directory, 'cv.mpt')
+        with open(path, 'w', encoding='latin-1') as f:
+            f.write('\r\n'.join(lines) + '\r\n')
+
+        data = read_biologic(path)
+        self.assertTrue(data.columns.to_list() == ['potential', 'current', 'time'])
+        np.testing.assert_allclose(data.to_numpy(), [[0.25, -1.5e-3, 0.5], [0.35, 2.5e-3, 1.5]])
+
+    def test_missing_column(self):
+
+        with self.assertRaises(ValueError):
+            read_biologic_text(io.StringIO('Ewe/V\ttime/s\n0.1\t0\n'))
+
+    def test_mpr(self):
+        """
+        testing that both module header versions of .mpr files are read straight into floats
+        """
+        time = np.linspace(0, 100, 1000)
+        potential = np.abs((time % 20) - 10) / 10
+        current = np.cos(time / 3)
+        columns = {4: ('<f8', time), 6: ('<f4', potential), 8: ('<f4', current), 24: ('<f8', np.ones(1000))}
+
+        for new_header in [False, True]:
+            path = os.path.join(self.directory, f'cv_{new_header}.mpr')
+            write_mpr(path, columns, new_header)
+            data = read_biologic(path)
+            self.assertTrue(data.columns.to_list() == ['potential', 'current', 'time'])
+            np.testing.assert_allclose(data['time'], time)
+            np.testing.assert_allclose(data['potential'], potential.astype(np.float32))
+            np.testing.assert_allclose(data['current'], current.astype(np.float32))
+
+        cv = CyclicVoltammogram.from_biologic(path=path)
+        self.assertTrue(cv.max_cycle == 5)
+
+    def test_not_mpr(self):
+
+        path = os.path.join(self.directory, 'wrong.mpr')
+        with open(path, 'wb') as f:
+            f.write(b'not an mpr file')
+        with self.assertRaises(ValueError):
+            read_biologic(path)
+
+    def test_mpr_from_ec_lab(self):
+        """
+        testing a .mpr file saved by EC-Lab, which has a version 0 data module with the column ids as big endian shorts.
+        The values are the same as those read by galvani
+        """
+        data = read_biologic('test_trajectories/cyclic_voltammetry/navani_00_test_02_MB_C01.mpr')
+        self.assertTrue(data.columns.to_list() == ['potential', 'current', 'time'])
+        self.assertEqual(data.shape, (11, 3))
+        np.testing.assert_allclose(data.iloc[[0, 5, 10]].to_numpy(),
+                                   [[-1.6501721143722534, -0.05671815946698189, 6.165999844233738],
+                                    [-1.650156855583191, -0.048719920217990875, 11.165999717923114],
+                                    [-1.650145411491394, -0.04496502876281738, 16.165799591617542]], rtol=1e-12)
+        np.testing.assert_allclose(np.diff(data['time']), 1, atol=1e-3)
+
+    def test_tail(self):
+        """
+        testing that a file being written is read a complete row at a time, numbered on from the rows before
+        """
+        lines = ['EC-Lab ASCII FILE', 'Nb header lines : 5', '', 'Cyclic Voltammetry',
+                 'mode\tox/red\ttime/s\tcontrol/V\tEwe/V\tI/mA\tcycle number\t',
+                 '2\t1\t0,5\t0,1\t0,25\t-1,5E-003\t1', '2\t1\t1,5\t0,2\t0,35\t2,5E-003\t1',
+                 '2\t1\t2,5\t0,3\t0,45\t3,5E-003\t1']
+        contents = '\r\n'.join(lines) + '\r\n'
+        path = os.path.join(self.directory, 'live.mpt')
+        tail = BiologicTail(path)
+        reads = []
+
+        for end in [30, contents.index('0,25') + 3, contents.index('0,45'), len(contents)]:
+            with open(path, 'w', encoding='latin-1', newline='') as f:
+                f.write(contents[:end])
+            reads.append(tail.read())
+
+        self.assertTrue([len(r) for r in reads] == [0, 0, 2, 1])
+        self.assertTrue(reads[3].index.to_list() == [2])
+        pd.testing.assert_frame_equal(pd.concat(reads[2:]), read_biologic(path))
@@ -1,6 +1,7 @@
 import unittest
+import numpy as np
 import pandas as pd
-from Materials_Data_Analytics.core.coordinate_transformer import CoordinateTransformer
+from Materials_Data_Analytics.core.coordinate_transformer import CoordinateTransformer, AffineTransform
 
 
 class TestCoordinateTransformer(unittest.TestCase):
@@ -22,3 +23,83 @@ class TestCoordinateTransformer(unittest.TestCase):
 
         self.assertTrue(type(rot_data) == pd.DataFrame)
         pd.testing.assert_frame_equal(rot_data, correct_data, atol=0.001)
+
+    def test_rotate_xyz(self):
+        """
+        testing that one rotation around all three axes gives the same coordinates as the original implementation
+        """
+        data = self.data.assign(z=[0.5, -1.0, 0.25, 2.0])
+        rot_data = CoordinateTransformer(data).rotate(10, 20, 30).data
+
+        correct_data = pd.DataFrame({
+            'x': [-1.687, -2.309, -2.860, -3.104],
+            'y': [1.811, 2.863, 1.030, 1.526],
+            'z': [1.195, -0.192, 1.420, 3.401]
+        })
+
+        pd.testing.assert_frame_equal(rot_data, correct_data, atol=0.001)
+
+    def test_input_is_not_changed(self):
+        data = self.data.copy()
+        CoordinateTransformer(data).rotate(theta_z=30)
+        pd.testing.assert_frame_equal(data, self.data)
+
+    def test_in_place(self):
+        data = self.data.copy()
+        transformer = CoordinateTransformer(data, in_place=True).translate(1, 2, 3)
+        self.assertTrue(transformer.data is data)
+        np.testing.assert_allclose(data['x'], self.data['x'] + 1)
+        coordinates = self.data.to_numpy(dtype=float)
+        CoordinateTransformer(coordinates, in_place=True).rotate(theta_x=82).flush()
+        np.testing.assert_allclose(coordinates, CoordinateTransformer(self.data).rotate(theta_x=82).data.to_numpy())
+
+    def test_chained_rotations(self):
+        rot_data = CoordinateTransformer(self.data).rotate(theta_x=41).rotate(theta_x=41).data
+        pd.testing.assert_frame_equal(rot_data, CoordinateTransformer(self.data).rotate(theta_x=82).data, atol=1e-6)
+
+    def test_centre(self):
+        centred = CoordinateTransformer(self.data).centre().data
+        np.testing.assert_allclose(centred.mean().to_numpy(), 0, atol=1e-12)
+
+    def test_align_trajectory(self):
+        rng = np.random.default_rng(0)
+        reference = rng.normal(size=(20, 3))
+        frames = np.stack([CoordinateTransformer(reference).rotate(a, 2 * a, -a).translate(a, 0, 1).data
+                           for a in [10, 75, 160]])
+        aligned = CoordinateTransformer(frames).align(reference).data
+        self.assertEqual(aligned.shape, (3, 20, 3))
+        np.testing.assert_allclose(aligned, np.stack([reference] * 3), atol=1e-9)
+
+    def test_affine_transform(self):
+        matrix = np.eye(4)
+        matrix[:3, :3] = CoordinateTransformer.get_rotation_matrix(theta_z=30)
+        matrix[:3, 3] = [1, 0, -1]
+        transformed = CoordinateTransformer(self.data).transform(matrix).data
+        compare = CoordinateTransformer(self.data).rotate(theta_z=30).translate(1, 0, -1).data
+        pd.testing.assert_frame_equal(transformed, compare)
+
+    def test_transforms_are_applied_on_access(self):
+        transformer = CoordinateTransformer(self.data).rotate(theta_x=20).translate(1, 2, 3).centre()
+        pd.testing.assert_frame_equal(transformer._data, self.data)
+        np.testing.assert_allclose(transformer.data.mean().to_numpy(), 0, atol=1e-12)
+        self.assertTrue(transformer._pending.is_identity)
+
+    def test_invert(self):
+        transformer = CoordinateTransformer(self.data).rotate(10, 20, 30).translate(1, 2, 3)
+        transformer.data
+        pd.testing.assert_frame_equal(transformer.invert().data, self.data, check_dtype=False, atol=1e-12)
+
+    def test_serialise_transform(self):
+        transformer = CoordinateTransformer(self.data).rotate(10, 20, 30).translate(1, 2, 3)
+        transform = AffineTransform.from_dict(transformer.get_transform().to_dict())
+        other = CoordinateTransformer(self.data).transform(transform).data
+        pd.testing.assert_frame_equal(other, transformer.data)
+
+    def test_one_fused_matrix_per_frame(self):
+        rng = np.random.default_rng(1)
+        frames = rng.normal(size=(4, 10, 3))
+        transformer = CoordinateTransformer(frames).rotate(theta_z=45).centre().translate(0, 0, 1)
+        self.assertEqual(transformer._pending.matrix.shape, (4, 4, 4))
+        compare = np.stack([CoordinateTransformer(f).rotate(theta_z=45).centre().translate(0, 0, 1).data
+                            for f in frames])
+        np.testing.assert_allclose(transformer.data, compare, atol=1e-12)
@@ -1,6 +1,12 @@
-from Materials_Data_Analytics.experiment_modelling.cyclic_voltammetry import CyclicVoltammogram
+from Materials_Data_Analytics.experiment_modelling.cyclic_voltammetry import CyclicVoltammogram, get_batch_charges
+from Materials_Data_Analytics.experiment_modelling.biologic import read_biologic
 import unittest
+import tempfile
+import shutil
+import os
 import pandas as pd
+import numpy as np
+import scipy.integrate as integrate
 from Materials_Data_Analytics.materials.electrolytes import Electrolyte
 from Materials_Data_Analytics.materials.ions import Cation, Anion  
 from Materials_Data_Analytics.materials.solvents import Solvent
@@ -287,3 +293,265 @@ class TestCyclicVoltammetry(unittest.TestCase):
         cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic5.txt')
         data = cv.get_charge_passed(average_segments = True)
         self.assertTrue(type(data) == pd.DataFrame)
+
+    def test_directions_smooth_single_points(self):
+
+        potential = np.array([0, 1, 2, 1, 2, 1, 2, 3, 3, 2, 1, 0])
+        oxidation = CyclicVoltammogram._get_directions(potential)
+        self.assertTrue(oxidation.tolist() == [True] * 9 + [False] * 3)
+        self.assertTrue(CyclicVoltammogram._get_segments(oxidation).tolist() == [0] * 9 + [1] * 3)
+        self.assertTrue(CyclicVoltammogram._get_cycles(np.array([0, 0, 1, 2, 2, 3])).tolist() == [0, 0, 1, 1, 1, 2])
+
+    def test_wrangled_segments(self):
+
+        time = np.linspace(0, 40, 4001)
+        potential = np.abs((time % 10) - 5)
+        current = np.sin(time)
+        data = CyclicVoltammogram(potential=potential, current=current, time=time).data
+
+        # every segment starts on the last point of the one before it, and the roots are added at zero current
+        starts = data.query('segment > 0').groupby('segment').head(1).reset_index(drop=True)
+        ends = data.query('segment < segment.max()').groupby('segment').tail(1).reset_index(drop=True)
+        pd.testing.assert_frame_equal(starts[['time', 'potential', 'current']], ends[['time', 'potential', 'current']])
+        self.assertTrue(data['time'].is_monotonic_increasing)
+        roots = data.query('current == 0')['time'].drop_duplicates() + time[6]
+        np.testing.assert_allclose(roots, np.pi * np.arange(1, 13), atol=1e-4)
+        self.assertTrue(data['cycle'].max() == 4)
+
+    def test_batch_charges(self):
+
+        directory = tempfile.mkdtemp()
+        for i in [1, 2]:
+            shutil.copy(f'test_trajectories/cyclic_voltammetry/biologic{i}.txt', directory)
+        with open(os.path.join(directory, 'biologic_broken.txt'), 'w') as f:
+            f.write('not a biologic file')
+
+        progress = []
+        batch = get_batch_charges(os.path.join(directory, 'biologic*.txt'), metadata={'instrument': 'Biologic'},
+                                  n_jobs=2, callback=lambda path, done, total, error: progress.append((done, total)))
+        shutil.rmtree(directory)
+
+        self.assertTrue(batch.columns[:2].to_list() == ['file', 'instrument'])
+        self.assertTrue(batch.columns[-1] == 'error')
+        self.assertTrue(sorted(progress) == [(1, 3), (2, 3), (3, 3)])
+        broken = batch[batch['file'].str.endswith('broken.txt')]
+        self.assertTrue(len(broken) == 1 and broken['error'].iloc[0] is not None)
+
+        charges = batch[batch['file'].str.endswith('biologic1.txt')].reset_index(drop=True)
+        compare = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic1.txt').get_charge_passed()
+        pd.testing.assert_frame_equal(charges[compare.columns], compare, check_dtype=False)
+        self.assertTrue(charges['error'].isna().all())
+
+    def test_batch_maximum_charges(self):
+
+        paths = [f'test_trajectories/cyclic_voltammetry/biologic{i}.txt' for i in [1, 3]]
+        batch = get_batch_charges(paths, analysis='maximum_charges_passed', average=True)
+        self.assertTrue(batch['file'].drop_duplicates().to_list() == paths)
+        self.assertTrue(set(batch['type']) == {'anodic_charge', 'cathodic_charge'})
+
+    def test_group_integrals(self):
+
+        rng = np.random.default_rng(0)
+        groups = np.repeat(np.arange(0, 50), rng.integers(1, 10, 50))
+        x = np.cumsum(rng.uniform(0.1, 1, len(groups)))
+        y = rng.normal(size=len(groups))
+        simpson = CyclicVoltammogram._get_group_integrals(x, y, groups, 50)
+        trapezoid = CyclicVoltammogram._get_group_integrals(x, y, groups, 50, method='trapezoid')
+        for g in range(0, 50):
+            self.assertAlmostEqual(simpson[g], integrate.simpson(y[groups == g], x=x[groups == g]), places=10)
+            self.assertAlmostEqual(trapezoid[g], np.trapz(y[groups == g], x=x[groups == g]), places=10)
+
+    def test_get_charge_passed_trapezoid(self):
+
+        cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic1.txt')
+        simpson = cv.get_charge_passed()
+        trapezoid = cv.get_charge_passed(method='trapezoid')
+        self.assertTrue(trapezoid.columns.to_list() == simpson.columns.to_list())
+        np.testing.assert_allclose(trapezoid['anodic_charge'], simpson['anodic_charge'], rtol=0.01, atol=1e-7)
+
+    def test_get_maximum_charges_passed_trapezoid(self):
+
+        cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic1.txt')
+        simpson = cv.get_maximum_charges_passed()
+        trapezoid = cv.get_maximum_charges_passed(method='trapezoid')
+        self.assertTrue(trapezoid['section'].to_list() == simpson['section'].to_list())
+        self.assertTrue(trapezoid['type'].to_list() == simpson['type'].to_list())
+        np.testing.assert_allclose(trapezoid['total_charge'], simpson['total_charge'], rtol=0.01)
+
+        # each section is integrated between neighbouring zero crossings
+        data = cv.data.query('segment != 0 and segment != @cv._max_segment')
+        section = simpson.iloc[2]
+        points = data.query('time >= @section.t_min and time <= @section.t_max').drop_duplicates(['time'])
+        self.assertAlmostEqual(trapezoid['total_charge'].iloc[2], abs(np.trapz(points['current'], x=points['time'])),
+                               places=10)
+
+    def test_maximum_charges_after_drop_cycles(self):
+
+        cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic1.txt')
+        before = cv.get_maximum_charges_passed()
+        after = cv.drop_cycles(drop=[0, 1]).get_maximum_charges_passed()
+        self.assertTrue(len(after) < len(before))
+        self.assertTrue(after['t_min'].min() >= cv.data['time'].min())
+        with self.assertRaises(ValueError):
+            cv.get_maximum_charge_integration_plot(section=len(after) + 1)
+
+    def test_cached_results(self):
+
+        cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic1.txt')
+        charges = cv.get_charge_passed()
+        charges['total_charge'] = 0
+        pd.testing.assert_frame_equal(cv.get_charge_passed(average_segments=False), cv.get_charge_passed(False))
+        self.assertTrue((cv.get_charge_passed()['total_charge'] != 0).all())
+        self.assertTrue(len([k for k in cv._cache.keys() if k[0] == 'get_charge_passed']) == 1)
+
+        cv.get_maximum_charge_integration_plot(section=2)
+        cv.get_maximum_charge_integration_plot(section=3)
+        self.assertTrue(len([k for k in cv._cache.keys() if k[0] == '_get_sections']) == 1)
+
+    def test_cache_cleared_by_changes(self):
+
+        cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic5.txt')
+        n_segments = len(cv.get_charge_passed())
+        self.assertTrue(len(cv.drop_cycles(drop=1).get_charge_passed()) == n_segments - 2)
+        self.assertTrue(1 not in cv.data['cycle'].to_list())
+
+        n_points = cv.get_maximum_charges_passed().shape[0]
+        cv.downsample(100)
+        self.assertTrue(len(cv._cache) == 0)
+        self.assertTrue(cv.get_maximum_charges_passed().shape[0] == n_points)
+
+    def test_downsample_minmax(self):
+
+        cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic5.txt')
+        data = cv.data
+        down = cv.downsample(20, method='minmax').data
+        self.assertTrue(len(down) < len(data) / 10)
+        self.assertTrue(down.index.isin(data.index).all())
+
+        # the peaks, the segment end points and the current roots are all kept
+        pd.testing.assert_frame_equal(down.groupby('segment')['current'].agg(['min', 'max']),
+                                      data.groupby('segment')['current'].agg(['min', 'max']))
+        pd.testing.assert_frame_equal(down.groupby('segment')['time'].agg(['min', 'max']),
+                                      data.groupby('segment')['time'].agg(['min', 'max']))
+        self.assertTrue((down['current'] == 0).sum() == (data['current'] == 0).sum())
+        self.assertTrue(len(cv.get_maximum_charges_passed()) > 0)
+
+    def test_downsample_lttb(self):
+
+        time = np.arange(0, 1000, dtype=float)
+        current = np.zeros(1000) + 0.1
+        current[[123, 456]] = [5, -5]
+        segment = np.repeat([0, 1], 500)
+        positions = np.unique(CyclicVoltammogram._get_lttb_positions(time, current, segment, 10))
+        self.assertTrue(len(positions) == 20)
+        self.assertTrue(set([0, 123, 456, 499, 500, 999]).issubset(positions))
+
+        cv = CyclicVoltammogram.from_biologic(path='test_trajectories/cyclic_voltammetry/biologic5.txt')
+        n_segments = cv.data['segment'].nunique()
+        down = cv.downsample(50, method='lttb').data
+        self.assertTrue(down['segment'].nunique() == n_segments)
+        self.assertTrue(len(down.query('current != 0')) <= 50 * n_segments)
+
+        with self.assertRaises(ValueError):
+            cv.downsample(50, method='median')
+
+    def test_append(self):
+        """
+        testing that appending points a few at a time gives the same data and charges as making the object from all
+        the points at once
+        """
+        data = read_biologic('test_trajectories/cyclic_voltammetry/biologic5.txt')
+        full = CyclicVoltammogram.from_biologic(data=data)
+        cv = CyclicVoltammogram.from_biologic(data=data.iloc[:100])
+        cv.get_charge_passed()
+
+        for start in range(100, len(data), 997):
+            rows = data.iloc[start:start + 997]
+            cv.append(potential=rows['potential'], current=rows['current'], time=rows['time'])
+            partial = CyclicVoltammogram.from_biologic(data=data.iloc[:start + 997])
+            pd.testing.assert_frame_equal(cv.get_charge_passed(), partial.get_charge_passed())
+
+        pd.testing.assert_frame_equal(cv.data, full.data)
+        pd.testing.assert_frame_equal(cv.get_charge_passed(average_segments=True), full.get_charge_passed(average_segments=True))
+        pd.testing.assert_frame_equal(cv.get_maximum_charges_passed(), full.get_maximum_charges_passed())
+        self.assertTrue(cv.max_cycle == full.max_cycle and cv.steps_per_cycle == full.steps_per_cycle)
+
+        with self.assertRaises(ValueError):
+            cv.append(potential=[0.1], current=[0.1], time=[0])
+        with self.assertRaises(ValueError):
+            cv.downsample(50).append(potential=[0.1], current=[0.1], time=[1e6])
+        with self.assertRaises(ValueError):
+            full.update()
+
+    def test_append_zero_currents(self):
+        """
+        testing that appending points with currents that are exactly zero gives the same data and charges as making the
+        object from all the points at once, as the zero current points give rows with the same time
+        """
+        time = np.arange(600) * 0.1
+        potential = np.abs(((time / 10) % 2) - 1) - 0.5
+        current = np.sin(time / 3)
+        current[::50] = 0
+
+        for step in [1, 7]:
+            cv = CyclicVoltammogram(potential=potential[:20], current=current[:20], time=time[:20])
+            cv.get_charge_passed()
+            for start in range(20, len(time), step):
+                end = start + step
+                cv.append(potential=potential[start:end], current=current[start:end], time=time[start:end])
+                cv.get_charge_passed()
+
+            fresh = CyclicVoltammogram(potential=potential, current=current, time=time)
+            pd.testing.assert_frame_equal(cv.data, fresh.data)
+            pd.testing.assert_frame_equal(cv.get_charge_passed(), fresh.get_charge_passed())
+
+    def test_from_biologic_live(self):
+
+        with open('test_trajectories/cyclic_voltammetry/biologic1.txt', 'r', encoding='latin-1', newline='') as f:
+            contents = f.read().rstrip('\r\n') + '\r\n'
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'live.txt')
+        try:
+            with open(path, 'w', encoding='latin-1', newline='') as f:
+                f.write(contents[:5000])
+            cv = CyclicVoltammogram.from_biologic_live(path)
+
+            for end in [20003, 51234, len(contents)]:
+                with open(path, 'w', encoding='latin-1', newline='') as f:
+                    f.write(contents[:end])
+                cv.update()
+
+            full = CyclicVoltammogram.from_biologic(path)
+            pd.testing.assert_frame_equal(cv.data, full.data)
+            pd.testing.assert_frame_equal(cv.get_charge_passed(), full.get_charge_passed())
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_from_biologic_live_just_started(self):
+
+        with open('test_trajectories/cyclic_voltammetry/biologic1.txt', 'r', encoding='latin-1', newline='') as f:
+            contents = f.read().rstrip('\r\n') + '\r\n'
+        lines = contents.splitlines(keepends=True)
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'live.txt')
+        try:
+            # a header only file, and a file with three rows that are all before the first index
+            for n_lines in [1, 4]:
+                with open(path, 'w', encoding='latin-1', newline='') as f:
+                    f.write(''.join(lines[:n_lines]))
+                cv = CyclicVoltammogram.from_biologic_live(path)
+                self.assertEqual(len(cv.data), 0)
+                self.assertTrue({'potential', 'current', 'time', 'cycle', 'direction', 'segment'} <= set(cv.data.columns))
+
+                for end in [8, 9, 500, len(lines)]:
+                    with open(path, 'w', encoding='latin-1', newline='') as f:
+                        f.write(''.join(lines[:end]))
+                    cv.update()
+
+                full = CyclicVoltammogram.from_biologic(path)
+                pd.testing.assert_frame_equal(cv.data, full.data)
+                pd.testing.assert_frame_equal(cv.get_charge_passed(), full.get_charge_passed())
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
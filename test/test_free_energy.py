@@ -1,9 +1,13 @@
 import unittest
 import tracemalloc
+import tempfile
+import shutil
+from unittest import mock
 import os
 import plotly.graph_objects as go
 from glob import glob
 import pandas as pd
+import numpy as np
 import plumed as pl
 import matplotlib.pyplot as plt
 from Materials_Data_Analytics.metadynamics.free_energy import FreeEnergySpace, MetaTrajectory, FreeEnergyLine, FreeEnergySurface
@@ -36,6 +40,31 @@ class TestMetaTrajectory(unittest.TestCase):
         self.assertEqual(cv_traj.cvs, ['D1', 'CM1'])
         self.assertTrue(cv_traj._opes is True)
 
+    def test_colvar_read_not_in_memory(self):
+        """
+        checking that a streamed MetaTrajectory gets the same attributes and data as one read into memory
+        """
+        file = "./test_trajectories/ndi_na_binding/COLVAR_REWEIGHT.0"
+        cv_traj = MetaTrajectory(file, in_memory=False)
+        self.assertTrue(cv_traj._data is None)
+        self.assertEqual(cv_traj.walker, 0)
+        self.assertEqual(cv_traj.cvs, ['D1', 'CM1', 'CM2', 'CM3'])
+        self.assertTrue(cv_traj.opes is False)
+        pd.testing.assert_frame_equal(cv_traj.get_data(), MetaTrajectory(file).get_data())
+
+    def test_iter_data(self):
+        """
+        checking that the chunks only have the requested cvs and the bias columns, and that they cover the trajectory
+        """
+        file = "./test_trajectories/ndi_na_binding/COLVAR_REWEIGHT.0"
+        chunks = [c for c in MetaTrajectory(file, in_memory=False).iter_data(['CM1'], chunk_size=20)]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0].columns.to_list(), ['time', 'CM1', 'bias', 'reweight_bias', 'reweight_factor',
+                                                       'weight'])
+        self.assertEqual(sum([c.shape[0] for c in chunks]), MetaTrajectory(file)._data.shape[0])
+        with self.assertRaises(ValueError):
+            next(MetaTrajectory(file, in_memory=False).iter_data(['CM9']))
+
 
 class TestFreeEnergyLine(unittest.TestCase):
 
@@ -190,6 +219,24 @@ class TestFreeEnergyLine(unittest.TestCase):
         figure.add_trace(trace)
         # figure.show()
 
+    def test_get_change_over_time_for_many_regions(self):
+        """
+        testing that the energy differences for a list of region pairs match the single pair function
+        :return:
+        """
+        all_fes_files = glob("./test_trajectories/ndi_na_binding/FES_CM1/FES*dat")
+        line = FreeEnergyLine.from_plumed(all_fes_files)
+        change_data = line.get_time_differences({'points': (1, 3), 'regions': ((0.8, 1.2), (2.8, 3.2)),
+                                                 'one_point': (1.0, None)})
+        self.assertEqual(change_data.columns.to_list(), ['time_stamp', 'points', 'regions', 'one_point'])
+        self.assertEqual(change_data.shape[0], len(all_fes_files))
+        compare = line.get_time_difference(region_1=(0.8, 1.2), region_2=(2.8, 3.2))
+        pd.testing.assert_series_equal(change_data['regions'], compare['energy_difference'], check_names=False)
+        compare = line.get_time_difference(1, 3)
+        pd.testing.assert_series_equal(change_data['points'], compare['energy_difference'], check_names=False)
+        line.set_datum({'CM1': 1.0})
+        self.assertTrue((line.get_time_differences([(1.0, None)]).iloc[:, 1] == 0).all())
+
     def test_set_datum_twice(self):
         """
         testing that the normalise function works with a single value
@@ -282,6 +329,17 @@ class TestFreeEnergySurface(unittest.TestCase):
         # figure.show()
         self.assertTrue(type(data) == pd.DataFrame)
 
+    def test_surface_reweighting_streamed(self):
+
+        space = FreeEnergySpace.from_standard_directory("./test_trajectories/ndi_na_binding/", in_memory=False)
+        data = space.get_reweighted_surface(cvs=["CM2", "D1"], bins=[4, 10], chunk_size=10).get_data()
+        compare = (FreeEnergySpace
+                   .from_standard_directory("./test_trajectories/ndi_na_binding/")
+                   .get_reweighted_surface(cvs=["CM2", "D1"], bins=[4, 10])
+                   .get_data()
+                   )
+        pd.testing.assert_frame_equal(data, compare)
+
     def test_surface_reweight_with_symmetry(self):
 
         space = FreeEnergySpace.from_standard_directory("./test_trajectories/ndi_na_binding/")
@@ -328,6 +386,39 @@ class TestFreeEnergySurface(unittest.TestCase):
         # plt.show()
         self.assertTrue(type(force) == pd.DataFrame)
 
+    def test_dense_grid(self):
+
+        surface = FreeEnergySurface.from_plumed("./test_trajectories/ndi_na_binding/FES_CM1_D1/FES")
+        x, y, fields = surface._get_grid()
+        self.assertEqual(fields['energy'].shape, (len(x), len(y)))
+        self.assertEqual(fields['energy'].shape[0] * fields['energy'].shape[1], surface._data.shape[0])
+
+    def test_mean_force_is_kept_until_the_surface_changes(self):
+
+        surface = FreeEnergySurface.from_plumed("./test_trajectories/ndi_na_binding/FES_CM1_D1/FES")
+        force = surface.get_mean_force()
+        self.assertTrue(surface._get_force_grid() is surface._get_force_grid())
+        force['CM1_grad'] = 0
+        pd.testing.assert_series_equal(surface.get_mean_force()['D1_grad'], force['D1_grad'])
+        self.assertFalse((surface.get_mean_force()['CM1_grad'] == 0).all())
+        surface._data = surface._data.assign(energy=lambda x: x['energy'] * 2)
+        self.assertTrue('force' not in surface._derived)
+        np.testing.assert_allclose(surface.get_mean_force()['D1_grad'], force['D1_grad'] * 2)
+
+    def test_symmetric_surface_long_data_is_made_from_grid(self):
+
+        space = FreeEnergySpace.from_standard_directory("./test_trajectories/ndi_na_binding/")
+        surface = space.get_reweighted_surface(cvs=["CM2", "CM3"], bins=[-0.5, 0.5, 1.5, 2.5, 3.5])
+        surface.set_as_symmetric('y=x')
+        self.assertTrue(surface._long_data is None)
+        energy = surface._get_grid()[2]['energy']
+        np.testing.assert_array_equal(energy, energy.T)
+        data = surface.get_data()
+        self.assertEqual(data.columns.to_list(), ['CM2', 'CM3', 'energy', 'symmetry_error'])
+        self.assertEqual(data.shape[0], 16)
+        surface.set_datum({'CM2': 0, 'CM3': 0})
+        self.assertEqual(surface._get_grid()[2]['energy'][0, 0], 0)
+
 
 class TestFreeEnergySpace(unittest.TestCase):
 
@@ -658,6 +749,71 @@ class TestFreeEnergySpace(unittest.TestCase):
         ).trajectories[0].get_data(with_metadata=True)
         self.assertTrue('unit' in shape.columns)
 
+    def test_reweighted_line_streamed(self):
+        """
+        Function to test that streaming the trajectories in chunks gives the same line as reading them into memory
+        :return:
+        """
+        here_dir = "./test_trajectories/ndi_na_binding/"
+        space = FreeEnergySpace.from_standard_directory(here_dir, in_memory=False)
+        fes = space.get_reweighted_line('D1', bins=10, chunk_size=10).set_datum({'D1': 0})
+        compare = self.landscape.get_reweighted_line('D1', bins=10).set_datum({'D1': 0})
+        self.assertTrue(space.trajectories[0].in_memory is False)
+        pd.testing.assert_frame_equal(fes._data, compare._data)
+
+    def test_reweighted_line_streamed_with_conditions(self):
+        """
+        Function to test that streaming the trajectories works with conditions on other cvs
+        :return:
+        """
+        fes = self.landscape.get_reweighted_line('D1', bins=[6, 6.4, 7], conditions=['D1 < 7', 'CM1 < 5'],
+                                                 chunk_size=10)
+        compare = self.landscape.get_reweighted_line('D1', bins=[6, 6.4, 7], conditions=['D1 < 7', 'CM1 < 5'])
+        pd.testing.assert_frame_equal(fes._data, compare._data)
+
+    def test_reweighted_line_with_non_cv_conditions(self):
+        """
+        Function to test that conditions can use columns that aren't cvs, both in memory and streamed
+        :return:
+        """
+        data = self.traj0_opes.get_data().query('nker > 10 and neff > 1.01')
+        compare = FreeEnergyLine(FreeEnergySpace._reweight_traj_data(data, 'D1', bins=10)
+                                 .filter(['D1', 'energy', 'population']))
+        for chunk_size in [None, 10]:
+            fes = self.landscape_opes.get_reweighted_line('D1', bins=10, conditions=['nker > 10', 'neff > 1.01'],
+                                                          chunk_size=chunk_size)
+            self.assertEqual(fes._data.shape, (10, 3))
+            pd.testing.assert_frame_equal(fes._data, compare._data)
+
+    def test_reweighted_line_cumulative_timestamps(self):
+        """
+        Function to test that the one pass time stamps are the same as histogramming the data up to each time stamp
+        :return:
+        """
+        bins = [6, 6.4, 7, 7.5, 8]
+        fes = self.landscape.get_reweighted_line('D1', bins=bins, n_timestamps=5, conditions='CM1 < 2', cumulative=True)
+        compare = self.landscape.get_reweighted_line('D1', bins=bins, n_timestamps=5, conditions='CM1 < 2')
+        streamed = self.landscape.get_reweighted_line('D1', bins=bins, n_timestamps=5, conditions='CM1 < 2',
+                                                      chunk_size=10, cumulative=True)
+        self.assertEqual(list(fes._time_data.keys()), [1, 2, 3, 4, 5])
+        for t in compare._time_data:
+            pd.testing.assert_frame_equal(fes._time_data[t], compare._time_data[t])
+            pd.testing.assert_frame_equal(streamed._time_data[t], compare._time_data[t])
+
+        with self.assertRaises(ValueError):
+            self.landscape.get_reweighted_line('D1', bins=bins, n_timestamps=5, chunk_size=10)
+
+    def test_reweighted_line_cumulative_timestamps_passes(self):
+        """
+        Function to test that with a number of bins the last time is found in the same pass as the range of the cv, so
+        each trajectory is only read twice
+        :return:
+        """
+        with mock.patch.object(MetaTrajectory, 'iter_data', autospec=True, side_effect=MetaTrajectory.iter_data) as m:
+            fes = self.landscape.get_reweighted_line('D1', bins=10, n_timestamps=5, chunk_size=10, cumulative=True)
+        self.assertEqual(m.call_count, 2 * len(self.landscape.trajectories))
+        self.assertEqual(list(fes._time_data.keys()), [1, 2, 3, 4, 5])
+
     def test_one_walker_reweighted_with_walker_error(self):
         """
         Function to test that it returns error when only one walker is present.
@@ -674,6 +830,42 @@ class TestFreeEnergySpace(unittest.TestCase):
         fes = self.landscape.get_reweighted_line_with_walker_error("D1", bins=[6, 6.4, 7]).set_datum({"D1": 0})
         self.assertEqual(fes._data[fes._data["D1"] == 6.2]["energy"].values[0], 0)
 
+    def test_reweighted_with_walker_error_parallel(self):
+        """
+        Function to test that getting the walker histograms in a process pool gives the same line
+        :return:
+        """
+        fes = self.landscape.get_reweighted_line_with_walker_error("D1", bins=[6, 6.4, 7], conditions="CM1 < 2",
+                                                                   n_jobs=2)
+        compare = self.landscape.get_reweighted_line_with_walker_error("D1", bins=[6, 6.4, 7], conditions="CM1 < 2")
+        pd.testing.assert_frame_equal(fes._data, compare._data)
+
+        # with a number of bins the range comes from streaming the walkers, not from their data in this process
+        for adaptive_bins in [False, True]:
+            compare = self.landscape.get_reweighted_line_with_walker_error("D1", bins=10, adaptive_bins=adaptive_bins)
+            with mock.patch.object(MetaTrajectory, 'get_data', side_effect=AssertionError):
+                fes = self.landscape.get_reweighted_line_with_walker_error("D1", bins=10, adaptive_bins=adaptive_bins,
+                                                                           n_jobs=2)
+            pd.testing.assert_frame_equal(fes._data, compare._data)
+
+    def test_reweighted_with_walker_error_parallel_non_cv_conditions(self):
+        """
+        Function to test that the walkers streamed in a process pool can use conditions on columns that aren't cvs
+        :return:
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            landscape = FreeEnergySpace()
+            for w in [0, 1]:
+                file = os.path.join(directory, f"COLVAR.{w}")
+                shutil.copy("./test_trajectories/ndi_single_opes/COLVAR.0", file)
+                landscape.add_metad_trajectory(MetaTrajectory(file))
+            fes = landscape.get_reweighted_line_with_walker_error("D1", bins=10, conditions="neff > 1.01", n_jobs=2)
+            compare = landscape.get_reweighted_line_with_walker_error("D1", bins=10, conditions="neff > 1.01")
+            pd.testing.assert_frame_equal(fes._data, compare._data)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
     def test_two_bin_reweighted_with_walker_one_condition(self):
         """
         Function to test that it reweights correctly with errors when using two bins and one condition.
@@ -735,6 +927,22 @@ class TestFreeEnergySpaceBiasExchange(unittest.TestCase):
         self.assertTrue(self.landscape.opes is False)
         self.assertTrue(self.landscape.temperature == 298)
 
+    def test_parallel_load(self):
+        landscape = FreeEnergySpace.from_standard_directory('./test_trajectories/ndi_bias_exchange/',
+                                                            hills_file=self.hills, n_jobs=2)
+        pd.testing.assert_frame_equal(landscape._hills, self.landscape._hills)
+        self.assertEqual(landscape.sigmas, self.landscape.sigmas)
+        self.assertEqual(list(landscape.trajectories.keys()), list(self.landscape.trajectories.keys()))
+
+    def test_mismatched_time_increments(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(self.hills[1]) as f:
+                lines = f.readlines()
+            with open(os.path.join(tmp_dir, 'HILLS.1'), 'w') as f:
+                f.writelines(lines[:-10])
+            with self.assertRaises(ValueError):
+                FreeEnergySpace([self.hills[0], os.path.join(tmp_dir, 'HILLS.1')])
+
     def test_get_hills_figures(self):
         figures = self.landscape.get_hills_figures()
         self.assertTrue(self.landscape._biasexchange is True)
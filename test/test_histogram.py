@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Materials_Data_Analytics.metadynamics.histogram import WeightedHistogram
+from Materials_Data_Analytics.metadynamics.free_energy import MetaTrajectory
+
+
+class TestWeightedHistogram(unittest.TestCase):
+
+    traj0 = MetaTrajectory("./test_trajectories/ndi_na_binding/COLVAR_REWEIGHT.0").get_data()
+    traj1 = MetaTrajectory("./test_trajectories/ndi_na_binding/COLVAR_REWEIGHT.1").get_data()
+    data = pd.concat([traj0, traj1])
+
+    def test_one_dimension_in_chunks(self):
+        """
+        testing that adding the data in chunks gives the same density as np.histogram on all the data
+        """
+        histogram = WeightedHistogram.from_bins('D1', 10, ranges=[(self.data['D1'].min(), self.data['D1'].max())])
+        for start in range(0, self.data.shape[0], 7):
+            histogram.add_data(self.data.iloc[start:start + 7])
+        compare = np.histogram(self.data['D1'], bins=10, weights=self.data['weight'], density=True)
+        np.testing.assert_allclose(histogram.get_histogram()[0], compare[0])
+        np.testing.assert_allclose(histogram.edges[0], compare[1])
+
+    def test_two_dimensions(self):
+        """
+        testing that the two dimensional counts are the same as np.histogram2d
+        """
+        bins = [-0.5, 0.5, 1.5, 2.5, 3.5]
+        histogram = WeightedHistogram.from_bins(['CM2', 'CM3'], bins).add_data(self.data)
+        compare = np.histogram2d(self.data['CM2'], self.data['CM3'], bins=bins, weights=self.data['weight'])
+        np.testing.assert_array_equal(histogram.counts, compare[0])
+
+    def test_three_dimensions(self):
+        """
+        testing that the n dimensional counts are the same as np.histogramdd
+        """
+        edges = [np.linspace(0, 8, 5), np.linspace(0, 3, 4), np.linspace(0, 3, 4)]
+        histogram = WeightedHistogram(['D1', 'CM1', 'CM2'], edges).add_data(self.data)
+        compare = np.histogramdd(self.data[['D1', 'CM1', 'CM2']].to_numpy(), bins=edges, weights=self.data['weight'])
+        np.testing.assert_array_equal(histogram.counts, compare[0])
+        data = histogram.get_data()
+        self.assertEqual(data.columns.to_list(), ['D1', 'CM1', 'CM2', 'population', 'energy'])
+        self.assertEqual(data.shape[0], 4 * 3 * 3)
+
+    def test_merge_walkers(self):
+        """
+        testing that merging the histograms of each walker is the same as one histogram of both walkers
+        """
+        bins = [6, 6.4, 7]
+        histogram_0 = WeightedHistogram.from_bins('D1', bins).add_data(self.traj0)
+        histogram_1 = WeightedHistogram.from_bins('D1', bins).add_data(self.traj1)
+        histogram = WeightedHistogram.from_bins('D1', bins).add_data(self.data)
+        np.testing.assert_allclose((histogram_0 + histogram_1).counts, histogram.counts)
+        np.testing.assert_allclose(histogram_0.merge(histogram_1).counts, histogram.counts)
+
+    def test_merge_different_edges(self):
+        """
+        testing that histograms with different bin edges can't be merged
+        """
+        histogram_0 = WeightedHistogram.from_bins('D1', [6, 6.4, 7])
+        histogram_1 = WeightedHistogram.from_bins('D1', [6, 6.5, 7])
+        with self.assertRaises(ValueError):
+            histogram_0.merge(histogram_1)
+
+    def test_get_data_population(self):
+        """
+        testing that the populations sum to one when not normalised as a density
+        """
+        histogram = WeightedHistogram.from_bins('D1', [6, 6.4, 7]).add_data(self.data)
+        data = histogram.get_data(density=False)
+        self.assertAlmostEqual(data['population'].sum(), 1)
+        self.assertTrue('energy' in data.columns)
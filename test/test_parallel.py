@@ -0,0 +1,43 @@
+import unittest
+import os
+from concurrent.futures.process import BrokenProcessPool
+from Materials_Data_Analytics.core.parallel import iter_jobs, map_jobs, get_n_workers, iter_jobs_as_completed
+
+
+def add(a, b):
+    return a + b
+
+
+def exit_on_zero(a):
+    if a == 0:
+        os._exit(1)
+    return a
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_map_jobs(self):
+        arg_list = [(i, 10 * i) for i in range(0, 6)]
+        self.assertTrue(map_jobs(add, arg_list) == [11 * i for i in range(0, 6)])
+        self.assertTrue(map_jobs(add, arg_list, n_jobs=2) == [11 * i for i in range(0, 6)])
+
+    def test_n_jobs(self):
+        self.assertTrue(get_n_workers(None) == 1)
+        self.assertTrue(get_n_workers(-1) >= 1)
+        for n_jobs in [0, -2]:
+            with self.assertRaises(ValueError):
+                list(iter_jobs(add, [(1, 2)], n_jobs))
+
+    def test_as_completed_errors(self):
+        """
+        testing that a call that raises or kills its worker process gives an error for that call instead of stopping
+        the rest
+        """
+        arg_list = [(1, 2), (None, 2), (3, 4)]
+        results = {i: (r, e) for i, r, e in iter_jobs_as_completed(add, arg_list)}
+        self.assertTrue(results[0] == (3, None) and results[2] == (7, None))
+        self.assertTrue(type(results[1][1]) == TypeError)
+
+        results = {i: (r, e) for i, r, e in iter_jobs_as_completed(exit_on_zero, [(1,), (0,), (2,)], n_jobs=2)}
+        self.assertTrue(sorted(results.keys()) == [0, 1, 2])
+        self.assertTrue(isinstance(results[1][1], BrokenProcessPool))
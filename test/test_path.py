@@ -2,7 +2,7 @@ import unittest
 import numpy as np
 import pandas as pd
 from Materials_Data_Analytics.metadynamics.path_analysis import Path
-from Materials_Data_Analytics.metadynamics.free_energy import FreeEnergySpace
+from Materials_Data_Analytics.metadynamics.free_energy import FreeEnergySpace, FreeEnergySurface
 from Materials_Data_Analytics.metadynamics.path_analysis import SurfacePath
 
 
@@ -43,3 +43,64 @@ class TestPath(unittest.TestCase):
         forces = path._get_surface_forces(index=5)
 
         self.assertTrue(type(forces) == np.ndarray)
+
+    def test_get_all_surface_forces(self):
+
+        surface = FreeEnergySurface.from_plumed("./test_trajectories/ndi_na_binding/FES_CM1_D1/FES")
+        path = SurfacePath.from_points([[0.5, 5.5], [2, 6.5], [1, 7.5]], n_steps=42, cvs=['CM1', 'D1'], shape=surface)
+        forces = path.get_surface_forces(method='nearest')
+        self.assertEqual(forces.columns.to_list(), ['CM1', 'D1', 'CM1_grad', 'D1_grad'])
+        self.assertTrue((forces.iloc[[0, -1]][['CM1_grad', 'D1_grad']] == 0).all().all())
+        for i in [1, 10, 25]:
+            np.testing.assert_array_equal(forces.loc[i, ['CM1_grad', 'D1_grad']].to_numpy(dtype=float),
+                                          path._get_surface_forces(i))
+
+    def test_interpolated_surface_forces(self):
+
+        surface = FreeEnergySurface.from_plumed("./test_trajectories/ndi_na_binding/FES_CM1_D1/FES")
+        grid_forces = surface.get_mean_force().iloc[[100, 1000, 3000]].reset_index(drop=True)
+        path = SurfacePath(grid_forces[['D1', 'CM1']], shape=surface)
+        for method in ['linear', 'cubic']:
+            forces = path.get_surface_forces(method=method, fix_ends=False)
+            np.testing.assert_allclose(forces['CM1_grad'], grid_forces['CM1_grad'])
+            np.testing.assert_allclose(forces['D1_grad'], grid_forces['D1_grad'])
+
+
+class TestMinimumFreeEnergyPath(unittest.TestCase):
+
+    x, y = np.meshgrid(np.linspace(-1.5, 1.5, 61), np.linspace(-1, 1, 41), indexing='ij')
+    data = pd.DataFrame({'x': x.ravel(), 'y': y.ravel(), 'energy': ((x**2 - 1)**2 + 2 * y**2).ravel()})
+    surface = FreeEnergySurface(data)
+    start = SurfacePath.from_points([[-1.2, 0.3], [0, 0.6], [1.1, -0.2]], n_steps=30, cvs=['x', 'y'], shape=surface)
+
+    def test_string_method(self):
+
+        path = self.start.get_minimum_free_energy_path(method='string', n_iterations=5000)
+        self.assertTrue(path.converged)
+        self.assertTrue(path._path['y'].abs().max() < 0.01)
+        self.assertAlmostEqual(path.get_barrier(), 1, places=2)
+        self.assertAlmostEqual(path.get_barrier(reverse=True), 1, places=2)
+        profile = path.get_free_energy_profile()
+        self.assertEqual(profile.columns.to_list(), ['x', 'y', 'arc_length', 'energy'])
+        np.testing.assert_allclose(np.diff(profile['arc_length']), profile['arc_length'].iloc[-1] / 30, rtol=1e-4)
+
+    def test_nudged_elastic_band(self):
+
+        path = self.start.get_minimum_free_energy_path(method='neb', n_iterations=5000)
+        self.assertTrue(path.converged)
+        self.assertTrue(path._path['y'].abs().max() < 0.01)
+        self.assertAlmostEqual(path.get_barrier(), 1, places=2)
+
+    def test_fixed_ends_and_callback(self):
+
+        changes = []
+
+        def callback(iteration, images, change):
+            changes.append(change)
+            return iteration == 10
+
+        path = self.start.get_minimum_free_energy_path(fix_ends=True, callback=callback)
+        self.assertEqual(path.n_iterations, 10)
+        self.assertFalse(path.converged)
+        self.assertEqual(len(changes), 10)
+        np.testing.assert_allclose(path._path.iloc[[0, -1]].to_numpy(), self.start._path.iloc[[0, -1]].to_numpy())
@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import shutil
+import os
+import pandas as pd
+from Materials_Data_Analytics.metadynamics import plumed_cache
+from Materials_Data_Analytics.metadynamics.plumed_cache import PlumedFileCache
+from Materials_Data_Analytics.metadynamics.free_energy import FreeEnergySpace, MetaTrajectory
+
+
+class TestPlumedFileCache(unittest.TestCase):
+
+    colvar = "./test_trajectories/ndi_na_binding/COLVAR_REWEIGHT.0"
+    col_names = MetaTrajectory._read_header(colvar)
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        plumed_cache.disable_cache()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_read_table(self):
+        """
+        testing that the cached read gives the same data as parsing the text, and that the second read is a cache hit
+        """
+        cache = PlumedFileCache(self.cache_dir)
+        self.assertTrue(cache.get(self.colvar) is None)
+        data = cache.read_table(self.colvar, self.col_names)
+        self.assertTrue(cache.get(self.colvar) is not None)
+        pd.testing.assert_frame_equal(cache.read_table(self.colvar, self.col_names), data)
+        self.assertEqual(cache.size, data.shape[0] * data.shape[1] * 8)
+
+    def test_invalidate(self):
+        """
+        testing that entries can be removed from the cache
+        """
+        cache = PlumedFileCache(self.cache_dir)
+        cache.read_table(self.colvar, self.col_names)
+        cache.invalidate(self.colvar)
+        self.assertTrue(cache.get(self.colvar) is None)
+        cache.read_table(self.colvar, self.col_names)
+        cache.invalidate()
+        self.assertEqual(cache.size, 0)
+
+    def test_changed_file_is_not_used(self):
+        """
+        testing that a file which has changed since it was cached is parsed again
+        """
+        file = os.path.join(self.cache_dir, 'COLVAR.0')
+        shutil.copy(self.colvar, file)
+        cache = PlumedFileCache(os.path.join(self.cache_dir, 'cache'))
+        cache.read_table(file, self.col_names)
+        with open(file, 'a') as f:
+            f.write(" 20.000000 6.0 0.0 0.0 0.0 50.0 -14.0 64.0\n")
+        self.assertTrue(cache.get(file) is None)
+        self.assertEqual(cache.read_table(file, self.col_names).shape[0], 52)
+
+    def test_lru_eviction(self):
+        """
+        testing that the least recently used entries are removed when the cache is too big
+        """
+        colvar_1 = "./test_trajectories/ndi_na_binding/COLVAR_REWEIGHT.1"
+        cache = PlumedFileCache(self.cache_dir, max_size=4000)
+        cache.read_table(self.colvar, self.col_names)
+        cache.read_table(colvar_1, self.col_names)
+        self.assertTrue(cache.get(self.colvar) is None)
+        self.assertTrue(cache.get(colvar_1) is not None)
+        self.assertTrue(cache.size <= 4000)
+
+    def test_enabled_cache_in_free_energy_space(self):
+        """
+        testing that a space loaded twice with the cache enabled gives the same reweighted line as without the cache
+        """
+        here_dir = "./test_trajectories/ndi_na_binding/"
+        compare = FreeEnergySpace.from_standard_directory(here_dir).get_reweighted_line('D1', bins=10)
+        cache = plumed_cache.enable_cache(self.cache_dir)
+        FreeEnergySpace.from_standard_directory(here_dir)
+        self.assertTrue(cache.get(self.colvar) is not None)
+        line = FreeEnergySpace.from_standard_directory(here_dir).get_reweighted_line('D1', bins=10)
+        streamed = (FreeEnergySpace
+                    .from_standard_directory(here_dir, in_memory=False)
+                    .get_reweighted_line('D1', bins=10, chunk_size=10)
+                    )
+        pd.testing.assert_frame_equal(line._data, compare._data)
+        pd.testing.assert_frame_equal(streamed._data, compare._data)
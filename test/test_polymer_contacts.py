@@ -0,0 +1,178 @@
+import unittest
+import tempfile
+import shutil
+import os
+import numpy as np
+import pandas as pd
+import networkx as nx
+import MDAnalysis as mda
+from click.testing import CliRunner
+from MDAnalysis.analysis import contacts
+from Materials_Data_Analytics.core.polymer_contacts import FragmentContactAnalysis, get_fragment_contacts, \
+    run_fragment_contacts, get_done_frames, _write_contact_chunk, ContactNetwork
+from cli_tools.get_polymer_contacts import main
+from test.test_trajectory_analysis import make_polymer_trajectory
+
+
+class TestPolymerContacts(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.topology, cls.trajectory = make_polymer_trajectory(cls.directory, n_polymers=6, n_atoms=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def get_pair_contacts(self, reference: str, selection: str, n_fragments: int, radius: float):
+        """
+        Function to get the contacts by looping over every pair of fragments and frame, to compare to
+        """
+        u = mda.Universe(self.topology, self.trajectory)
+        data = []
+        for r in range(0, n_fragments):
+            ref_group = u.atoms.fragments[r].select_atoms(reference)
+            for s in range(r + 1, n_fragments):
+                sel_group = u.atoms.fragments[s].select_atoms(selection)
+                for ts in u.trajectory:
+                    dist = contacts.distance_array(ref_group.positions, sel_group.positions)
+                    data.append({'time': ts.time, 'ref': r, 'sel': s, 'n': contacts.contact_matrix(dist, radius).sum()})
+
+        return pd.DataFrame(data)
+
+    def test_same_as_pair_loop(self):
+        """
+        testing that the neighbour search gives the same contacts as looping over the pairs of fragments
+        """
+        u = mda.Universe(self.topology, self.trajectory)
+        analysis = FragmentContactAnalysis('contacts', 'index 0:17', 'all', n_fragments=5, radius=12)
+        data = get_fragment_contacts(u, analysis).sort_values(['ref', 'sel'], kind='stable').reset_index(drop=True)
+        compare = self.get_pair_contacts('index 0:17', 'all', n_fragments=5, radius=12)
+        self.assertTrue(compare['n'].sum() > 0)
+        pd.testing.assert_frame_equal(data, compare, check_dtype=False)
+
+    def test_sparse(self):
+        u = mda.Universe(self.topology, self.trajectory)
+        analysis = FragmentContactAnalysis('contacts', 'all', 'all', n_fragments=6, radius=12)
+        dense = get_fragment_contacts(u, analysis)
+        sparse = get_fragment_contacts(u, analysis, sparse=True)
+        self.assertTrue((sparse['n'] > 0).all())
+        pd.testing.assert_frame_equal(sparse.reset_index(drop=True),
+                                      dense.query('n > 0').reset_index(drop=True), check_dtype=False)
+
+    def test_cli(self):
+        output = os.path.join(self.directory, 'contacts.tsv')
+        result = CliRunner().invoke(main, ['-ref', 'all', '-sel', 'all', '-s', self.topology, '-f', self.trajectory,
+                                           '-n', '6', '-r', '12', '-ts', '2', '-o', output])
+        self.assertEqual(result.exit_code, 0)
+        data = pd.read_table(output)
+        self.assertEqual(data.columns.to_list(), ['time', 'ref', 'sel', 'n'])
+        self.assertEqual(data.shape[0], 15 * 5)
+        self.assertTrue((data['ref'] < data['sel']).all())
+        self.assertFalse(os.path.exists(output + '.chunks'))
+
+    def get_analysis(self):
+        return FragmentContactAnalysis('contacts', 'all', 'all', n_fragments=6, radius=12)
+
+    def test_parallel_shards(self):
+        """
+        testing that splitting the frames over processes gives the same output, in order of frame
+        """
+        output = os.path.join(self.directory, 'parallel.tsv')
+        progress = []
+        run_fragment_contacts(self.topology, self.trajectory, self.get_analysis(), output, n_jobs=3, sparse=True,
+                              shard_callback=lambda n_done, n_frames: progress.append((n_done, n_frames)))
+        compare = get_fragment_contacts(mda.Universe(self.topology, self.trajectory), self.get_analysis(), sparse=True)
+        pd.testing.assert_frame_equal(pd.read_table(output), compare, check_dtype=False)
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(progress[-1], (10, 10))
+
+    def test_cli_parallel_verbose(self):
+        """
+        testing that with more than one process the verbose output reports each shard as it finishes
+        """
+        output = os.path.join(self.directory, 'contacts_parallel.tsv')
+        result = CliRunner().invoke(main, ['-ref', 'all', '-sel', 'all', '-s', self.topology, '-f', self.trajectory,
+                                           '-n', '6', '-r', '12', '-j', '2', '-v', '-o', output])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Finished 10 of 10 frames", result.output)
+        self.assertNotIn("Calculating contacts", result.output)
+
+    def test_resume(self):
+        """
+        testing that a run that stopped part way through a frame is carried on from the last complete frame
+        """
+        output = os.path.join(self.directory, 'resumed.tsv')
+        chunks = os.path.join(self.directory, 'resumed_chunks')
+        os.makedirs(chunks)
+        chunk = os.path.join(chunks, 'chunk_000000000.bin')
+        _write_contact_chunk(self.topology, self.trajectory, self.get_analysis(), np.arange(0, 4), chunk)
+        with open(chunk, 'ab') as f:
+            f.write(b'partial frame')
+
+        np.testing.assert_array_equal(get_done_frames(chunks), [0, 1, 2, 3])
+        done = []
+        run_fragment_contacts(self.topology, self.trajectory, self.get_analysis(), output, resume=True,
+                              chunk_directory=chunks, callback=lambda ts: done.append(ts.frame))
+        self.assertEqual(done, [4, 5, 6, 7, 8, 9])
+        compare = get_fragment_contacts(mda.Universe(self.topology, self.trajectory), self.get_analysis())
+        pd.testing.assert_frame_equal(pd.read_table(output), compare, check_dtype=False)
+
+
+class TestContactNetwork(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.topology, cls.trajectory = make_polymer_trajectory(cls.directory, n_polymers=8, n_atoms=5)
+        cls.analysis = FragmentContactAnalysis('contacts', 'all', 'all', n_fragments=8, radius=8)
+        cls.file = os.path.join(cls.directory, 'contacts.npy')
+        run_fragment_contacts(cls.topology, cls.trajectory, cls.analysis, cls.file, sparse=True, n_jobs=2)
+        cls.data = get_fragment_contacts(mda.Universe(cls.topology, cls.trajectory), cls.analysis)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def test_sparse_records(self):
+        """
+        testing that the .npy output keeps every frame, including frames without contacts
+        """
+        network = ContactNetwork(self.file)
+        self.assertEqual(network.n_fragments, 8)
+        np.testing.assert_array_equal(network.frames, np.arange(0, 10))
+        records = np.load(self.file)
+        contacts = records[records['ref'] >= 0]
+        self.assertEqual(len(contacts), (self.data['n'] > 0).sum())
+
+    def test_graphs(self):
+        """
+        testing the graph for each frame against one built from the data frame, and the clusters against networkx
+        """
+        network = ContactNetwork(self.file, n_fragments=8)
+        statistics = network.get_cluster_statistics(percolation_fraction=0.25)
+        times = np.unique(self.data['time'])
+
+        for graph, (_, row) in zip(network.iter_graphs(), statistics.iterrows()):
+            frame_data = self.data.query(f"time == {times[graph.graph['frame']]} and n > 0")
+            self.assertEqual(set(graph.edges), set(zip(frame_data['ref'], frame_data['sel'])))
+            self.assertEqual(graph.number_of_nodes(), 8)
+            clusters = [len(c) for c in nx.connected_components(graph)]
+            self.assertEqual(row['n_clusters'], len(clusters))
+            self.assertEqual(row['largest_cluster'], max(clusters))
+            self.assertEqual(row['percolating'], max(clusters) >= 2)
+
+        self.assertEqual(network.get_percolation_probability(percolation_fraction=0.25), statistics['percolating'].mean())
+
+    def test_average_graph(self):
+        network = ContactNetwork(self.data)
+        graph = network.get_average_graph(block_size=7)
+        mean = self.data.groupby(['ref', 'sel'])['n'].mean()
+        for r, s, weight in graph.edges(data='weight'):
+            self.assertAlmostEqual(weight, mean[(min(r, s), max(r, s))])
+        self.assertEqual(graph.number_of_edges(), (mean > 0).sum())
+
+    def test_wrong_contacts(self):
+        with self.assertRaises(ValueError):
+            ContactNetwork([1, 2, 3])
@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Materials_Data_Analytics.metadynamics.spatial_index import SpatialIndex
+from Materials_Data_Analytics.metadynamics.free_energy import FreeEnergySurface, FreeEnergyShape
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    x, y = np.meshgrid(np.linspace(0, 2, 5), np.linspace(-1, 1, 3), indexing='ij')
+    grid_points = np.column_stack([x.ravel(order='F'), y.ravel(order='F')])
+    rng = np.random.default_rng(0)
+    scattered_points = rng.uniform(0, 1, (200, 2))
+
+    def test_regular_grid(self):
+        """
+        testing that a full grid is found and gives the same nearest points as a brute force search
+        """
+        index = SpatialIndex(self.grid_points)
+        self.assertTrue(index.is_grid)
+        queries = self.rng.uniform(-0.5, 2.5, (50, 2))
+        brute = np.argmin(((queries[:, None, :] - self.grid_points[None, :, :])**2).sum(axis=2), axis=1)
+        np.testing.assert_array_equal(index.nearest(queries), brute)
+
+    def test_scattered_points(self):
+        """
+        testing that scattered points use the KD-tree and give the same nearest points as a brute force search
+        """
+        index = SpatialIndex(self.scattered_points)
+        self.assertFalse(index.is_grid)
+        queries = self.rng.uniform(0, 1, (50, 2))
+        brute = np.argmin(((queries[:, None, :] - self.scattered_points[None, :, :])**2).sum(axis=2), axis=1)
+        np.testing.assert_array_equal(index.nearest(queries), brute)
+
+    def test_grid_with_missing_point(self):
+        index = SpatialIndex(self.grid_points[1:])
+        self.assertFalse(index.is_grid)
+        self.assertEqual(index.nearest([0.5, 0])[0], self.grid_points[1:].tolist().index([0.5, 0]))
+
+    def test_interpolation_is_exact_for_linear_values(self):
+        """
+        testing that linear interpolation gives back a linear function, on a grid, on scattered points and in 1D
+        """
+        queries = self.rng.uniform(0.1, 0.9, (20, 2))
+        for points in [self.grid_points, self.scattered_points]:
+            values = 2 * points[:, 0] - points[:, 1]
+            interpolated = SpatialIndex(points).interpolate(queries, values)
+            np.testing.assert_allclose(interpolated, 2 * queries[:, 0] - queries[:, 1])
+
+        points = np.array([3, 1, 2, 0.5])
+        np.testing.assert_allclose(SpatialIndex(points).interpolate([1.5, 2.5], points * 3), [4.5, 7.5])
+
+    def test_wrong_dimension(self):
+        with self.assertRaises(ValueError):
+            SpatialIndex(self.grid_points).nearest([1, 2, 3])
+
+
+class TestShapeLookups(unittest.TestCase):
+
+    surface = FreeEnergySurface.from_plumed("./test_trajectories/ndi_na_binding/FES_CM1_D1/FES")
+
+    def test_nearest_values(self):
+        """
+        testing that batched nearest values match the single value lookup
+        """
+        coordinates = pd.DataFrame({'CM1': [0.03, 1.2, 2.5], 'D1': [5, 6.3, 7.1]})
+        values = self.surface.get_nearest_values(coordinates)
+        for i, row in coordinates.iterrows():
+            compare = FreeEnergyShape.get_nearest_value(self.surface._data, row.to_dict(), 'energy')
+            self.assertEqual(values[i], compare)
+
+    def test_interpolated_values_on_grid_points(self):
+        data = self.surface._data.iloc[[10, 500, 2000]]
+        values = self.surface.get_interpolated_values({'CM1': data['CM1'], 'D1': data['D1']})
+        np.testing.assert_allclose(values, data['energy'])
+
+    def test_index_is_kept(self):
+        index = self.surface._get_index(self.surface._data)
+        self.surface.set_datum({'CM1': 1, 'D1': 6})
+        self.assertTrue(self.surface._get_index(self.surface._data) is index)
+        self.assertEqual(self.surface.get_nearest_values({'CM1': 1, 'D1': 6})[0], 0)
@@ -0,0 +1,113 @@
+import unittest
+import tempfile
+import shutil
+import os
+import numpy as np
+import pandas as pd
+import MDAnalysis as mda
+from MDAnalysis.lib.distances import distance_array
+from Materials_Data_Analytics.core.universe import Universe
+from Materials_Data_Analytics.core.trajectory_analysis import FrameAnalysis, ContactAnalysis, DistanceAnalysis, CVAnalysis
+
+
+def make_polymer_trajectory(directory: str, n_polymers: int = 3, n_atoms: int = 4, n_frames: int = 10):
+    """
+    Function to write a small topology and trajectory of bonded chains with random positions
+    """
+    u = mda.Universe.empty(n_polymers * n_atoms, n_residues=n_polymers,
+                           atom_resindex=np.repeat(np.arange(0, n_polymers), n_atoms), trajectory=True)
+    u.add_TopologyAttr('name', ['C'] * n_polymers * n_atoms)
+    u.add_TopologyAttr('type', ['C'] * n_polymers * n_atoms)
+    u.add_TopologyAttr('masses', [12.0] * n_polymers * n_atoms)
+    u.add_TopologyAttr('resname', ['POL'] * n_polymers)
+    u.add_TopologyAttr('resid', np.arange(1, n_polymers + 1))
+    u.add_TopologyAttr('bonds', [(p * n_atoms + i, p * n_atoms + i + 1)
+                                 for p in range(0, n_polymers) for i in range(0, n_atoms - 1)])
+    rng = np.random.default_rng(0)
+    topology = os.path.join(directory, 'top.pdb')
+    trajectory = os.path.join(directory, 'traj.xtc')
+
+    u.dimensions = [50, 50, 50, 90, 90, 90]
+    u.atoms.positions = rng.uniform(0, 50, (u.atoms.n_atoms, 3))
+    u.atoms.write(topology, bonds='conect')
+
+    with mda.Writer(trajectory, u.atoms.n_atoms) as writer:
+        for i in range(0, n_frames):
+            u.atoms.positions = rng.uniform(0, 50, (u.atoms.n_atoms, 3))
+            u.trajectory.ts.time = i * 10
+            writer.write(u.atoms)
+
+    return topology, trajectory
+
+
+class TestTrajectoryAnalysis(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.topology, cls.trajectory = make_polymer_trajectory(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def get_universe(self):
+        return (Universe(self.topology, self.trajectory)
+                .add_analysis(ContactAnalysis('contacts', 'resid 1', 'resid 2', radius=15))
+                .add_analysis(DistanceAnalysis('distance', 'resid 1', 'resid 3', method='minimum'))
+                )
+
+    def test_one_pass(self):
+        """
+        testing that all the analyses are in one frame with a row per frame, and match computing them directly
+        """
+        data = self.get_universe().run_analyses()
+        self.assertEqual(data.columns.to_list(), ['frame', 'time', 'contacts', 'distance'])
+        self.assertEqual(data.shape[0], 10)
+
+        u = mda.Universe(self.topology, self.trajectory)
+        u.trajectory[3]
+        distances = distance_array(u.select_atoms('resid 1').positions, u.select_atoms('resid 3').positions,
+                                   box=u.dimensions)
+        self.assertAlmostEqual(data.loc[3, 'distance'], distances.min(), places=5)
+
+    def test_start_stop_step(self):
+        data = self.get_universe().run_analyses(start=1, stop=9, step=3, block_size=2)
+        self.assertEqual(data['frame'].to_list(), [1, 4, 7])
+
+    def test_cv_analysis(self):
+        universe = Universe(self.topology, self.trajectory)
+        universe.add_analysis(CVAnalysis('size', lambda g: {'rg': g.radius_of_gyration(), 'n': g.n_atoms}, 'resid 2'))
+        data = universe.run_analyses()
+        self.assertEqual(data.columns.to_list(), ['frame', 'time', 'size_rg', 'size_n'])
+        self.assertTrue((data['size_n'] == 4).all())
+
+    def test_parallel_blocks(self):
+        """
+        testing that running blocks of frames in parallel gives the same results in the same order
+        """
+        serial = self.get_universe().run_analyses()
+        parallel = self.get_universe().run_analyses(n_jobs=2, block_size=3)
+        pd.testing.assert_frame_equal(parallel, serial)
+
+    def test_stream_to_file(self):
+        file = os.path.join(self.directory, 'analysis.tsv')
+        self.assertTrue(self.get_universe().run_analyses(output_file=file, block_size=4) is None)
+        pd.testing.assert_frame_equal(pd.read_table(file), self.get_universe().run_analyses(), check_dtype=False)
+
+    def test_same_name(self):
+        with self.assertRaises(ValueError):
+            self.get_universe().add_analysis(ContactAnalysis('contacts', 'resid 1', 'resid 3'))
+
+    def test_bad_n_jobs(self):
+        for n_jobs in [0, -2]:
+            with self.assertRaises(ValueError):
+                self.get_universe().run_analyses(n_jobs=n_jobs)
+
+    def test_compute_needed(self):
+
+        class NoCompute(FrameAnalysis):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoCompute('none')